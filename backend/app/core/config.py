@@ -136,6 +136,42 @@ class Settings:
         """默认模型索引"""
         return self.config.get('ai_models', {}).get('default_index', 0)
     
+    @property
+    def model_routing_config(self) -> Dict[str, Any]:
+        """模型路由配置（熔断、故障转移、对冲请求）"""
+        return self.config.get('ai_models', {}).get('routing', {
+            'enabled': True,
+            'failure_threshold': 5,
+            'reset_timeout': 30,
+            'hedge': False,
+            'hedge_min_samples': 20
+        })
+    
+    @property
+    def ai_warm_up_enabled(self) -> bool:
+        """启动时是否预热模型客户端和端点连接"""
+        return self.config.get('ai_models', {}).get('warm_up', True)
+    
+    @property
+    def ai_connection_pool_config(self) -> Dict[str, Any]:
+        """模型调用HTTP连接池配置（按模型端点共享）"""
+        return self.config.get('ai_models', {}).get('connection_pool', {
+            'max_connections': 200,
+            'max_keepalive_connections': 50,
+            'keepalive_expiry': 60
+        })
+    
+    @property
+    def llm_cache_config(self) -> Dict[str, Any]:
+        """模型响应缓存配置"""
+        return self.config.get('llm_cache', {
+            'enabled': True,
+            'path': './data/cache/llm_cache.db',
+            'max_memory_entries': 1000,
+            'max_disk_entries': 50000,
+            'ttl': 604800
+        })
+    
     @property
     def file_settings(self) -> Dict[str, Any]:
         """文件设置"""
@@ -188,6 +224,20 @@ class Settings:
         """任务处理配置"""
         return self.config.get('task_processing', {})
     
+    @property
+    def task_execution_mode(self) -> str:
+        """任务执行模式：inline（API进程内执行）或 worker（独立工作进程执行）"""
+        return self.task_processing_config.get('execution_mode', 'inline')
+    
+    @property
+    def task_worker_config(self) -> Dict[str, Any]:
+        """工作进程配置"""
+        return self.task_processing_config.get('worker', {
+            'processes': 1,
+            'poll_interval': 2,
+            'event_relay_interval': 1
+        })
+    
     @property
     def section_merge_config(self) -> Dict[str, Any]:
         """章节合并配置"""
@@ -199,6 +249,47 @@ class Settings:
             'preserve_structure': True
         })
     
+    @property
+    def chunking_config(self) -> Dict[str, Any]:
+        """按模型上下文窗口分块的配置"""
+        return self.task_processing_config.get('chunking', {
+            'pack_sections': True,
+            'max_chunk_tokens': 0,
+            'max_pack_sections': 8,
+            'preprocess_concurrency': 4
+        })
+    
+    @property
+    def concurrency_config(self) -> Dict[str, Any]:
+        """模型调用自适应并发配置"""
+        return self.task_processing_config.get('concurrency', {
+            'enabled': True,
+            'initial_limit': 4,
+            'min_limit': 1,
+            'max_limit': 32,
+            'backoff_ratio': 0.5,
+            'latency_tolerance': 2.0,
+            'interactive_weight': 4
+        })
+    
+    @property
+    def local_structure_config(self) -> Dict[str, Any]:
+        """本地文档结构提取配置"""
+        return self.task_processing_config.get('local_structure', {
+            'enabled': True,
+            'file_types': ['md', 'docx', 'txt'],
+            'min_headings': 2,
+            'min_average_chars': 80
+        })
+    
+    @property
+    def rule_check_config(self) -> Dict[str, Any]:
+        """本地规则检查配置"""
+        return self.task_processing_config.get('rule_check', {
+            'enabled': True,
+            'checks': ['brackets', 'punctuation', 'code_syntax']
+        })
+    
     def reload(self, config_file: Optional[str] = None):
         """重新加载配置"""
         if config_file:
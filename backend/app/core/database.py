@@ -1,10 +1,11 @@
 """
 数据库连接管理
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import Generator, Optional
 
 from app.core.config import get_settings
 
@@ -67,4 +68,31 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def ensure_schema_columns(bind: Optional[Engine] = None):
+    """
+    为已存在的表补充模型中新增的列和索引
+    create_all只会创建缺失的表，不会修改已有表结构；
+    新增列上的索引（如租约认领、孤儿任务恢复按 owner_id 查询）也需要补建，否则升级后的数据库只能全表扫描
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"🔧 数据表 {table.name} 新增列: {column.name} {column_type}")
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                index.create(conn)
+                print(f"🔧 数据表 {table.name} 新增索引: {index.name}")
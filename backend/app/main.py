@@ -9,7 +9,7 @@ import os
 import json
 
 from app.core.config import get_settings
-from app.core.database import engine, get_db, Base
+from app.core.database import engine, get_db, Base, ensure_schema_columns
 from app.dto.task import TaskResponse, TaskDetail, TaskCreate
 from app.dto.issue import IssueResponse, FeedbackRequest
 from app.dto.ai_output import AIOutputResponse
@@ -18,12 +18,18 @@ from app.services.task import TaskService
 from app.repositories.issue import IssueRepository
 from app.repositories.ai_output import AIOutputRepository
 from app.services.websocket import manager
+from app.services.task_scheduler import task_scheduler
+from app.services.task_event_relay import task_event_relay
+from app.services.llm_client import close_async_http_clients
+from app.services.model_registry import model_registry
+from app.services.llm_cache import llm_cache
 
 # 获取配置
 settings = get_settings()
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
+ensure_schema_columns()
 
 def create_app() -> FastAPI:
     """创建并配置FastAPI应用"""
@@ -105,6 +111,12 @@ def get_models():
     )
 
 
+@app.get("/api/llm-cache/stats")
+def get_llm_cache_stats():
+    """获取模型响应缓存命中统计（当前进程）"""
+    return llm_cache.stats()
+
+
 @app.post("/api/tasks", response_model=TaskResponse)
 async def create_task(
     background_tasks: BackgroundTasks,
@@ -133,13 +145,20 @@ def get_task_detail(task_id: int, db: Session = Depends(get_db)):
 
 
 @app.delete("/api/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db)):
+async def delete_task(task_id: int, db: Session = Depends(get_db)):
     """删除任务"""
     service = TaskService(db)
-    success = service.delete_task(task_id)
+    success = await service.delete_task(task_id)
     return {"success": success}
 
 
+@app.post("/api/tasks/{task_id}/cancel")
+async def cancel_task(task_id: int, db: Session = Depends(get_db)):
+    """取消任务"""
+    service = TaskService(db)
+    return await service.cancel_task(task_id)
+
+
 @app.put("/api/issues/{issue_id}/feedback")
 def submit_feedback(
     issue_id: int,
@@ -184,10 +203,10 @@ def download_report(task_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/api/tasks/{task_id}/retry")
-def retry_task(task_id: int, db: Session = Depends(get_db)):
-    """重试任务"""
-    # TODO: 实现任务重试逻辑
-    return {"message": "任务重试功能待实现"}
+async def retry_task(task_id: int, db: Session = Depends(get_db)):
+    """重试任务（从最后成功的检查点继续）"""
+    service = TaskService(db)
+    return await service.retry_task(task_id)
 
 
 @app.websocket("/ws/task/{task_id}/logs")
@@ -250,6 +269,31 @@ def setup_routes(app: FastAPI):
 setup_routes(app)
 
 
+@app.on_event("startup")
+async def start_task_scheduler():
+    """
+    启动任务执行
+    inline模式启动本进程的调度器并恢复未完成任务；worker模式由工作进程执行，本进程只转发任务事件
+    """
+    if settings.task_execution_mode == 'worker':
+        # 模型调用都在工作进程中，由工作进程自行预热模型客户端
+        await task_event_relay.start()
+        return
+    if settings.ai_warm_up_enabled:
+        await model_registry.warm_up(settings.ai_models)
+    await task_scheduler.start()
+    if settings.task_processing_config.get('recover_on_startup', True):
+        await task_scheduler.recover_tasks()
+
+
+@app.on_event("shutdown")
+async def stop_task_scheduler():
+    """停止任务调度器和事件转发，关闭模型连接池"""
+    await task_event_relay.stop()
+    await task_scheduler.stop()
+    await close_async_http_clients()
+
+
 if __name__ == "__main__":
     import uvicorn
     print("启动重构后的服务器...")
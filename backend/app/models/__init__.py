@@ -5,5 +5,6 @@ from app.models.task import Task
 from app.models.issue import Issue
 from app.models.ai_output import AIOutput
 from app.models.task_log import TaskLog
+from app.models.task_checkpoint import TaskCheckpoint
 
-__all__ = ["Task", "Issue", "AIOutput", "TaskLog"]
\ No newline at end of file
+__all__ = ["Task", "Issue", "AIOutput", "TaskLog", "TaskCheckpoint"]
\ No newline at end of file
@@ -21,8 +21,13 @@ class Task(Base):
     progress = Column(Float, default=0.0)
     model_index = Column(Integer, default=0)
     model_label = Column(String(100))
+    user_id = Column(Integer, index=True)  # 创建任务的用户，修订版基准任务只在同一用户的任务中匹配
     document_chars = Column(Integer)
     processing_time = Column(Float)
     error_message = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
-    completed_at = Column(DateTime)
\ No newline at end of file
+    completed_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # 处理中任务的心跳时间，用于识别崩溃遗留的任务
+    owner_id = Column(String(100), index=True)  # 持有任务租约的节点/进程标识
+    lease_expires_at = Column(DateTime)  # 任务租约过期时间，过期后其他节点可重新认领
+    base_task_id = Column(Integer, index=True)  # 修订版文档对应的上一版本任务，未改动章节沿用其检测结果
\ No newline at end of file
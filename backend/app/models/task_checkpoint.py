@@ -0,0 +1,23 @@
+"""
+任务检查点数据模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, UniqueConstraint
+from datetime import datetime
+
+from app.core.database import Base
+
+
+class TaskCheckpoint(Base):
+    """任务处理链步骤检查点模型"""
+    __tablename__ = "task_checkpoints"
+    __table_args__ = (
+        UniqueConstraint('task_id', 'step', name='uq_task_checkpoint_step'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
+    step = Column(String(100), nullable=False)  # 处理步骤，如 file_parsing、section_merge
+    data = Column(JSON)  # 步骤输出结果
+    step_metadata = Column(JSON, default={})  # 步骤元数据
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
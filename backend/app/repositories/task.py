@@ -2,8 +2,9 @@
 任务数据访问层
 """
 from typing import List, Optional
+from sqlalchemy import or_, and_, case
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.models import Task, Issue
 
@@ -50,17 +51,188 @@ class TaskRepository:
         if task:
             # 删除相关的问题和AI输出
             self.db.query(Issue).filter(Issue.task_id == task_id).delete()
-            from app.models import AIOutput
+            from app.models import AIOutput, TaskCheckpoint
             self.db.query(AIOutput).filter(AIOutput.task_id == task_id).delete()
+            self.db.query(TaskCheckpoint).filter(TaskCheckpoint.task_id == task_id).delete()
             
             self.db.delete(task)
             self.db.commit()
             return True
         return False
     
+    def find_base_task(self, title: str, user_id: int, exclude_id: Optional[int] = None) -> Optional[Task]:
+        """查找同一用户同名文档最近一次完成的任务，作为修订版增量分析的基准（只在该用户自己的任务中查找）"""
+        query = self.db.query(Task).filter(
+            Task.title == title,
+            Task.status == 'completed',
+            Task.user_id == user_id
+        )
+        if exclude_id is not None:
+            query = query.filter(Task.id != exclude_id)
+        return query.order_by(Task.completed_at.desc(), Task.id.desc()).first()
+    
     def get_pending_tasks(self) -> List[Task]:
         """获取待处理任务"""
-        return self.db.query(Task).filter(Task.status == 'pending').all()
+        return self.db.query(Task).filter(Task.status == 'pending').order_by(Task.created_at).all()
+    
+    def get_orphaned_tasks(self, stale_before: datetime) -> List[Task]:
+        """
+        获取遗留的处理中任务（进程崩溃或重启遗留）
+        有租约的任务以租约过期为准，没有租约的旧任务以心跳过期为准
+        """
+        now = datetime.utcnow()
+        return self.db.query(Task).filter(
+            Task.status == 'processing',
+            or_(
+                Task.lease_expires_at < now,
+                and_(
+                    Task.lease_expires_at.is_(None),
+                    or_(Task.heartbeat_at.is_(None), Task.heartbeat_at < stale_before)
+                )
+            )
+        ).order_by(Task.created_at).all()
+    
+    def reset_orphaned_tasks(self, stale_before: datetime, exclude_ids: Optional[List[int]] = None) -> List[int]:
+        """将遗留的处理中任务（租约或心跳过期）重置为待处理，返回被重置的任务ID"""
+        exclude_ids = set(exclude_ids or [])
+        reset_ids = []
+        for task in self.get_orphaned_tasks(stale_before):
+            if task.id in exclude_ids:
+                continue
+            task.status = 'pending'
+            task.progress = 0
+            task.error_message = None
+            task.owner_id = None
+            task.lease_expires_at = None
+            reset_ids.append(task.id)
+        if reset_ids:
+            self.db.commit()
+        return reset_ids
+    
+    def _claimable(self, now: datetime):
+        """可认领条件：待处理，或处理中但租约已过期"""
+        return or_(
+            Task.status == 'pending',
+            and_(Task.status == 'processing', Task.lease_expires_at < now)
+        )
+    
+    def _lease_values(self, owner_id: str, lease_seconds: float) -> dict:
+        now = datetime.utcnow()
+        return {
+            Task.status: 'processing',
+            Task.owner_id: owner_id,
+            Task.heartbeat_at: now,
+            Task.lease_expires_at: now + timedelta(seconds=lease_seconds)
+        }
+    
+    def claim_task(self, task_id: int, owner_id: str, lease_seconds: float) -> bool:
+        """
+        认领指定任务
+        任务可认领或已由owner_id持有时成功，并设置/续期租约
+        """
+        claimed = self.db.query(Task).filter(
+            Task.id == task_id,
+            or_(self._claimable(datetime.utcnow()), Task.owner_id == owner_id)
+        ).update(self._lease_values(owner_id, lease_seconds), synchronize_session=False)
+        self.db.commit()
+        return claimed == 1
+    
+    def claim_next_task(
+        self,
+        owner_id: str,
+        lease_seconds: float,
+        small_file_size: int = 1048576,
+        batch_size: int = 10
+    ) -> Optional[Task]:
+        """
+        认领下一个可执行的任务（小文档优先）
+        
+        MySQL使用 SELECT ... FOR UPDATE SKIP LOCKED 让多个节点并发认领互不阻塞；
+        SQLite不支持行锁，退化为带条件的UPDATE，由影响行数判断是否认领成功
+        """
+        now = datetime.utcnow()
+        query = self.db.query(Task).filter(self._claimable(now)).order_by(
+            case((Task.file_size <= small_file_size, 0), else_=1),
+            Task.created_at
+        )
+        
+        if self.db.get_bind().dialect.name == 'mysql':
+            task = query.with_for_update(skip_locked=True).first()
+            if not task:
+                self.db.rollback()
+                return None
+            for column, value in self._lease_values(owner_id, lease_seconds).items():
+                setattr(task, column.key, value)
+            self.db.commit()
+            self.db.refresh(task)
+            return task
+        
+        for task in query.limit(batch_size).all():
+            if self.claim_task(task.id, owner_id, lease_seconds):
+                return self.get_by_id(task.id)
+        return None
+    
+    def renew_leases(self, task_ids: List[int], owner_id: str, lease_seconds: float) -> List[int]:
+        """为本节点持有的任务续期租约并刷新心跳，返回续期成功的任务ID"""
+        renewed = []
+        now = datetime.utcnow()
+        for task_id in task_ids:
+            updated = self.db.query(Task).filter(
+                Task.id == task_id,
+                Task.owner_id == owner_id
+            ).update({
+                Task.heartbeat_at: now,
+                Task.lease_expires_at: now + timedelta(seconds=lease_seconds)
+            }, synchronize_session=False)
+            if updated:
+                renewed.append(task_id)
+        self.db.commit()
+        return renewed
+    
+    def release_task(self, task_id: int, owner_id: str):
+        """
+        释放本节点持有的任务租约
+        任务仍处于处理中（执行被中断）时租约立即过期，其他节点或本节点的遗留任务回收无需等待租约到期
+        """
+        self.db.query(Task).filter(
+            Task.id == task_id,
+            Task.owner_id == owner_id
+        ).update(self._release_values(), synchronize_session=False)
+        self.db.commit()
+    
+    def release_owner_tasks(self, owner_id: str, exclude_ids: Optional[List[int]] = None) -> List[int]:
+        """释放本节点持有的所有处理中任务的租约（启动时回收上次运行遗留的租约、关闭时交还执行中的任务），返回任务ID"""
+        query = self.db.query(Task).filter(Task.owner_id == owner_id, Task.status == 'processing')
+        if exclude_ids:
+            query = query.filter(Task.id.notin_(list(exclude_ids)))
+        task_ids = [task.id for task in query.all()]
+        if task_ids:
+            self.db.query(Task).filter(Task.id.in_(task_ids)).update(
+                self._release_values(), synchronize_session=False
+            )
+            self.db.commit()
+        return task_ids
+    
+    def _release_values(self) -> dict:
+        return {
+            Task.owner_id: None,
+            Task.lease_expires_at: case((Task.status == 'processing', datetime.utcnow()), else_=None)
+        }
+    
+    def get_ids_by_status(self, task_ids: List[int], status: str) -> List[int]:
+        """在给定任务中筛选指定状态的任务ID"""
+        if not task_ids:
+            return []
+        rows = self.db.query(Task.id).filter(Task.id.in_(task_ids), Task.status == status).all()
+        return [row.id for row in rows]
+    
+    def get_cancelled_ids(self, task_ids: List[int]) -> List[int]:
+        """在给定任务中筛选已取消或已删除的任务ID"""
+        if not task_ids:
+            return []
+        rows = self.db.query(Task.id, Task.status).filter(Task.id.in_(task_ids)).all()
+        statuses = {row.id: row.status for row in rows}
+        return [task_id for task_id in task_ids if statuses.get(task_id, 'cancelled') == 'cancelled']
     
     def update_progress(self, task_id: int, progress: float, status: Optional[str] = None):
         """更新任务进度"""
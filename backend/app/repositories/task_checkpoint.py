@@ -0,0 +1,82 @@
+"""
+任务检查点数据访问层
+"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+
+from app.models import TaskCheckpoint
+
+
+class TaskCheckpointRepository:
+    """任务检查点仓库"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get(self, task_id: int, step: str) -> Optional[TaskCheckpoint]:
+        """获取任务指定步骤的检查点"""
+        return self.db.query(TaskCheckpoint).filter(
+            TaskCheckpoint.task_id == task_id,
+            TaskCheckpoint.step == step
+        ).first()
+    
+    def get_by_task_id(self, task_id: int) -> List[TaskCheckpoint]:
+        """获取任务的所有检查点"""
+        return self.db.query(TaskCheckpoint).filter(
+            TaskCheckpoint.task_id == task_id
+        ).order_by(TaskCheckpoint.created_at).all()
+    
+    def save(self, task_id: int, step: str, data: Any, step_metadata: Optional[Dict[str, Any]] = None) -> TaskCheckpoint:
+        """保存检查点，同一任务同一步骤只保留最新一份"""
+        checkpoint = self.get(task_id, step)
+        if checkpoint:
+            checkpoint.data = data
+            checkpoint.step_metadata = step_metadata or {}
+        else:
+            checkpoint = TaskCheckpoint(
+                task_id=task_id,
+                step=step,
+                data=data,
+                step_metadata=step_metadata or {}
+            )
+            self.db.add(checkpoint)
+        self.db.commit()
+        return checkpoint
+    
+    def get_by_step_prefix(self, task_id: int, prefix: str) -> List[TaskCheckpoint]:
+        """获取任务中步骤名以指定前缀开头的检查点"""
+        return self.db.query(TaskCheckpoint).filter(
+            TaskCheckpoint.task_id == task_id,
+            TaskCheckpoint.step.startswith(prefix, autoescape=True)
+        ).all()
+    
+    def save_many(self, task_id: int, steps: Dict[str, Any]):
+        """批量保存多个步骤的检查点（一次提交），同一步骤只保留最新一份"""
+        if not steps:
+            return
+        existing = {
+            checkpoint.step: checkpoint
+            for checkpoint in self.db.query(TaskCheckpoint).filter(
+                TaskCheckpoint.task_id == task_id,
+                TaskCheckpoint.step.in_(list(steps))
+            )
+        }
+        for step, data in steps.items():
+            if step in existing:
+                existing[step].data = data
+            else:
+                self.db.add(TaskCheckpoint(task_id=task_id, step=step, data=data, step_metadata={}))
+        self.db.commit()
+    
+    def delete(self, task_id: int, step: str):
+        """删除任务指定步骤的检查点"""
+        self.db.query(TaskCheckpoint).filter(
+            TaskCheckpoint.task_id == task_id,
+            TaskCheckpoint.step == step
+        ).delete()
+        self.db.commit()
+    
+    def delete_by_task_id(self, task_id: int):
+        """删除任务的所有检查点"""
+        self.db.query(TaskCheckpoint).filter(TaskCheckpoint.task_id == task_id).delete()
+        self.db.commit()
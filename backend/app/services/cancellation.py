@@ -0,0 +1,72 @@
+"""
+任务取消 - 协作式取消令牌
+"""
+import asyncio
+import contextlib
+from typing import Awaitable, Optional, TypeVar
+
+
+T = TypeVar('T')
+
+
+class TaskCancelledError(Exception):
+    """任务已被取消"""
+
+
+class CancellationToken:
+    """
+    协作式取消令牌
+
+    由调度器为每个执行中的任务创建，通过处理上下文传递给处理链和模型调用。
+    处理步骤之间和章节检测开始前检查令牌，等待中的模型调用通过 run 与取消信号竞争，
+    取消时立即中断等待并释放并发名额。
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "任务已取消"):
+        """请求取消"""
+        if not self.cancelled:
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self):
+        """已请求取消时抛出 TaskCancelledError"""
+        if self.cancelled:
+            raise TaskCancelledError(self.reason)
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """
+        执行可等待对象，期间请求取消时中断执行并抛出 TaskCancelledError
+
+        Args:
+            awaitable: 协程或Future（如模型调用）
+
+        Returns:
+            可等待对象的结果
+        """
+        self.raise_if_cancelled()
+        call = asyncio.ensure_future(awaitable)
+        waiter = asyncio.ensure_future(self._event.wait())
+        interrupted = False
+        try:
+            await asyncio.wait({call, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            if not call.done():
+                # 取消进行中的调用并等待其结束，异步HTTP请求会随之中断
+                interrupted = True
+                call.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await call
+        # 调用被取消信号中断时只抛出 TaskCancelledError，不读取未完成调用的结果
+        if interrupted and self.cancelled:
+            raise TaskCancelledError(self.reason)
+        return call.result()
@@ -0,0 +1,62 @@
+"""
+处理链检查点存储 - 持久化各步骤输出，重试时从最后成功的步骤继续
+"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+
+from app.repositories.task_checkpoint import TaskCheckpointRepository
+
+
+class CheckpointStore:
+    """单个任务的检查点存储，通过处理上下文的 checkpoint_store 传递给处理链"""
+
+    # 问题检测步骤中已完成章节的检查点，每个章节一行（步骤名为 前缀 + 章节内容哈希），保存该章节的问题列表
+    SECTION_RESULT_PREFIX = "issue_detection_sections:"
+
+    def __init__(self, db: Session, task_id: int):
+        self.task_id = task_id
+        self.repo = TaskCheckpointRepository(db)
+
+    def load(self, step: str) -> Optional[Dict[str, Any]]:
+        """
+        加载步骤检查点
+
+        Returns:
+            包含 data 和 metadata 的字典，不存在时返回None
+        """
+        checkpoint = self.repo.get(self.task_id, step)
+        if not checkpoint:
+            return None
+        return {
+            "data": checkpoint.data,
+            "metadata": checkpoint.step_metadata or {}
+        }
+
+    def save(self, step: str, data: Any, metadata: Optional[Dict[str, Any]] = None):
+        """保存步骤检查点"""
+        self.repo.save(self.task_id, step, data, metadata)
+
+    def steps(self) -> List[str]:
+        """已保存检查点的步骤列表（按保存顺序，不含章节级检查点）"""
+        return [
+            checkpoint.step for checkpoint in self.repo.get_by_task_id(self.task_id)
+            if not checkpoint.step.startswith(self.SECTION_RESULT_PREFIX)
+        ]
+
+    def load_section_results(self) -> Dict[str, List[Dict]]:
+        """加载问题检测中已完成章节的结果"""
+        prefix = self.SECTION_RESULT_PREFIX
+        return {
+            checkpoint.step[len(prefix):]: checkpoint.data or []
+            for checkpoint in self.repo.get_by_step_prefix(self.task_id, prefix)
+        }
+
+    def save_section_result(self, section_key: str, issues: List[Dict]):
+        """保存单个章节的问题检测结果（只写入该章节的一行，不重写其他章节）"""
+        self.repo.save(self.task_id, self.SECTION_RESULT_PREFIX + section_key, issues)
+
+    def save_section_results(self, section_results: Dict[str, List[Dict]]):
+        """批量保存多个章节的问题检测结果"""
+        self.repo.save_many(self.task_id, {
+            self.SECTION_RESULT_PREFIX + key: issues for key, issues in section_results.items()
+        })
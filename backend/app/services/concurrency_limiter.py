@@ -0,0 +1,196 @@
+"""
+自适应并发限制 - 按模型端点共享的 AIMD 并发窗口
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import get_settings
+from app.services.llm_scheduler import FairRequestQueue, current_flow
+
+
+logger = logging.getLogger(__name__)
+
+# 视为后端过载的HTTP状态码
+OVERLOAD_STATUS_CODES = {429, 500, 502, 503, 504}
+# 基线延迟每个样本允许上浮的比例，使基线能跟随后端的正常变化
+BASELINE_DRIFT = 0.01
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """判断异常是否表示后端过载（429/5xx/超时）"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status_code in OVERLOAD_STATUS_CODES:
+        return True
+    # openai.APITimeoutError / httpx.TimeoutException 等没有状态码的超时异常
+    return 'Timeout' in type(error).__name__
+
+
+class SlotTimer:
+    """并发名额的计时起点，调用方在名额内还需等待其他资源（如配额）时可重新计时"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+
+    def restart(self):
+        self.started = time.monotonic()
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    自适应并发限制器（AIMD）
+
+    同一模型端点的所有任务共享一个并发窗口：
+    - 请求成功且延迟正常时加性增大窗口（每完成一个窗口的请求约 +1）
+    - 收到 429/5xx/超时，或单位tokens延迟超过基线的 latency_tolerance 倍时乘性减小窗口
+    - 减小窗口后，减小之前已发出的请求不再触发减小，避免一次过载把窗口压到最低
+    窗口在 [min_limit, max_limit] 之间变化，max_limit 为模型配置的并发上限。
+    窗口已满时请求进入按用户和任务加权的公平队列（见 llm_scheduler），名额释放后按公平顺序分配。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+        interactive_weight: float = 4.0
+    ):
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(max(int(initial_limit), self.min_limit), self.max_limit))
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        # 等待名额的请求按用户和任务加权公平排队
+        self.queue = FairRequestQueue(interactive_weight)
+
+    async def acquire(self, cost: int = 1):
+        """等待并占用一个并发名额，有空闲名额且无人排队时立即返回"""
+        flow = current_flow.get()
+        if self.in_flight < int(self.limit) and not self.queue:
+            self.in_flight += 1
+            self.queue.charge(flow, cost)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.queue.push(flow, cost, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # 名额已分配但等待者被取消时归还名额
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """释放并发名额"""
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """把空闲名额分配给公平队列中的下一个请求"""
+        while self.in_flight < int(self.limit):
+            waiter = self.queue.pop()
+            if waiter is None:
+                break
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, cost: int = 1, cancel_token=None) -> AsyncIterator[SlotTimer]:
+        """
+        占用一个并发名额执行模型调用，并根据调用结果调整窗口
+
+        Args:
+            cost: 请求规模（如输入tokens数），用于把延迟归一化为单位tokens延迟
+            cancel_token: 取消令牌，等待名额期间请求取消时立即中断
+        """
+        if cancel_token:
+            await cancel_token.run(self.acquire(cost))
+        else:
+            await self.acquire(cost)
+        timer = SlotTimer()
+        try:
+            yield timer
+        except BaseException as e:
+            if isinstance(e, Exception) and is_overload_error(e):
+                self._decrease(timer.started, f"{type(e).__name__}")
+            raise
+        else:
+            self._on_success(timer.started, (time.monotonic() - timer.started) / max(1, cost))
+        finally:
+            self.release()
+
+    def _on_success(self, started: float, latency: float):
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency *= 1 + BASELINE_DRIFT
+        if latency > self.baseline_latency * self.latency_tolerance:
+            self._decrease(started, "延迟升高")
+        elif self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._dispatch()
+
+    def _decrease(self, started: float, reason: str):
+        if started < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        previous = int(self.limit)
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        logger.warning(f"🐢 模型 {self.name} 并发窗口 {previous} -> {int(self.limit)} ({reason})")
+
+
+# 按模型端点共享的并发限制器
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_lock = threading.Lock()
+
+
+def get_concurrency_limiter(model_config: Dict[str, Any]) -> Optional[AdaptiveConcurrencyLimiter]:
+    """
+    获取模型对应的共享并发限制器，未启用时返回None
+
+    并发上限取模型配置的 max_concurrency，未配置时使用 task_processing.concurrency.max_limit。
+
+    Args:
+        model_config: AI模型配置（ai_models[].config）
+    """
+    config = get_settings().concurrency_config
+    if not config.get('enabled', True):
+        return None
+    key = f"{model_config.get('base_url') or 'default'}|{model_config.get('model')}"
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = AdaptiveConcurrencyLimiter(
+                    name=model_config.get('model') or key,
+                    initial_limit=config.get('initial_limit', 4),
+                    min_limit=config.get('min_limit', 1),
+                    max_limit=model_config.get('max_concurrency') or config.get('max_limit', 32),
+                    backoff_ratio=config.get('backoff_ratio', 0.5),
+                    latency_tolerance=config.get('latency_tolerance', 2.0),
+                    interactive_weight=config.get('interactive_weight', 4)
+                )
+                _limiters[key] = limiter
+                logger.info(f"🚦 创建模型并发限制器: {key} (初始 {int(limiter.limit)}, 上限 {limiter.max_limit})")
+    return limiter
+
+
+def clear_concurrency_limiters():
+    """清空所有并发限制器"""
+    with _lock:
+        _limiters.clear()
@@ -1,21 +1,31 @@
 """文档预处理服务 - 负责章节提取和文档结构分析"""
+import asyncio
 import json
 import re
 import time
 import logging
-import asyncio
-from typing import List, Dict, Optional, Callable, Any
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-try:
-    from langchain_core.output_parsers import PydanticOutputParser
-except ImportError:
-    from langchain.output_parsers import PydanticOutputParser
+from typing import List, Dict, Optional, Callable, Any, Tuple
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
 from app.services.prompt_loader import prompt_loader
+from app.services.cancellation import CancellationToken, TaskCancelledError
+from app.services.model_registry import model_registry
+from app.services.llm_cache import llm_cache
+from app.services.text_chunker import TokenChunker
+from app.services.concurrency_limiter import get_concurrency_limiter
+from app.services.rate_limiter import get_rate_limiter, model_call_slot
+from app.services.model_router import model_router
+from app.services.json_repair import parse_model_output, repair_messages, structured_output_kwargs
+from app.services.structure_extractor import LocalStructureExtractor
+from app.services.text_normalizer import normalize_text
 from app.models.ai_output import AIOutput
+from app.core.config import get_settings
+
+
+# 预处理输出包含章节原文，窗口tokens不超过输出上限的该比例（其余留给JSON结构）
+PREPROCESS_OUTPUT_RATIO = 0.7
 
 
 # 定义文档章节模型
@@ -31,6 +41,18 @@ class DocumentStructure(BaseModel):
     sections: List[DocumentSection] = Field(description="文档章节列表")
 
 
+class OutlineHeading(BaseModel):
+    """章节标题位置"""
+    line: int = Field(description="标题所在行的行号")
+    title: str = Field(description="标题文本，照抄该行内容")
+    level: int = Field(description="标题层级，1为一级标题，2为二级标题等")
+
+
+class DocumentOutline(BaseModel):
+    """文档结构提纲（只包含标题位置，不包含正文）"""
+    headings: List[OutlineHeading] = Field(description="按行号顺序排列的章节标题列表")
+
+
 class DocumentProcessor:
     """文档预处理服务 - 专门负责文档结构分析和章节提取"""
     
@@ -45,8 +67,8 @@ class DocumentProcessor:
         self.db = db_session
         self.model_config = model_config
         
-        # 初始化日志
-        self.logger = logging.getLogger(f"document_processor.{id(self)}")
+        # 初始化日志（所有实例共用同一个logger，处理器只添加一次）
+        self.logger = logging.getLogger("document_processor")
         self.logger.setLevel(logging.INFO)
         
         # 确保日志能输出到控制台
@@ -76,19 +98,29 @@ class DocumentProcessor:
         self.logger.info(f"🔑 API密钥状态: {'已配置' if self.api_key else '未配置'} (前6位: {self.api_key[:6]}...)")
         
         try:
-            # 初始化ChatOpenAI模型 - 支持多种兼容OpenAI API的提供商
-            self.model = ChatOpenAI(
-                api_key=self.api_key,
-                base_url=self.api_base,
-                model=self.model_name,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                request_timeout=self.timeout,
-                max_retries=self.max_retries
-            )
+            # 从注册表获取进程内共享的模型客户端
+            self.model = model_registry.get_chat_model(model_config)
             
             # 初始化解析器
-            self.structure_parser = PydanticOutputParser(pydantic_object=DocumentStructure)
+            self.structure_parser = model_registry.get_parser(DocumentStructure)
+            self.outline_parser = model_registry.get_parser(DocumentOutline)
+            
+            # 预处理协议：outline 只让模型返回标题行号，正文在本地切分；full 由模型返回完整章节正文
+            task_config = get_settings().task_processing_config
+            self.preprocess_mode = task_config.get('preprocess_mode', 'full')
+            self.outline_line_chars = int(task_config.get('outline_line_chars', 120))
+            # 输出无法在本地修复时只请求模型修复JSON格式
+            self.repair_reask = task_config.get('repair_reask', True)
+            
+            # 按模型上下文窗口切分超长文档
+            self.chunker = TokenChunker(model_config)
+            
+            # 与问题检测共享同一模型的并发窗口和公平队列
+            self.limiter = get_concurrency_limiter(model_config)
+            self.rate_limiter = get_rate_limiter(model_config)
+            
+            # Markdown/DOCX/TXT 优先按已有标题结构本地切分
+            self.structure_extractor = LocalStructureExtractor()
             self.logger.info("✅ 文档处理器初始化成功")
             
         except Exception as e:
@@ -99,35 +131,391 @@ class DocumentProcessor:
         self, 
         text: str, 
         task_id: Optional[int] = None,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        file_type: Optional[str] = None,
+        file_path: Optional[str] = None
     ) -> List[Dict]:
         """
-        预处理文档：章节分割和内容整理 - 通过AI一次性完成
+        预处理文档：章节分割和内容整理 - 通过AI完成
+        
+        Markdown/DOCX/TXT 的标题结构可以本地识别时直接按标题切分，不调用模型；
+        PDF 或本地识别置信度低的文档才调用模型：
+        - full 协议（默认）：模型返回清理后的完整章节正文
+        - outline 协议：模型只返回标题行号和层级，章节正文按行号从原文切分并在本地清理换行
+        
+        超出模型输入预算的文档按map-reduce方式处理：切分为多个窗口并发分析（map），再合并各窗口结果（reduce），不再截断原文。
         
         Args:
             text: 文档文本内容
             task_id: 任务ID
             progress_callback: 进度回调函数
+            cancel_token: 取消令牌，取消时中断进行中的模型调用
+            file_type: 文件类型（md/docx/txt/pdf），为空时根据 file_path 扩展名判断
+            file_path: 原始文件路径，DOCX 本地提取需要读取标题样式
             
         Returns:
             章节列表
         """
         self.logger.info("📝 开始文档预处理...")
-        start_time = time.time()
         
         if progress_callback:
             await progress_callback("开始分析文档结构...", 5)
         
+        start_time = time.time()
+        local_sections = self.structure_extractor.extract(text, file_type, file_path)
+        if local_sections is not None:
+            processing_time = time.time() - start_time
+            self.logger.info(f"📑 本地结构提取完成，识别到 {len(local_sections)} 个章节，跳过模型预处理")
+            if self.db and task_id:
+                self.db.add(AIOutput(
+                    task_id=task_id,
+                    operation_type="preprocess",
+                    input_text=text,
+                    raw_output="",
+                    parsed_output={"sections": local_sections, "source": "local"},
+                    processing_time=processing_time,
+                    status="success"
+                ))
+                self.db.commit()
+            if progress_callback:
+                await progress_callback(f"文档解析完成（本地结构提取），识别到 {len(local_sections)} 个章节", 20)
+            return local_sections
+        
+        if self.preprocess_mode == 'outline':
+            sections_list = await self._preprocess_outline(text, task_id, progress_callback, cancel_token)
+        else:
+            sections_list = await self._preprocess_full(text, task_id, progress_callback, cancel_token)
+        
+        if progress_callback:
+            await progress_callback(f"文档解析完成，识别到 {len(sections_list)} 个章节", 20)
+        
+        self.logger.info(f"✅ 文档预处理完成，识别到 {len(sections_list)} 个章节")
+        return sections_list
+    
+    async def _map_windows(
+        self,
+        windows: List[Any],
+        worker: Callable,
+        progress_callback: Optional[Callable] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Any]:
+        """map：各窗口并发调用模型，并发数受配置限制，结果按窗口顺序返回"""
+        if len(windows) > 1:
+            self.logger.info(f"🧩 文档超出单次请求预算，切分为 {len(windows)} 个窗口分析")
+        if progress_callback:
+            await progress_callback("正在调用AI模型分析文档...", 10)
+        
+        semaphore = asyncio.Semaphore(max(1, int(self.chunker.preprocess_concurrency)))
+        finished = 0
+        
+        async def run(window):
+            nonlocal finished
+            async with semaphore:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                result = await worker(window)
+            finished += 1
+            if progress_callback and len(windows) > 1:
+                await progress_callback(
+                    f"文档结构分析进度 {finished}/{len(windows)}", 10 + int(finished / len(windows) * 8)
+                )
+            return result
+        
+        return await asyncio.gather(*[run(window) for window in windows])
+    
+    async def _preprocess_full(
+        self,
+        text: str,
+        task_id: Optional[int],
+        progress_callback: Optional[Callable],
+        cancel_token: Optional[CancellationToken]
+    ) -> List[Dict]:
+        """full 协议：模型返回完整章节正文，按窗口顺序拼接并修复跨窗口边界被截断的章节"""
+        # 系统提示词 + 输出格式说明构成所有窗口和任务字节相同的前缀
+        system_prompt = prompt_loader.get_system_prompt(
+            'document_preprocess', format_instructions=model_registry.get_format_instructions(DocumentStructure)
+        )
+        windows = self._split_windows(text, system_prompt)
+        
+        window_sections = await self._map_windows(
+            windows,
+            lambda window: self._preprocess_window(window, system_prompt, task_id, cancel_token),
+            progress_callback,
+            cancel_token
+        )
+        return self._stitch_windows(windows, window_sections)
+    
+    async def _preprocess_outline(
+        self,
+        text: str,
+        task_id: Optional[int],
+        progress_callback: Optional[Callable],
+        cancel_token: Optional[CancellationToken]
+    ) -> List[Dict]:
+        """
+        outline 协议：模型只返回标题的行号、标题文本和层级，输出tokens与文档长度无关
+        
+        行号是整篇文档的全局行号，各窗口的标题直接合并，不存在跨窗口拼接问题。
+        """
+        lines = text.splitlines()
+        system_prompt = prompt_loader.get_system_prompt(
+            'document_preprocess_outline', format_instructions=model_registry.get_format_instructions(DocumentOutline)
+        )
+        windows = self._outline_windows(lines, system_prompt)
+        
+        window_headings = await self._map_windows(
+            windows,
+            lambda window: self._outline_window(lines, window, system_prompt, task_id, cancel_token),
+            progress_callback,
+            cancel_token
+        )
+        
+        headings: Dict[int, Dict] = {}
+        for heading in (heading for result in window_headings for heading in result or []):
+            headings.setdefault(heading['line'], heading)
+        return self._build_outline_sections(lines, [headings[line] for line in sorted(headings)])
+    
+    def _numbered_line(self, lines: List[str], index: int) -> str:
+        """带行号的行内容，过长的行只保留开头（识别标题只需要行首）"""
+        line = lines[index].strip()
+        if len(line) > self.outline_line_chars:
+            line = line[:self.outline_line_chars] + "…"
+        return f"{index + 1}| {line}"
+    
+    def _outline_windows(self, lines: List[str], system_prompt: str) -> List[Tuple[int, int]]:
+        """按输入预算将文档行切分为窗口，返回 [起始行, 结束行) 列表"""
+        prompt_overhead = self.chunker.count(system_prompt) + self.chunker.count(
+            prompt_loader.get_user_prompt('document_preprocess_outline', document_content="")
+        )
+        budget = self.chunker.input_budget(prompt_overhead)
+        windows = []
+        start, used = 0, 0
+        for index, line in enumerate(lines):
+            if not line.strip():
+                continue
+            tokens = self.chunker.count(self._numbered_line(lines, index)) + 1
+            if used and used + tokens > budget:
+                windows.append((start, index))
+                start, used = index, 0
+            used += tokens
+        windows.append((start, len(lines)))
+        return windows
+    
+    async def _outline_window(
+        self,
+        lines: List[str],
+        window: Tuple[int, int],
+        system_prompt: str,
+        task_id: Optional[int] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Optional[List[Dict]]:
+        """识别单个窗口内的标题位置，失败时返回None"""
+        start, end = window
+        start_time = time.time()
+        numbered = "\n".join(self._numbered_line(lines, index) for index in range(start, end) if lines[index].strip())
+        ai_output = None
+        
         try:
-            # 从模板加载提示词
-            system_prompt = prompt_loader.get_system_prompt('document_preprocess')
+            user_prompt = prompt_loader.get_user_prompt('document_preprocess_outline', document_content=numbered)
+            messages = [
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=user_prompt)
+            ]
             
-            # 构建用户提示
-            user_prompt = prompt_loader.get_user_prompt(
-                'document_preprocess',
-                format_instructions=self.structure_parser.get_format_instructions(),
-                document_content=text[:10000]  # 限制长度以避免超出token限制
+            cache_key = llm_cache.make_key(
+                self.model_name, "preprocess_outline", llm_cache.prompt_version(system_prompt), user_prompt
+            )
+            cached_content = await llm_cache.aget(cache_key)
+            answered: Dict = {}
+            if cached_content is not None:
+                self.logger.info("⚡ 文档结构提纲命中响应缓存")
+                response = AIMessage(content=cached_content)
+            else:
+                self.logger.info(f"📤 调用AI模型识别章节标题 (第 {start + 1}-{end} 行)")
+                response = await self._call_ai_model(messages, cancel_token, DocumentOutline, answered)
+            processing_time = time.time() - start_time
+            self.logger.info(f"📥 收到结构提纲响应 (耗时: {processing_time:.2f}s)")
+            
+            if self.db and task_id:
+                ai_output = AIOutput(
+                    task_id=task_id,
+                    operation_type="preprocess",
+                    input_text=numbered,
+                    raw_output=response.content,
+                    processing_time=processing_time,
+                    status="success"
+                )
+            
+            content = response.content if isinstance(response.content, str) else ""
+            result, truncated = parse_model_output(content, 'headings')
+            if result is None and '{' in content and self.repair_reask:
+                self.logger.warning("🩹 结构提纲响应无法解析，请求模型修复JSON格式")
+                result = await self._repair_output(content, DocumentOutline, 'headings', cancel_token)
+                if result is not None:
+                    content = json.dumps(result, ensure_ascii=False)
+            elif truncated and result is not None:
+                self.logger.warning(f"⚠️ 结构提纲响应被截断，保留 {len(result.get('headings', []))} 个完整的标题")
+            if result is None:
+                raise ValueError("结构提纲响应中未找到有效的JSON")
+            headings = self._validate_outline(lines, window, result.get('headings', []))
+            self.logger.info(f"✅ 结构提纲解析成功，{len(headings)} 个标题")
+            
+            if cached_content is None:
+                await llm_cache.aset(
+                    self._answered_cache_key(cache_key, answered, "preprocess_outline", system_prompt, user_prompt),
+                    content
+                )
+            if ai_output is not None:
+                ai_output.parsed_output = {"headings": headings}
+                self.db.add(ai_output)
+                self.db.commit()
+            return headings
+            
+        except TaskCancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"❌ 结构提纲识别失败 (第 {start + 1}-{end} 行): {str(e)}")
+            if self.db and task_id:
+                if ai_output is None:
+                    ai_output = AIOutput(
+                        task_id=task_id,
+                        operation_type="preprocess",
+                        input_text=numbered,
+                        raw_output="",
+                        processing_time=time.time() - start_time
+                    )
+                ai_output.status = "parsing_error" if ai_output.raw_output else "failed"
+                ai_output.error_message = str(e)
+                self.db.add(ai_output)
+                self.db.commit()
+            return None
+    
+    def _validate_outline(self, lines: List[str], window: Tuple[int, int], headings: List[Dict]) -> List[Dict]:
+        """
+        校验模型返回的标题位置
+        
+        标题文本与行号所在行不一致时，在附近几行中按标题文本重新定位；仍找不到的标题丢弃。
+        """
+        start, end = window
+        valid = []
+        for heading in headings:
+            if not isinstance(heading, dict):
+                continue
+            title = self._normalize_heading(str(heading.get('title', '')))
+            try:
+                line = int(heading.get('line')) - 1
+            except (TypeError, ValueError):
+                continue
+            candidates = [line] + [line + offset for delta in range(1, 4) for offset in (-delta, delta)]
+            matched = next(
+                (index for index in candidates if start <= index < end and self._anchor_matches(lines[index], title)),
+                None
             )
+            if matched is None:
+                self.logger.debug(f"丢弃无法定位的标题: {heading}")
+                continue
+            try:
+                level = min(max(int(heading.get('level') or 1), 1), 6)
+            except (TypeError, ValueError):
+                level = 1
+            valid.append({'line': matched, 'title': lines[matched].strip().lstrip('#').strip(), 'level': level})
+        return valid
+    
+    def _anchor_matches(self, line: str, title: str) -> bool:
+        """标题文本（已归一化）与行内容是否一致"""
+        normalized = self._normalize_heading(line)
+        if not normalized:
+            return False
+        return not title or title in normalized or normalized in title
+    
+    @staticmethod
+    def _build_outline_sections(lines: List[str], headings: List[Dict]) -> List[Dict]:
+        """按标题行号从原文切分章节正文，并在本地清理换行"""
+        if not headings:
+            return [{"section_title": "文档内容", "content": normalize_text("\n".join(lines)), "level": 1}]
+        
+        sections = []
+        preamble = normalize_text("\n".join(lines[:headings[0]['line']]))
+        if preamble:
+            sections.append({"section_title": "文档内容", "content": preamble, "level": 1})
+        for index, heading in enumerate(headings):
+            end = headings[index + 1]['line'] if index + 1 < len(headings) else len(lines)
+            content = normalize_text("\n".join(lines[heading['line'] + 1:end]))
+            # 只有标题没有正文的上级标题不单独成章节
+            if content:
+                sections.append({"section_title": heading['title'], "content": content, "level": heading['level']})
+        return sections
+    
+    @staticmethod
+    def _normalize_heading(text: str) -> str:
+        """去掉标题标记、编号符号和空白，用于比较标题"""
+        return re.sub(r'[\s#*=_\-—:：.、]+', '', text or '')
+    
+    def _stitch_windows(self, windows: List[str], window_sections: List[List[Dict]]) -> List[Dict]:
+        """
+        按窗口顺序拼接章节
+        
+        窗口从章节中间开始时（窗口开头不是首个章节的标题），模型会为这段续写内容编造或重复标题，
+        此时将其并入上一个窗口的最后一个章节；与上一章节同名的首个章节同样视为续写。
+        """
+        stitched: List[Dict] = []
+        for index, (window, sections) in enumerate(zip(windows, window_sections)):
+            sections = [dict(section) for section in sections]
+            if stitched and sections:
+                first = sections[0]
+                title = self._normalize_heading(first.get('section_title', ''))
+                opening = next((line for line in window.splitlines() if line.strip()), "")
+                starts_with_heading = bool(title) and title in self._normalize_heading(opening)
+                same_as_previous = title == self._normalize_heading(stitched[-1].get('section_title', ''))
+                if not starts_with_heading or same_as_previous:
+                    self.logger.debug(f"🧵 窗口 {index + 1} 的首个章节并入上一章节: {first.get('section_title')}")
+                    previous = stitched[-1]
+                    previous['content'] = previous.get('content', '').rstrip() + "\n" + first.get('content', '').lstrip()
+                    sections = sections[1:]
+            stitched.extend(sections)
+        return stitched
+    
+    def _split_windows(self, text: str, system_prompt: str) -> List[str]:
+        """
+        按模型输入预算切分文档
+        
+        预处理的输出包含章节原文，窗口大小同时受输入预算和输出上限（max_tokens）约束。
+        """
+        prompt_overhead = self.chunker.count(system_prompt) + self.chunker.count(
+            prompt_loader.get_user_prompt('document_preprocess', document_content="")
+        )
+        budget = min(
+            self.chunker.input_budget(prompt_overhead),
+            int(self.max_tokens * PREPROCESS_OUTPUT_RATIO)
+        )
+        return self.chunker.split_text(text, budget)
+    
+    async def _preprocess_window(
+        self,
+        text: str,
+        system_prompt: str,
+        task_id: Optional[int] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Dict]:
+        """
+        分析单个窗口的章节结构，失败时将窗口原文作为单一章节返回
+        
+        Args:
+            text: 窗口文本
+            system_prompt: 系统提示词（包含输出格式说明）
+            task_id: 任务ID
+            cancel_token: 取消令牌
+            
+        Returns:
+            章节列表
+        """
+        start_time = time.time()
+        fallback = [{"section_title": "文档内容", "content": text, "level": 1}]
+        
+        try:
+            # 构建用户提示
+            user_prompt = prompt_loader.get_user_prompt('document_preprocess', document_content=text)
 
             # 创建消息
             messages = [
@@ -135,12 +523,19 @@ class DocumentProcessor:
                 HumanMessage(content=user_prompt)
             ]
             
-            if progress_callback:
-                await progress_callback("正在调用AI模型分析文档...", 10)
-            
             # 调用模型（仅在此处进行mock判断）
-            self.logger.info("📤 调用AI模型进行文档预处理")
-            response = await self._call_ai_model(messages)
+            # 相同模型、提示词模板和文档内容的响应直接从缓存读取
+            cache_key = llm_cache.make_key(
+                self.model_name, "preprocess", llm_cache.prompt_version(system_prompt), user_prompt
+            )
+            cached_content = await llm_cache.aget(cache_key)
+            answered: Dict = {}
+            if cached_content is not None:
+                self.logger.info("⚡ 文档预处理命中响应缓存")
+                response = AIMessage(content=cached_content)
+            else:
+                self.logger.info("📤 调用AI模型进行文档预处理")
+                response = await self._call_ai_model(messages, cancel_token, DocumentStructure, answered)
             processing_time = time.time() - start_time
             
             self.logger.info(f"📥 收到预处理响应 (耗时: {processing_time:.2f}s)")
@@ -150,15 +545,12 @@ class DocumentProcessor:
                 ai_output = AIOutput(
                     task_id=task_id,
                     operation_type="preprocess",
-                    input_text=text[:10000],  # 保存部分输入文本
+                    input_text=text,
                     raw_output=response.content,
                     processing_time=processing_time,
                     status="success"
                 )
             
-            if progress_callback:
-                await progress_callback("正在解析AI分析结果...", 15)
-            
             # 解析响应
             try:
                 content = response.content
@@ -168,45 +560,33 @@ class DocumentProcessor:
                 if isinstance(content, str):
                     self.logger.debug(f"响应长度: {len(content)} 字符")
                     
-                    # 查找JSON内容
-                    json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group()
-                        self.logger.debug(f"找到JSON (前200字符): {json_str[:200]}...")
+                    # 容错解析JSON；被截断的输出会丢失章节正文，按解析失败处理（修复格式也无法补回正文）
+                    result, truncated = parse_model_output(content, 'sections')
+                    if result is None and not truncated and '{' in content and self.repair_reask:
+                        self.logger.warning("🩹 预处理响应无法解析，请求模型修复JSON格式")
+                        result = await self._repair_output(content, DocumentStructure, 'sections', cancel_token)
+                        if result is not None:
+                            content = json.dumps(result, ensure_ascii=False)
+                    if result is not None and not truncated:
+                        sections_count = len(result.get('sections', []))
+                        self.logger.info(f"✅ 预处理JSON解析成功，包含 {sections_count} 个章节")
                         
-                        try:
-                            result = json.loads(json_str)
-                            sections_count = len(result.get('sections', []))
-                            self.logger.info(f"✅ 预处理JSON解析成功，包含 {sections_count} 个章节")
-                            
-                            if progress_callback:
-                                await progress_callback(f"文档解析完成，识别到 {sections_count} 个章节", 20)
-                                
-                        except json.JSONDecodeError as je:
-                            self.logger.error(f"❌ 预处理JSON解析失败: {str(je)}")
-                            self.logger.error(f"JSON内容: {json_str[:500]}...")
-                            # 如果没有找到JSON，返回原文作为单一章节
-                            result = {
-                                "sections": [{
-                                    "section_title": "文档内容",
-                                    "content": text,
-                                    "level": 1
-                                }]
-                            }
+                        # 只缓存解析成功的响应
+                        if cached_content is None:
+                            await llm_cache.aset(
+                                self._answered_cache_key(cache_key, answered, "preprocess", system_prompt, user_prompt),
+                                content
+                            )
                     else:
-                        self.logger.warning("⚠️ 预处理响应中未找到JSON格式")
+                        self.logger.warning(
+                            "⚠️ 预处理响应被截断" if truncated else "⚠️ 预处理响应中未找到有效的JSON"
+                        )
                         self.logger.debug(f"完整响应: {content[:1000]}...")
-                        # 如果没有找到JSON，返回原文作为单一章节
-                        result = {
-                            "sections": [{
-                                "section_title": "文档内容",
-                                "content": text,
-                                "level": 1
-                            }]
-                        }
+                        # 如果没有有效的JSON，返回原文作为单一章节
+                        result = {"sections": fallback}
                 else:
                     self.logger.warning(f"⚠️ 预处理响应不是字符串: {type(content)}")
-                    result = {"sections": [{"section_title": "文档内容", "content": text, "level": 1}]}
+                    result = {"sections": fallback}
                 
                 # 更新数据库中的解析结果
                 if self.db and task_id:
@@ -214,9 +594,7 @@ class DocumentProcessor:
                     self.db.add(ai_output)
                     self.db.commit()
                 
-                sections_list = result.get('sections', [])
-                self.logger.info(f"✅ 文档预处理完成，识别到 {len(sections_list)} 个章节")
-                return sections_list
+                return result.get('sections', [])
                 
             except Exception as e:
                 import traceback
@@ -231,11 +609,10 @@ class DocumentProcessor:
                     self.db.add(ai_output)
                     self.db.commit()
                 
-                if progress_callback:
-                    await progress_callback("文档解析失败，使用原始文档", 20)
-                
-                return [{"section_title": "文档内容", "content": text, "level": 1}]
+                return fallback
                 
+        except TaskCancelledError:
+            raise
         except Exception as e:
             self.logger.error(f"❌ 文档预处理失败: {str(e)}")
             processing_time = time.time() - start_time
@@ -245,7 +622,7 @@ class DocumentProcessor:
                 ai_output = AIOutput(
                     task_id=task_id,
                     operation_type="preprocess",
-                    input_text=text[:10000],
+                    input_text=text,
                     raw_output="",
                     status="failed",
                     error_message=str(e),
@@ -254,11 +631,8 @@ class DocumentProcessor:
                 self.db.add(ai_output)
                 self.db.commit()
             
-            if progress_callback:
-                await progress_callback("文档预处理失败，使用原始文档", 20)
-            
             # 返回原始文本作为单一章节
-            return [{"section_title": "文档内容", "content": text, "level": 1}]
+            return fallback
     
     def validate_sections(self, sections: List[Dict]) -> List[Dict]:
         """
@@ -299,18 +673,82 @@ class DocumentProcessor:
         self.logger.info(f"📊 章节验证完成: {len(sections)} -> {len(valid_sections)}")
         return valid_sections
     
-    async def _call_ai_model(self, messages):
+    async def _call_ai_model(
+        self,
+        messages,
+        cancel_token: Optional[CancellationToken] = None,
+        output_schema: Optional[type] = None,
+        answered: Optional[Dict] = None
+    ):
         """
         调用AI模型（仅在此方法内进行mock判断）
         
         Args:
             messages: 消息列表
+            cancel_token: 取消令牌，取消时中断等待
+            output_schema: 输出模型，模型配置了 structured_output 时按其JSON Schema约束解码
+            answered: 传入时在其中记录实际应答的模型配置（config），主模型失败转移到备用模型时为备用模型
             
         Returns:
             AI模型响应
         """
-        # 直接进行真实的AI调用
-        return await asyncio.to_thread(self.model.invoke, messages)
+        async def invoke(config: Dict):
+            # 按请求tokens在模型的公平队列中排队，获得并发名额和配额后再调用
+            primary = config is self.model_config
+            model = self.model if primary else model_registry.get_chat_model(config)
+            kwargs = structured_output_kwargs(config, output_schema)
+            async with model_call_slot(
+                self.limiter if primary else get_concurrency_limiter(config),
+                self.rate_limiter if primary else get_rate_limiter(config),
+                self.chunker.count(messages[-1].content),
+                sum(self.chunker.count(message.content) for message in messages),
+                cancel_token,
+                config.get('model')
+            ) as usage:
+                response = await self._invoke(messages, cancel_token, model.bind(**kwargs) if kwargs else model)
+                usage.record(response)
+            return config, response
+        
+        # 经由路由器调用：主模型熔断或失败时转移到备用模型，慢请求可对冲
+        config, response = await model_router.call(self.model_config, invoke)
+        if answered is not None:
+            answered['config'] = config
+        return response
+    
+    def _answered_cache_key(
+        self, cache_key: str, answered: Dict, operation: str, system_prompt: str, user_prompt: str
+    ) -> str:
+        """写入缓存的键：备用模型应答时按备用模型计算，主模型恢复后不会读到备用模型的响应"""
+        config = answered.get('config', self.model_config)
+        if config is self.model_config:
+            return cache_key
+        return llm_cache.make_key(config.get('model'), operation, llm_cache.prompt_version(system_prompt), user_prompt)
+    
+    async def _repair_output(
+        self,
+        content: str,
+        output_schema: type,
+        key: str,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Optional[Dict]:
+        """只把无法解析的输出发回模型修复JSON格式（不重新发送文档内容），仍无法解析时返回None"""
+        messages = repair_messages(content, model_registry.get_format_instructions(output_schema))
+        try:
+            response = await self._call_ai_model(messages, cancel_token, output_schema)
+        except TaskCancelledError:
+            raise
+        except Exception as e:
+            self.logger.warning(f"⚠️ 请求模型修复JSON格式失败: {str(e)}")
+            return None
+        result, _ = parse_model_output(response.content, key)
+        return result
+    
+    async def _invoke(self, messages, cancel_token: Optional[CancellationToken] = None, model=None):
+        # 原生异步调用，并发请求只占用协程和连接池连接
+        call = (model or self.model).ainvoke(messages)
+        if cancel_token:
+            return await cancel_token.run(call)
+        return await call
     
     async def analyze_document(self, text: str, prompt_type: str = "preprocess") -> Dict[str, Any]:
         """
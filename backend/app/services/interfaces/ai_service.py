@@ -0,0 +1,24 @@
+"""
+AI服务提供者抽象接口
+"""
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class IAIServiceProvider(ABC):
+    """AI服务提供者抽象接口，处理链通过它获取文档预处理器和问题检测器"""
+    
+    @abstractmethod
+    def get_document_processor(self) -> Any:
+        """获取文档预处理器"""
+        pass
+    
+    @abstractmethod
+    def get_issue_detector(self) -> Any:
+        """获取问题检测器"""
+        pass
+    
+    @abstractmethod
+    def get_provider_name(self) -> str:
+        """获取提供者名称"""
+        pass
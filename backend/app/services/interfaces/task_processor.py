@@ -20,6 +20,7 @@ class TaskProcessingStep(Enum):
     FILE_PARSING = "file_parsing"
     DOCUMENT_PROCESSING = "document_processing"
     SECTION_MERGE = "section_merge"
+    RULE_CHECK = "rule_check"
     ISSUE_DETECTION = "issue_detection"
     RESULT_VALIDATION = "result_validation"
     REPORT_GENERATION = "report_generation"
@@ -49,8 +50,19 @@ class ITaskProcessor(ABC):
     
     async def handle(self, context: Dict[str, Any], progress_callback: Optional[Callable] = None) -> ProcessingResult:
         """责任链处理逻辑"""
+        # 每个步骤开始前检查取消请求
+        cancel_token = context.get('cancel_token')
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        
         if await self.can_handle(context):
-            result = await self.process(context, progress_callback)
+            result = self.restore_checkpoint(context)
+            if result is None:
+                result = await self.process(context, progress_callback)
+                if result.success:
+                    self.save_checkpoint(context, result)
+            elif progress_callback:
+                await progress_callback(f"从检查点恢复步骤: {self.step_type.value}", None)
             
             # 如果处理成功，更新上下文
             if result.success:
@@ -72,6 +84,26 @@ class ITaskProcessor(ABC):
             success=False, 
             error=f"没有处理器能够处理步骤: {self.step_type.value}"
         )
+    
+    def restore_checkpoint(self, context: Dict[str, Any]) -> Optional[ProcessingResult]:
+        """从上下文中的检查点存储恢复本步骤结果，没有检查点时返回None"""
+        store = context.get('checkpoint_store')
+        if not store:
+            return None
+        checkpoint = store.load(self.step_type.value)
+        if not checkpoint:
+            return None
+        return ProcessingResult(
+            success=True,
+            data=checkpoint.get('data'),
+            metadata=dict(checkpoint.get('metadata') or {})
+        )
+    
+    def save_checkpoint(self, context: Dict[str, Any], result: ProcessingResult):
+        """将本步骤的成功结果保存到检查点存储"""
+        store = context.get('checkpoint_store')
+        if store:
+            store.save(self.step_type.value, result.data, result.metadata)
 
 
 class IFileParser(ABC):
@@ -97,6 +129,11 @@ class IProcessingChain(ABC):
         pass
     
     @abstractmethod
-    async def execute(self, context: Dict[str, Any], progress_callback: Optional[Callable] = None) -> ProcessingResult:
+    async def execute(
+        self,
+        context: Dict[str, Any],
+        progress_callback: Optional[Callable] = None,
+        cancel_token=None
+    ) -> ProcessingResult:
         """执行处理链"""
         pass
\ No newline at end of file
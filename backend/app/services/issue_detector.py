@@ -1,20 +1,26 @@
 """静态问题检测服务 - 负责检测文档中的质量问题"""
+import hashlib
 import json
 import re
 import time
 import logging
 import asyncio
 from typing import List, Dict, Optional, Callable, Any
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-try:
-    from langchain_core.output_parsers import PydanticOutputParser
-except ImportError:
-    from langchain.output_parsers import PydanticOutputParser
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
 from app.services.prompt_loader import prompt_loader
+from app.services.cancellation import CancellationToken, TaskCancelledError
+from app.services.model_registry import model_registry
+from app.services.llm_cache import llm_cache
+from app.services.issue_stream_parser import IncrementalIssueParser
+from app.services.json_repair import parse_model_output, repair_messages, structured_output_kwargs
+from app.services.text_chunker import TokenChunker
+from app.services.concurrency_limiter import get_concurrency_limiter
+from app.services.rate_limiter import RequestUsage, get_rate_limiter, model_call_slot
+from app.services.model_router import model_router
+from app.services.rule_checker import RuleChecker
 from app.models.ai_output import AIOutput
 from app.core.config import get_settings
 
@@ -39,6 +45,65 @@ class DocumentIssues(BaseModel):
     issues: List[DocumentIssue] = Field(description="发现的所有问题", default=[])
 
 
+class PackedDocumentIssue(DocumentIssue):
+    """打包请求中的文档问题"""
+    section_id: str = Field(description="问题所在章节的编号，即章节分隔行 \"=== [编号] 标题 ===\" 中方括号内的编号，如 S1")
+
+
+class PackedDocumentIssues(BaseModel):
+    """打包请求的文档问题列表"""
+    issues: List[PackedDocumentIssue] = Field(description="所有章节中发现的问题", default=[])
+
+
+class CompactDocumentIssue(BaseModel):
+    """紧凑输出格式的文档问题：短字段名、严重等级代码，原文和上下文用行号定位后在本地还原"""
+    t: str = Field(description="问题类型，2-6个字，如'错别字'、'语法错误'、'逻辑不通'")
+    d: str = Field(description="问题描述，说明问题的表现和影响，至少30字")
+    s: int = Field(description="严重等级代码：0致命（导致无法使用或严重误导）/1严重（影响核心功能理解）/2一般（影响质量但不影响理解）/3提示（优化建议）")
+    c: float = Field(description="置信度，范围0.0-1.0", default=0.8)
+    l: int = Field(description="问题所在行的行号，即章节内容中该行开头 \"行号| \" 的数字")
+    q: str = Field(description="从该行照抄的问题原文，不超过15字，不含行号前缀")
+    r: str = Field(description="修改建议：直接给出替换问题原文的完整内容")
+
+
+class CompactDocumentIssues(BaseModel):
+    """紧凑输出格式的文档问题列表"""
+    issues: List[CompactDocumentIssue] = Field(description="发现的所有问题", default=[])
+
+
+class PackedCompactDocumentIssue(CompactDocumentIssue):
+    """打包请求中紧凑输出格式的文档问题"""
+    i: str = Field(description="问题所在章节的编号，即章节分隔行 \"=== [编号] 标题 ===\" 中方括号内的编号，如 S1")
+
+
+class PackedCompactDocumentIssues(BaseModel):
+    """打包请求紧凑输出格式的文档问题列表"""
+    issues: List[PackedCompactDocumentIssue] = Field(description="所有章节中发现的问题", default=[])
+
+
+# 打包请求追加在格式说明之后（field 为章节编号字段名）
+PACKED_REQUEST_NOTE = (
+    "\n\n本次请求包含多个相互独立的章节，每个章节以 \"=== [编号] 标题 ===\" 开头。"
+    "请分别检测每个章节，并在每个问题的 {field} 中填写问题所在章节的编号。"
+)
+# 紧凑输出格式追加在格式说明之后
+COMPACT_REQUEST_NOTE = (
+    "\n\n请使用上述紧凑格式输出，以格式说明中的字段为准：章节内容的每一行以 \"行号| \" 开头，"
+    "用 l 给出问题所在行号、q 照抄不超过15字的问题原文，不需要输出上下文、对用户的影响和推理过程。"
+)
+# 严重等级代码（紧凑输出格式的 s 字段）
+SEVERITY_CODES = ('致命', '严重', '一般', '提示')
+# 紧凑输出格式的行号前缀按四位行号估算tokens，规划请求块时计入预算
+LINE_PREFIX_SAMPLE = "9999| "
+SEPARATOR_PATTERN = re.compile(r'^=== \[(S\d+)\] .* ===$')
+
+
+def section_key(section: Dict) -> str:
+    """章节内容哈希，用于检查点恢复和修订版本的章节比对"""
+    raw = f"{section.get('section_title', '')}\n{section.get('content', '')}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
 class IssueDetector:
     """静态问题检测服务 - 专门负责文档质量问题检测"""
     
@@ -53,8 +118,15 @@ class IssueDetector:
         self.db = db_session
         self.model_config = model_config
         
-        # 初始化日志
-        self.logger = logging.getLogger(f"issue_detector.{id(self)}")
+        # 最近一次检测中失败的章节，供调用方判断是否需要重试
+        self.failed_sections: List[Dict] = []
+        # 最近一次检测的模型请求数和tokens用量
+        self.usage: Dict[str, int] = {}
+        # 保存AI输出记录时的操作类型（级联检测的初筛层使用单独的类型）
+        self.operation_type = "detect_issues"
+        
+        # 初始化日志（所有实例共用同一个logger，处理器只添加一次）
+        self.logger = logging.getLogger("issue_detector")
         self.logger.setLevel(logging.INFO)
         
         # 确保日志能输出到控制台
@@ -78,19 +150,20 @@ class IssueDetector:
         self.logger.info(f"🔍 问题检测器初始化: Provider={self.provider}, Model={self.model_name}")
         
         try:
-            # 初始化ChatOpenAI模型
-            self.model = ChatOpenAI(
-                api_key=self.api_key,
-                base_url=self.api_base,
-                model=self.model_name,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                request_timeout=self.timeout,
-                max_retries=self.max_retries
-            )
+            # 从注册表获取进程内共享的模型客户端
+            self.model = model_registry.get_chat_model(model_config)
             
             # 初始化解析器
-            self.issues_parser = PydanticOutputParser(pydantic_object=DocumentIssues)
+            self.issues_parser = model_registry.get_parser(DocumentIssues)
+            self.packed_issues_parser = model_registry.get_parser(PackedDocumentIssues)
+            
+            # 按模型上下文窗口规划每次请求的章节内容
+            self.chunker = TokenChunker(model_config)
+            
+            # 同一模型的所有任务共享自适应并发窗口
+            self.limiter = get_concurrency_limiter(model_config)
+            # 模型配置了 rpm/tpm 时按配额限流
+            self.rate_limiter = get_rate_limiter(model_config)
             self.logger.info("✅ 问题检测器初始化成功")
             
         except Exception as e:
@@ -101,20 +174,34 @@ class IssueDetector:
         self, 
         sections: List[Dict], 
         task_id: Optional[int] = None,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        completed_sections: Optional[Dict[str, List[Dict]]] = None,
+        on_section_complete: Optional[Callable] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        on_issue: Optional[Callable] = None
     ) -> List[Dict]:
         """
         检测文档问题 - 使用异步批量处理
         
+        章节按模型的输入预算规划为请求块：超长章节按段落/句子切分为多个块，短章节打包到同一个块，
+        检测结果仍按章节汇总（检查点、增量分析均以章节为单位）。
+        
         Args:
             sections: 文档章节列表
             task_id: 任务ID
             progress_callback: 进度回调函数
+            completed_sections: 已完成章节的结果（章节哈希 -> 问题列表），这些章节不再调用模型
+            on_section_complete: 章节检测成功后的异步回调，参数为 (章节哈希, 问题列表)
+            cancel_token: 取消令牌，取消后未开始的章节不再检测，进行中的模型调用被中断
+            on_issue: 单个问题生成后的异步回调；提供时以流式方式调用模型，每个问题对象闭合后立即回调
             
         Returns:
             问题列表
         """
         self.logger.info(f"🔍 开始检测文档问题，共 {len(sections)} 个章节")
+        self.failed_sections = []
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+        completed_sections = completed_sections or {}
         
         # 过滤掉太短的章节
         valid_sections = [
@@ -132,44 +219,149 @@ class IssueDetector:
         if progress_callback:
             await progress_callback(f"开始检测 {len(valid_sections)} 个章节的问题...", 25)
         
+        # 系统提示词 + 输出格式说明构成所有章节和任务字节相同的前缀（单章节请求和打包请求各一个），
+        # 章节标题和内容只出现在用户提示词中，服务端可以缓存前缀；规则检查已覆盖的类别不再让模型检测
+        settings = get_settings()
+        task_config = settings.task_processing_config
+        skip_note = RuleChecker(settings.rule_check_config).prompt_skip_note()
+        # 紧凑输出格式：短字段名、严重等级代码和行号定位，减少输出tokens，问题在本地还原为完整字段
+        compact = task_config.get('compact_issues', False)
+        if compact:
+            schema, packed_schema = CompactDocumentIssues, PackedCompactDocumentIssues
+            format_note, section_field = COMPACT_REQUEST_NOTE, 'i'
+        else:
+            schema, packed_schema = DocumentIssues, PackedDocumentIssues
+            format_note, section_field = "", 'section_id'
+        system_prompt = prompt_loader.get_system_prompt(
+            'document_detect_issues',
+            format_instructions=model_registry.get_format_instructions(schema) + format_note
+        ) + skip_note
+        packed_system_prompt = prompt_loader.get_system_prompt(
+            'document_detect_issues',
+            format_instructions=model_registry.get_format_instructions(packed_schema) + format_note
+            + PACKED_REQUEST_NOTE.format(field=section_field)
+        ) + skip_note
+        # 输出无法在本地修复时是否只请求模型修复格式（否则章节记为失败，重试任务时重新检测）
+        repair_reask = task_config.get('repair_reask', True)
+        
+        # 已有检查点结果的章节直接复用，其余章节按输入预算规划请求块
+        keys = [section_key(section) for section in valid_sections]
+        section_issues: Dict[int, List[Dict]] = {}
+        pending_indexes = []
+        for index, key in enumerate(keys):
+            if key in completed_sections:
+                self.logger.debug(f"♻️ 章节 '{valid_sections[index].get('section_title')}' 使用检查点结果")
+                section_issues[index] = [dict(issue) for issue in completed_sections[key]]
+            else:
+                pending_indexes.append(index)
+                section_issues[index] = []
+        
+        prompt_overhead = self.chunker.count(
+            packed_system_prompt if self.chunker.pack_sections else system_prompt
+        ) + self.chunker.count(
+            prompt_loader.get_user_prompt('document_detect_issues', section_title="", section_content="")
+        )
+        budget = self.chunker.input_budget(prompt_overhead)
+        self.chunker.line_prefix_tokens = self.chunker.count(LINE_PREFIX_SAMPLE) if compact else 0
+        chunks = self.chunker.plan_sections([valid_sections[index] for index in pending_indexes], budget)
+        for chunk in chunks:
+            chunk['members'] = [pending_indexes[member] for member in chunk['members']]
+        self.logger.info(
+            f"🧩 {len(pending_indexes)} 个待检测章节规划为 {len(chunks)} 个请求 (每个请求正文预算 {budget} tokens)"
+        )
+        
+        # 章节的所有请求块都成功后才算完成
+        remaining_chunks = {index: 0 for index in pending_indexes}
+        for chunk in chunks:
+            for member in chunk['members']:
+                remaining_chunks[member] += 1
+        failed_indexes = set()
+        
+        def assign(issue: Dict, chunk: Dict) -> int:
+            """将问题归属到请求块内的章节，并添加章节信息"""
+            if compact:
+                self._expand_compact(issue, chunk)
+            member = self._attribute(issue, chunk, valid_sections)
+            self._tag_location(issue, valid_sections[member].get('section_title', '未知章节'))
+            section_issues[member].append(issue)
+            return member
+        
         # 创建异步检测任务
-        async def detect_section_issues(section: Dict, index: int) -> List[Dict]:
-            """异步检测单个章节的问题"""
-            section_title = section.get('section_title', '未知章节')
-            section_content = section.get('content', '')
+        async def detect_chunk_issues(chunk: Dict, index: int, tokens: int) -> bool:
+            """异步检测单个请求块的问题，返回是否成功"""
+            section_title = chunk.get('section_title', '未知章节')
+            section_content = chunk.get('content', '')
             section_start_time = time.time()
+            # 打包多个章节的请求使用带章节编号的输出格式
+            packed = len(chunk['members']) > 1
+            output_schema = packed_schema if packed else schema
+            
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
             
             # 更新进度
-            progress = 25 + int((index / len(valid_sections)) * 65)
+            progress = 25 + int((index / len(chunks)) * 65)
             if progress_callback:
-                await progress_callback(f"正在检测章节 {index + 1}/{len(valid_sections)}: {section_title}", progress)
+                await progress_callback(f"正在检测章节 {index + 1}/{len(chunks)}: {section_title}", progress)
             
-            self.logger.debug(f"🔍 [{index + 1}/{len(valid_sections)}] 检测章节: {section_title}")
+            self.logger.debug(f"🔍 [{index + 1}/{len(chunks)}] 检测章节: {section_title}")
             
             try:
-                # 从模板加载提示词
-                system_prompt = prompt_loader.get_system_prompt('document_detect_issues')
-                
-                # 构建用户提示
+                # 构建用户提示（只包含章节标题和内容）
                 user_prompt = prompt_loader.get_user_prompt(
                     'document_detect_issues',
                     section_title=section_title,
-                    format_instructions=self.issues_parser.get_format_instructions(),
-                    section_content=section_content[:4000]  # 限制每个章节的长度
+                    section_content=self._number_lines(section_content) if compact else section_content
                 )
+                request_system_prompt = packed_system_prompt if packed else system_prompt
 
                 # 创建消息
                 messages = [
-                    SystemMessage(content=system_prompt),
+                    SystemMessage(content=request_system_prompt),
                     HumanMessage(content=user_prompt)
                 ]
                 
                 # 调用模型
                 self.logger.info(f"📤 调用模型检测章节 '{section_title}'")
-                self.logger.debug(f"System Prompt长度: {len(system_prompt)}")
+                self.logger.debug(f"System Prompt长度: {len(request_system_prompt)}")
                 self.logger.debug(f"User Prompt长度: {len(user_prompt)}")
                 
-                response = await self._call_ai_model(messages)
+                # 相同模型、提示词模板和章节内容的响应直接从缓存读取
+                cache_key = llm_cache.make_key(
+                    self.model_name, "detect_issues", llm_cache.prompt_version(request_system_prompt), user_prompt
+                )
+                cached_content = await llm_cache.aget(cache_key)
+                streamed_issues: List[Dict] = []
+                # 实际应答的模型配置：主模型失败转移到备用模型时为备用模型
+                answered = self.model_config
+                if cached_content is not None:
+                    self.logger.info(f"⚡ 章节 '{section_title}' 命中响应缓存")
+                    response = AIMessage(content=cached_content)
+                elif on_issue:
+                    # 流式模式：问题对象一闭合就回调，不等待整个章节响应完成
+                    async def stream(config: Dict):
+                        parser = IncrementalIssueParser()
+                        
+                        async def on_chunk(text: str):
+                            for issue in parser.feed(text):
+                                assign(issue, chunk)
+                                streamed_issues.append(issue)
+                                await on_issue(issue)
+                        
+                        async with self._model_slot(config, messages, tokens, cancel_token) as usage:
+                            result = await self._stream_ai_model(
+                                messages, on_chunk, cancel_token, self._chat_model(config, output_schema)
+                            )
+                            usage.record(result)
+                        self._add_usage(usage)
+                        return config, result
+                    
+                    # 已推送的问题无法撤回：流式请求不对冲，推送过问题后不再转移到备用模型
+                    answered, response = await model_router.call(
+                        self.model_config, stream, hedge=False, can_failover=lambda: not streamed_issues
+                    )
+                else:
+                    answered, response = await self._request(messages, tokens, cancel_token, output_schema)
                 processing_time = time.time() - section_start_time
                 
                 self.logger.info(f"📥 收到模型响应 (耗时: {processing_time:.2f}s)")
@@ -179,59 +371,67 @@ class IssueDetector:
                 if self.db and task_id:
                     ai_output = AIOutput(
                         task_id=task_id,
-                        operation_type="detect_issues",
+                        operation_type=self.operation_type,
                         section_title=section_title,
-                        section_index=index,
-                        input_text=section_content[:4000],
+                        section_index=chunk['members'][0],
+                        input_text=section_content,
                         raw_output=response.content,
                         processing_time=processing_time,
                         status="success"
                     )
                 
-                # 解析响应
+                # 解析响应：本地容错解析，仍无法解析时只让模型修复输出格式，不重新检测整个章节
+                parse_failed = False
                 try:
                     content = response.content
                     self.logger.info(f"🔍 开始解析章节 '{section_title}' 的响应")
-                    
-                    if isinstance(content, str):
-                        self.logger.debug(f"响应内容长度: {len(content)} 字符")
-                        
-                        # 查找JSON内容
-                        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                        if json_match:
-                            json_str = json_match.group()
-                            self.logger.debug(f"找到JSON内容 (前200字符): {json_str[:200]}...")
-                            
-                            try:
-                                result = json.loads(json_str)
-                                issues_count = len(result.get('issues', []))
-                                self.logger.info(f"✅ JSON解析成功，包含 {issues_count} 个问题")
-                            except json.JSONDecodeError as je:
-                                self.logger.error(f"❌ JSON解析失败: {str(je)}")
-                                self.logger.error(f"JSON字符串: {json_str[:500]}...")
-                                result = {"issues": []}
-                        else:
-                            self.logger.warning(f"⚠️ 未找到JSON格式内容")
-                            self.logger.debug(f"完整响应: {content[:1000]}...")
-                            result = {"issues": []}
-                    else:
-                        self.logger.warning(f"⚠️ 响应不是字符串类型: {type(content)}")
+                    result, truncated = parse_model_output(content, 'issues')
+                    if result is None and repair_reask and isinstance(content, str) and '{' in content:
+                        self.logger.warning(f"🩹 章节 '{section_title}' 的响应无法解析，请求模型修复JSON格式")
+                        result = await self._repair_output(content, output_schema, cancel_token)
+                        if result is not None:
+                            content = json.dumps(result, ensure_ascii=False)
+                    elif truncated and result is not None:
+                        self.logger.warning(
+                            f"⚠️ 章节 '{section_title}' 的响应被截断，保留 {len(result.get('issues', []))} 个完整的问题"
+                        )
+                    if result is None:
+                        self.logger.warning(f"⚠️ 章节 '{section_title}' 的响应中未找到有效的JSON")
+                        self.logger.debug(f"完整响应: {str(content)[:1000]}...")
                         result = {"issues": []}
+                        parse_failed = True
+                    else:
+                        self.logger.info(f"✅ JSON解析成功，包含 {len(result.get('issues', []))} 个问题")
+                    
+                    # 流式推送过的问题已归属章节（与完整解析结果按顺序一一对应），其余问题在此归属并补推
+                    issues = result.get('issues', [])
+                    for issue in issues[len(streamed_issues):]:
+                        assign(issue, chunk)
+                        if on_issue:
+                            await on_issue(issue)
                     
-                    # 更新数据库中的解析结果
+                    # 更新数据库中的解析结果，打包请求按章节拆分为多条记录
                     if self.db and task_id:
-                        ai_output.parsed_output = result
-                        self.db.add(ai_output)
-                        self.db.commit()
+                        if packed:
+                            self._save_packed_outputs(ai_output, chunk, valid_sections, section_issues)
+                        else:
+                            ai_output.parsed_output = result
+                            self.db.add(ai_output)
+                            self.db.commit()
                     
-                    # 为每个问题添加章节信息
-                    issues = result.get('issues', [])
-                    for issue in issues:
-                        if 'location' in issue and section_title not in issue.get('location', ''):
-                            issue['location'] = f"{section_title} - {issue['location']}"
+                    if parse_failed:
+                        return False
                     
-                    self.logger.debug(f"✓ 章节 '{section_title}' 检测完成，发现 {len(issues)} 个问题")
-                    return issues
+                    # 只缓存解析成功的响应；备用模型的响应按备用模型缓存，主模型恢复后不会读到
+                    if cached_content is None:
+                        if answered is not self.model_config:
+                            cache_key = llm_cache.make_key(
+                                answered.get('model'), "detect_issues",
+                                llm_cache.prompt_version(request_system_prompt), user_prompt
+                            )
+                        await llm_cache.aset(cache_key, content)
+                    self.logger.debug(f"✓ 章节 '{section_title}' 检测完成，发现 {max(len(issues), len(streamed_issues))} 个问题")
+                    return True
                     
                 except Exception as e:
                     import traceback
@@ -246,8 +446,10 @@ class IssueDetector:
                         self.db.add(ai_output)
                         self.db.commit()
                     
-                    return []
+                    return False
                     
+            except TaskCancelledError:
+                raise
             except Exception as e:
                 import traceback
                 self.logger.error(f"❌ 检测章节 '{section_title}' 失败: {str(e)}")
@@ -259,10 +461,10 @@ class IssueDetector:
                 if self.db and task_id:
                     ai_output = AIOutput(
                         task_id=task_id,
-                        operation_type="detect_issues",
+                        operation_type=self.operation_type,
                         section_title=section_title,
-                        section_index=index,
-                        input_text=section_content[:4000],
+                        section_index=chunk['members'][0],
+                        input_text=section_content,
                         raw_output="",
                         status="failed",
                         error_message=str(e),
@@ -271,27 +473,49 @@ class IssueDetector:
                     self.db.add(ai_output)
                     self.db.commit()
                 
-                return []
+                return False
         
-        # 批量并发执行所有章节的检测
-        self.logger.info(f"🚀 开始并发检测 {len(valid_sections)} 个章节...")
+        async def run_chunk(chunk: Dict, index: int, tokens: int):
+            """检测请求块，并在章节的全部请求块完成后保存章节结果"""
+            succeeded = await detect_chunk_issues(chunk, index, tokens)
+            for member in chunk['members']:
+                remaining_chunks[member] -= 1
+                if not succeeded:
+                    failed_indexes.add(member)
+                elif remaining_chunks[member] == 0 and member not in failed_indexes and on_section_complete:
+                    await on_section_complete(keys[member], section_issues[member])
         
-        # 创建所有检测任务
-        tasks = [
-            detect_section_issues(section, index) 
-            for index, section in enumerate(valid_sections)
-        ]
+        # 并发执行所有请求块的检测：按tokens从多到少依次占用并发名额，最长的请求最先开始，缩短整体完成时间
+        chunk_tokens = [self.chunker.count(chunk.get('content', '')) for chunk in chunks]
+        order = sorted(range(len(chunks)), key=lambda index: chunk_tokens[index], reverse=True)
+        self.logger.info(
+            f"🚀 开始并发检测 {len(chunks)} 个请求"
+            + (f" (自适应并发窗口 {int(self.limiter.limit)})..." if self.limiter else "...")
+        )
         
-        # 并发执行所有任务
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        results = await asyncio.gather(
+            *[run_chunk(chunks[index], index, chunk_tokens[index]) for index in order],
+            return_exceptions=True
+        )
         
-        # 合并所有检测结果
-        all_issues = []
-        for result in results:
-            if isinstance(result, list):
-                all_issues.extend(result)
-            elif isinstance(result, Exception):
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        
+        for chunk, result in zip([chunks[index] for index in order], results):
+            if isinstance(result, Exception):
                 self.logger.warning(f"⚠️ 某个章节检测出现异常: {str(result)}")
+                failed_indexes.update(chunk['members'])
+        
+        for index in sorted(failed_indexes):
+            self.failed_sections.append({
+                "section_title": valid_sections[index].get('section_title', '未知章节'),
+                "section_index": index
+            })
+        
+        # 按章节顺序合并所有检测结果
+        all_issues = []
+        for index in range(len(valid_sections)):
+            all_issues.extend(section_issues[index])
         
         # 更新进度：完成
         if progress_callback:
@@ -361,18 +585,244 @@ class IssueDetector:
         
         return categories
     
-    async def _call_ai_model(self, messages):
+    def _save_packed_outputs(
+        self,
+        ai_output: AIOutput,
+        chunk: Dict,
+        sections: List[Dict],
+        section_issues: Dict[int, List[Dict]]
+    ):
+        """打包请求的模型输出按章节拆分保存，每个章节一条记录（原始输出相同，解析结果只含本章节的问题）"""
+        for section_id, member in zip(chunk['section_ids'], chunk['members']):
+            section = sections[member]
+            self.db.add(AIOutput(
+                task_id=ai_output.task_id,
+                operation_type=ai_output.operation_type,
+                section_title=section.get('section_title', '未知章节'),
+                section_index=member,
+                input_text=section.get('content', ''),
+                raw_output=ai_output.raw_output,
+                parsed_output={
+                    "issues": section_issues[member],
+                    "section_id": section_id,
+                    "packed_sections": len(chunk['members'])
+                },
+                processing_time=ai_output.processing_time,
+                status=ai_output.status
+            ))
+        self.db.commit()
+    
+    @staticmethod
+    def _attribute(issue: Dict, chunk: Dict, sections: List[Dict]) -> int:
+        """
+        确定打包请求块中的问题属于哪个章节
+        
+        优先使用模型返回的章节编号，其次匹配位置中的章节标题，最后匹配原文片段
+        """
+        members = chunk['members']
+        section_id = str(issue.pop('section_id', '') or '').strip().strip('[]')
+        if len(members) == 1:
+            return members[0]
+        section_ids = chunk.get('section_ids') or []
+        if section_id in section_ids:
+            return members[section_ids.index(section_id)]
+        location = str(issue.get('location', ''))
+        for member in members:
+            if sections[member].get('section_title', '') in location:
+                return member
+        original_text = issue.get('original_text')
+        if original_text:
+            for member in members:
+                if original_text in sections[member].get('content', ''):
+                    return member
+        return members[0]
+    
+    @staticmethod
+    def _number_lines(content: str) -> str:
+        """紧凑输出格式的章节内容：每行以 "行号| " 开头，模型用行号定位问题"""
+        return "\n".join(f"{number}| {line}" for number, line in enumerate(content.split("\n"), 1))
+    
+    @staticmethod
+    def _expand_compact(issue: Dict, chunk: Dict):
+        """
+        将紧凑输出格式的问题原地还原为完整字段
+        
+        原文片段和上下文按行号从请求块原文中截取（行号附近找不到原文时在整个请求块中查找），
+        位置为问题在所属章节内的行号，对用户的影响和推理过程不在紧凑格式中，保持为空；打包请求的章节编号没有给出时按所在的分隔行推断。
+        """
+        lines = chunk.get('content', '').split("\n")
+        quote = str(issue.get('q') or '').strip()
+        try:
+            line = int(issue.get('l')) - 1
+        except (TypeError, ValueError):
+            line = -1
+        candidates = [line] + [line + offset for delta in range(1, 4) for offset in (-delta, delta)]
+        matched = next((index for index in candidates if 0 <= index < len(lines) and quote and quote in lines[index]), None)
+        if matched is None and quote:
+            matched = next((index for index, text in enumerate(lines) if quote in text), None)
+        if matched is None and 0 <= line < len(lines):
+            matched = line
+        
+        # 打包请求中行号换算为所在章节内的行号（章节正文从分隔行之后隔一个空行开始）
+        section_id, start = None, 0
+        if matched is not None:
+            for index in range(matched, -1, -1):
+                separator = SEPARATOR_PATTERN.match(lines[index])
+                if separator:
+                    section_id, start = separator.group(1), index + 2
+                    break
+        
+        try:
+            severity = SEVERITY_CODES[int(issue.get('s'))]
+        except (TypeError, ValueError, IndexError):
+            severity = issue.get('s') if issue.get('s') in SEVERITY_CODES else '一般'
+        context = lines[matched].strip() if matched is not None else ""
+        expanded = {
+            "type": issue.get('t', ''),
+            "description": issue.get('d', ''),
+            "location": f"第{matched - start + 1}行" if matched is not None and matched >= start else "",
+            "severity": severity,
+            "confidence": issue.get('c', 0.8),
+            "suggestion": issue.get('r', ''),
+            "original_text": (quote if quote and quote in context else context)[:100],
+            "user_impact": "",
+            "reasoning": "",
+            "context": context[:200]
+        }
+        if issue.get('i') or section_id:
+            expanded['section_id'] = issue.get('i') or section_id
+        issue.clear()
+        issue.update(expanded)
+    
+    @staticmethod
+    def _tag_location(issue: Dict, section_title: str):
+        """为问题位置添加章节标题前缀"""
+        if 'location' in issue and section_title not in issue.get('location', ''):
+            issue['location'] = f"{section_title} - {issue['location']}"
+    
+    async def _stream_ai_model(
+        self,
+        messages,
+        on_chunk: Callable,
+        cancel_token: Optional[CancellationToken] = None,
+        model=None
+    ):
+        """
+        流式调用AI模型
+        
+        Args:
+            messages: 消息列表
+            on_chunk: 收到文本片段时的异步回调
+            cancel_token: 取消令牌，取消时中断流
+            model: 使用的模型客户端，为空时使用主模型
+            
+        Returns:
+            拼接完整内容后的AI模型响应
+        """
+        model = model or self.model
+        
+        async def consume():
+            parts = []
+            async for chunk in model.astream(messages):
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                if text:
+                    parts.append(text)
+                    await on_chunk(text)
+            return AIMessage(content="".join(parts))
+        
+        if cancel_token:
+            return await cancel_token.run(consume())
+        return await consume()
+    
+    def _add_usage(self, usage: RequestUsage):
+        """累计本次检测的模型请求数和tokens用量"""
+        self.usage['requests'] = self.usage.get('requests', 0) + 1
+        self.usage['prompt_tokens'] = self.usage.get('prompt_tokens', 0) + usage.prompt_tokens
+        self.usage['completion_tokens'] = self.usage.get('completion_tokens', 0) + (usage.completion_tokens or 0)
+    
+    def _chat_model(self, config: Dict, output_schema: Optional[type] = None):
+        """
+        路由选中的模型配置对应的客户端：主模型使用本实例的客户端，备用模型从注册表获取
+        
+        模型配置了 structured_output 时绑定输出模型的约束解码参数
+        """
+        model = self.model if config is self.model_config else model_registry.get_chat_model(config)
+        kwargs = structured_output_kwargs(config, output_schema)
+        return model.bind(**kwargs) if kwargs else model
+    
+    async def _request(
+        self,
+        messages,
+        tokens: int,
+        cancel_token: Optional[CancellationToken] = None,
+        output_schema: Optional[type] = None
+    ):
+        """
+        经由路由器发出一次非流式请求：主模型熔断或失败时转移到备用模型，慢请求可对冲
+        
+        Returns:
+            (实际应答的模型配置, AI模型响应)
+        """
+        async def invoke(config: Dict):
+            async with self._model_slot(config, messages, tokens, cancel_token) as usage:
+                result = await self._call_ai_model(messages, cancel_token, self._chat_model(config, output_schema))
+                usage.record(result)
+            self._add_usage(usage)
+            return config, result
+        
+        return await model_router.call(self.model_config, invoke)
+    
+    async def _repair_output(
+        self,
+        content: str,
+        output_schema: type,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Optional[Dict]:
+        """
+        只把无法解析的输出发回模型修复JSON格式
+        
+        请求只包含原输出和格式说明，不包含章节内容和检测提示词，代替整个章节重新检测。
+        
+        Returns:
+            修复后的解析结果，仍无法解析时返回None
+        """
+        messages = repair_messages(content, model_registry.get_format_instructions(output_schema))
+        try:
+            _, response = await self._request(messages, self.chunker.count(content), cancel_token, output_schema)
+        except TaskCancelledError:
+            raise
+        except Exception as e:
+            self.logger.warning(f"⚠️ 请求模型修复JSON格式失败: {str(e)}")
+            return None
+        result, _ = parse_model_output(response.content, 'issues')
+        return result
+    
+    def _model_slot(self, config: Dict, messages, tokens: int, cancel_token: Optional[CancellationToken] = None):
+        """模型调用占用的并发名额和配额（按路由选中的模型），未启用自适应并发/未配置配额时不限制"""
+        prompt_tokens = sum(self.chunker.count(message.content) for message in messages)
+        if config is self.model_config:
+            limiter, rate_limiter = self.limiter, self.rate_limiter
+        else:
+            limiter, rate_limiter = get_concurrency_limiter(config), get_rate_limiter(config)
+        return model_call_slot(limiter, rate_limiter, tokens, prompt_tokens, cancel_token, config.get('model'))
+    
+    async def _call_ai_model(self, messages, cancel_token: Optional[CancellationToken] = None, model=None):
         """
         调用AI模型（仅在此方法内进行mock判断）
         
         Args:
             messages: 消息列表
+            cancel_token: 取消令牌，取消时中断等待
+            model: 使用的模型客户端，为空时使用主模型
             
         Returns:
             AI模型响应
         """
-        # 直接进行真实的AI调用
-        return await asyncio.to_thread(self.model.invoke, messages)
+        # 原生异步调用，并发请求只占用协程和连接池连接
+        call = (model or self.model).ainvoke(messages)
+        if cancel_token:
+            return await cancel_token.run(call)
+        return await call
     
     async def analyze_document(self, text: str, prompt_type: str = "detect_issues") -> Dict[str, Any]:
         """
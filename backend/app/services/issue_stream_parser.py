@@ -0,0 +1,88 @@
+"""
+流式问题解析 - 从模型输出的token流中增量提取已完整的问题对象
+"""
+import re
+from typing import Dict, List
+
+from app.services.json_repair import repair_json
+
+
+ISSUES_ARRAY_PATTERN = re.compile(r'"issues"\s*:\s*\[')
+
+
+class IncrementalIssueParser:
+    """
+    增量问题解析器
+
+    模型按 {"issues": [{...}, {...}]} 格式输出，每收到一段文本调用一次 feed，
+    返回本次新闭合的问题对象。只跟踪 issues 数组顶层对象的花括号深度（忽略字符串内的字符），
+    不依赖完整响应，首个问题生成完毕即可推送。
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = -1
+
+    def feed(self, text: str) -> List[Dict]:
+        """
+        追加模型输出文本
+
+        Args:
+            text: 新收到的文本片段
+
+        Returns:
+            本次新解析出的问题列表
+        """
+        self.buffer += text
+        if self._done:
+            return []
+
+        if not self._in_array:
+            match = ISSUES_ARRAY_PATTERN.search(self.buffer)
+            if not match:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        issues = []
+        buffer = self.buffer
+        for index in range(self._pos, len(buffer)):
+            char = buffer[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._object_start = index
+                self._depth += 1
+            elif char == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    issue = self._load(buffer[self._object_start:index + 1])
+                    if issue is not None:
+                        issues.append(issue)
+            elif char == ']' and self._depth == 0:
+                self._done = True
+                break
+        self._pos = len(buffer)
+        return issues
+
+    @staticmethod
+    def _load(raw: str):
+        """容错解析单个问题对象（修复未转义的换行、多余的逗号等）"""
+        value, _ = repair_json(raw)
+        return value if isinstance(value, dict) else None
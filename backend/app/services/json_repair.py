@@ -0,0 +1,190 @@
+"""
+容错JSON解析 - 修复模型输出中常见的JSON格式错误，以及约束解码的请求参数
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from app.services.prompt_loader import prompt_loader
+
+
+logger = logging.getLogger(__name__)
+
+# 截断输出最多尝试的截断点数
+MAX_CUT_ATTEMPTS = 50
+# 字符串内未转义的控制字符
+STRING_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+# 模型配置 structured_output 支持的约束解码方式
+STRUCTURED_OUTPUT_MODES = ('json_schema', 'guided_json', 'json_object')
+
+
+def repair_json(text: Any) -> Tuple[Optional[Any], bool]:
+    """
+    容错解析模型输出中的第一个JSON对象/数组
+
+    依次尝试：
+    - 直接解析（忽略JSON前后的说明文字和代码块标记）
+    - 修复格式错误：字符串内未转义的换行/制表符、多余的逗号、不匹配的右括号
+    - 输出被截断（达到 max_tokens）时，丢弃数组中未完整的最后一个元素并补全括号
+
+    Args:
+        text: 模型输出文本
+
+    Returns:
+        (解析结果, 是否因截断丢弃了内容)，无法修复时解析结果为None
+    """
+    if not isinstance(text, str):
+        return None, False
+    starts = [index for index in (text.find('{'), text.find('[')) if index >= 0]
+    if not starts:
+        return None, False
+    start = min(starts)
+
+    try:
+        return json.JSONDecoder().raw_decode(text, start)[0], False
+    except ValueError:
+        pass
+
+    out: List[str] = []
+    # 尚未闭合的括号对应的右括号
+    stack: List[str] = []
+    # 数组元素边界：(输出长度, 当时的括号栈)，截断时可以在此处补全括号
+    cuts: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = escape = False
+    closed = False
+    for char in text[start:]:
+        if in_string:
+            if escape:
+                escape = False
+                out.append(char)
+            elif char == '\\':
+                escape = True
+                out.append(char)
+            elif char == '"':
+                in_string = False
+                out.append(char)
+            elif char in STRING_ESCAPES:
+                out.append(STRING_ESCAPES[char])
+            elif ord(char) >= 0x20:
+                out.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            out.append(char)
+            if char == '[':
+                cuts.append((len(out), tuple(stack)))
+        elif char in '}]':
+            if not stack:
+                break
+            _strip_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                closed = True
+                break
+            if stack[-1] == ']':
+                cuts.append((len(out), tuple(stack)))
+        elif char == ',':
+            _strip_trailing_comma(out)
+            if stack and stack[-1] == ']':
+                cuts.append((len(out), tuple(stack)))
+            out.append(char)
+        else:
+            out.append(char)
+
+    if closed:
+        return _loads(''.join(out)), False
+
+    # 截断的输出：优先在数组元素边界处截断，只保留完整的元素
+    for length, cut_stack in reversed(cuts[-MAX_CUT_ATTEMPTS:]):
+        head = out[:length]
+        _strip_trailing_comma(head)
+        value = _loads(''.join(head) + ''.join(reversed(cut_stack)))
+        if value is not None:
+            logger.debug(f"🩹 JSON输出被截断，保留前 {length} 个字符中的完整元素")
+            return value, True
+    return None, True
+
+
+def parse_model_output(text: Any, key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    容错解析模型输出的结果对象
+
+    Args:
+        text: 模型输出文本
+        key: 结果对象中列表字段的名称（如 issues、headings）
+
+    Returns:
+        (结果对象, 是否因截断丢弃了内容)，不是对象或该字段不是列表时结果为None
+    """
+    value, truncated = repair_json(text)
+    if not isinstance(value, dict) or not isinstance(value.get(key, []), list):
+        return None, truncated
+    return value, truncated
+
+
+def repair_messages(raw_output: str, format_instructions: str) -> List[BaseMessage]:
+    """构建只修复JSON格式的请求消息：只包含原输出和格式说明，不重新发送文档内容"""
+    start = min([index for index in (raw_output.find('{'), raw_output.find('[')) if index >= 0] or [0])
+    try:
+        json.loads(raw_output[start:])
+        error = "输出不是符合格式说明的JSON对象"
+    except ValueError as e:
+        error = str(e)
+    return [
+        SystemMessage(content=prompt_loader.get_system_prompt('json_repair', format_instructions=format_instructions)),
+        HumanMessage(content=prompt_loader.get_user_prompt('json_repair', error=error, raw_output=raw_output[start:]))
+    ]
+
+
+def _strip_trailing_comma(out: List[str]):
+    """去掉输出末尾的逗号（及其后的空白）"""
+    index = len(out)
+    while index and out[index - 1].isspace():
+        index -= 1
+    if index and out[index - 1] == ',':
+        del out[index - 1:]
+
+
+def _loads(raw: str) -> Optional[Any]:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def structured_output_kwargs(model_config: Dict[str, Any], pydantic_object: Optional[Type]) -> Dict[str, Any]:
+    """
+    按模型配置的 structured_output 生成约束解码的请求参数
+
+    - json_schema：OpenAI / vLLM 的 response_format json_schema，服务端按输出模型的JSON Schema约束生成
+    - guided_json：vLLM 的 guided_json 扩展参数
+    - json_object：只约束输出为合法JSON（不支持 json_schema 的模型）
+
+    Args:
+        model_config: AI模型配置（ai_models[].config）
+        pydantic_object: 输出模型，为空时不约束
+
+    Returns:
+        绑定到模型客户端的请求参数，未启用时为空
+    """
+    mode = model_config.get('structured_output')
+    if not mode or pydantic_object is None:
+        return {}
+    if mode not in STRUCTURED_OUTPUT_MODES:
+        logger.warning(f"⚠️ 不支持的 structured_output: {mode}，不约束模型输出")
+        return {}
+    if mode == 'json_object':
+        return {'response_format': {'type': 'json_object'}}
+    schema = pydantic_object.model_json_schema()
+    if mode == 'guided_json':
+        return {'extra_body': {'guided_json': schema}}
+    return {'response_format': {
+        'type': 'json_schema',
+        'json_schema': {'name': pydantic_object.__name__, 'schema': schema}
+    }}
@@ -0,0 +1,318 @@
+"""
+模型响应缓存 - 按 (模型, 提示词模板版本, 内容哈希) 寻址的两级缓存
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+# 持久层命中攒够多少条访问时间后批量写入
+TOUCH_BATCH_SIZE = 100
+# 持久层超出容量时额外淘汰的比例，淘汰后留出余量
+EVICTION_HEADROOM = 0.05
+
+
+class LLMResponseCache:
+    """
+    模型响应缓存
+
+    - 内存层：LRU，按条目数淘汰
+    - 持久层：独立的SQLite文件，按条目数淘汰最久未访问的记录，进程重启和多个工作进程间共享
+    - 两层都按TTL过期
+    - 只缓存解析成功的原始响应文本，命中时按正常流程解析
+
+    修订版文档中未改动的章节再次检测时直接命中缓存，不再调用模型。
+    异步调用方使用 aget/aset：持久层读写在缓存专用线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: Optional[int] = None,
+        max_disk_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        初始化缓存，参数为空时从 llm_cache 配置读取
+
+        Args:
+            path: SQLite缓存文件路径，为空字符串时不使用持久层
+            max_memory_entries: 内存层最大条目数
+            max_disk_entries: 持久层最大条目数
+            ttl: 缓存有效期（秒），0表示不过期
+            enabled: 是否启用缓存
+        """
+        config = get_settings().llm_cache_config
+        self.enabled = config.get('enabled', True) if enabled is None else enabled
+        self.path = config.get('path', './data/cache/llm_cache.db') if path is None else path
+        self.max_memory_entries = int(max_memory_entries or config.get('max_memory_entries', 1000))
+        self.max_disk_entries = int(max_disk_entries or config.get('max_disk_entries', 50000))
+        self.ttl = float(config.get('ttl', 604800) if ttl is None else ttl)
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # 内存层和统计的锁只保护内存操作；持久层由单独的锁串行化，事件循环不会等待磁盘IO
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 持久层条目数（打开时统计一次，之后随写入和淘汰增减）和待写入的访问时间
+        self._disk_entries: Optional[int] = None
+        self._touched: Dict[str, float] = {}
+        self._metrics = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "writes": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(model: str, operation: str, prompt_version: str, content: str) -> str:
+        """
+        计算缓存键
+
+        Args:
+            model: 模型名称
+            operation: 操作类型（detect_issues / preprocess）
+            prompt_version: 提示词模板版本（系统提示词等固定部分的哈希）
+            content: 发送给模型的可变内容（用户提示词）
+        """
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        raw = f"{model}\n{operation}\n{prompt_version}\n{content_hash}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def prompt_version(*template_parts: str) -> str:
+        """根据提示词模板的固定部分计算版本号，模板修改后旧缓存自然失效"""
+        raw = "\n".join(template_parts)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存（同步，持久层在调用线程查询），未命中或已过期返回None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None:
+            return value
+        return self._disk_lookup(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """读取缓存，内存层未命中时在缓存专用线程中查询持久层，不阻塞事件循环"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None:
+            return value
+        if not self.path:
+            return self._disk_lookup(key, now)
+        return await self._run(self._disk_lookup, key, now)
+
+    def set(self, key: str, value: str):
+        """写入缓存（同步）"""
+        if not self.enabled or value is None:
+            return
+        now = time.time()
+        self._remember(key, value, now)
+        self._disk_set(key, value, now)
+
+    async def aset(self, key: str, value: str):
+        """写入缓存，持久层在缓存专用线程中写入，不阻塞事件循环"""
+        if not self.enabled or value is None:
+            return
+        now = time.time()
+        self._remember(key, value, now)
+        if self.path:
+            await self._run(self._disk_set, key, value, now)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计（持久层条目数为本进程维护的计数，不查询数据库）"""
+        with self._lock:
+            lookups = self._metrics["hits"] + self._metrics["misses"]
+            return {
+                **self._metrics,
+                "hit_rate": round(self._metrics["hits"] / lookups, 4) if lookups else None,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries or 0,
+                "enabled": self.enabled
+            }
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+        with self._disk_lock:
+            self._touched.clear()
+            conn = self._connection()
+            if conn is not None:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+                self._disk_entries = 0
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        """在缓存专用的单线程执行器中执行持久层操作（SQLite连接只在该线程中串行使用）"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        """读取内存层，命中时计入统计"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self._expired(created_at, now):
+                self._memory.pop(key, None)
+                return None
+            self._memory.move_to_end(key)
+            self._metrics["hits"] += 1
+            self._metrics["memory_hits"] += 1
+            return value
+
+    def _disk_lookup(self, key: str, now: float) -> Optional[str]:
+        """读取持久层，命中时回填内存层"""
+        row = self._disk_get(key, now)
+        with self._lock:
+            if row is None:
+                self._metrics["misses"] += 1
+                return None
+            value, created_at = row
+            self._memory_set(key, value, created_at)
+            self._metrics["hits"] += 1
+            self._metrics["disk_hits"] += 1
+            return value
+
+    def _remember(self, key: str, value: str, now: float):
+        with self._lock:
+            self._memory_set(key, value, now)
+            self._metrics["writes"] += 1
+
+    def _memory_set(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """延迟打开SQLite持久层，打开失败时只使用内存层"""
+        if self._conn is not None or not self.path:
+            return self._conn
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+            self._disk_entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            self._conn = conn
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 模型响应缓存持久层不可用，仅使用内存缓存: {str(e)}")
+            self.path = ""
+        return self._conn
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._disk_lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if self._expired(row[1], now):
+                    deleted = conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,)).rowcount
+                    conn.commit()
+                    self._disk_entries -= deleted
+                    return None
+                # 访问时间只影响容量淘汰的顺序，攒够一批或下次写入时再批量更新
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH_SIZE:
+                    self._flush_touched(conn)
+                    conn.commit()
+                return row[0], row[1]
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 读取模型响应缓存失败: {str(e)}")
+                return None
+
+    def _disk_set(self, key: str, value: str, now: float):
+        with self._disk_lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                ).rowcount
+                if inserted:
+                    self._disk_entries += inserted
+                else:
+                    conn.execute(
+                        "UPDATE llm_cache SET value = ?, created_at = ?, accessed_at = ? WHERE key = ?",
+                        (value, now, now, key)
+                    )
+                self._touched.pop(key, None)
+                if self.ttl:
+                    self._disk_entries -= conn.execute(
+                        "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)
+                    ).rowcount
+                if self._disk_entries > self.max_disk_entries:
+                    self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 写入模型响应缓存失败: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """
+        淘汰最久未访问的记录
+
+        本进程的计数超出容量时才重新统计条目数（其他工作进程也会写入同一文件），
+        确认超出后一次淘汰到容量以下留出余量，避免达到容量后每次写入都统计和淘汰
+        """
+        self._disk_entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = self._disk_entries - self.max_disk_entries
+        if overflow <= 0:
+            return
+        overflow += int(self.max_disk_entries * EVICTION_HEADROOM)
+        self._flush_touched(conn)
+        evicted = conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+            (overflow,)
+        ).rowcount
+        self._disk_entries -= evicted
+        with self._lock:
+            self._metrics["evictions"] += evicted
+
+    def _flush_touched(self, conn: sqlite3.Connection):
+        """批量写入攒下的访问时间（不提交）"""
+        if self._touched:
+            conn.executemany(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            )
+            self._touched.clear()
+
+
+# 全局模型响应缓存实例
+llm_cache = LLMResponseCache()
@@ -0,0 +1,75 @@
+"""
+大模型HTTP客户端 - 按模型端点共享的异步连接池
+"""
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+import openai
+
+from app.core.config import get_settings
+from app.services.model_router import model_router
+
+
+logger = logging.getLogger(__name__)
+
+# 按 base_url 缓存的异步HTTP客户端，同一端点的所有模型调用复用长连接
+_async_http_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_async_http_client(base_url: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    获取模型端点共享的异步HTTP客户端
+
+    并发的章节请求只占用协程和连接池中的连接，不再各自占用一个线程；
+    连接保持长连接，避免每个请求重新进行TLS握手。
+
+    Args:
+        base_url: 模型API地址，为空时使用OpenAI默认地址
+
+    Returns:
+        httpx.AsyncClient
+    """
+    key = base_url or "default"
+    client = _async_http_clients.get(key)
+    if client is None or client.is_closed:
+        pool_config = get_settings().ai_connection_pool_config
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_config.get('max_connections', 200),
+                max_keepalive_connections=pool_config.get('max_keepalive_connections', 50),
+                keepalive_expiry=pool_config.get('keepalive_expiry', 60)
+            )
+        )
+        _async_http_clients[key] = client
+        logger.info(f"🔌 创建模型端点连接池: {key}")
+    return client
+
+
+def create_async_completions(model_config: Dict[str, Any]):
+    """
+    创建使用共享连接池的异步 chat.completions 客户端，作为 ChatOpenAI 的 async_client
+
+    Args:
+        model_config: AI模型配置（ai_models[].config）
+    """
+    base_url = model_config.get('base_url')
+    return openai.AsyncOpenAI(
+        api_key=model_config.get('api_key'),
+        base_url=base_url,
+        timeout=model_config.get('timeout', 60),
+        max_retries=model_router.client_max_retries(model_config),
+        http_client=get_async_http_client(base_url)
+    ).chat.completions
+
+
+async def close_async_http_clients():
+    """关闭所有共享的HTTP客户端（应用关闭时调用）"""
+    from app.services.model_registry import model_registry
+
+    clients = list(_async_http_clients.values())
+    _async_http_clients.clear()
+    # 注册表中缓存的模型客户端持有这些连接池，一并丢弃，重新启动后按需使用新的连接池创建
+    model_registry.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,109 @@
+"""
+模型请求公平调度 - 进程内所有任务的模型调用按用户和任务加权公平排队
+"""
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.core.config import get_settings
+
+
+@dataclass(frozen=True)
+class RequestFlow:
+    """模型请求所属的流：发起请求的任务和用户，以及是否为交互式小文档任务"""
+    task_id: Optional[int] = None
+    user_id: Optional[int] = None
+    interactive: bool = False
+
+
+# 当前协程发起的模型请求所属的流，由任务处理器在处理任务时绑定，并发的章节检测协程自动继承
+current_flow: ContextVar[RequestFlow] = ContextVar('llm_request_flow', default=RequestFlow())
+
+
+def flow_for_task(task_id: int, user_id: Optional[int], file_size: Optional[int]) -> RequestFlow:
+    """根据任务信息创建请求流，小于等于 small_task_file_size 的文档视为交互式任务"""
+    small_size = get_settings().task_processing_config.get('small_task_file_size', 1048576)
+    return RequestFlow(task_id=task_id, user_id=user_id, interactive=(file_size or 0) <= small_size)
+
+
+class FairRequestQueue:
+    """
+    两级加权公平队列（起始时间公平排队）
+
+    - 第一级按用户：每个用户累计虚拟时间（已分配请求的tokens / 权重），虚拟时间最小的用户先获得名额
+    - 第二级按任务：同一用户的多个任务同样按虚拟时间轮流获得名额
+    - 同一任务内的请求按提交顺序（即章节检测的长请求优先顺序）出队
+    - 交互式任务的权重为 interactive_weight，用户的权重取其排队任务中的最大权重
+    - 流重新变为活跃时虚拟时间不低于最近分配的请求的起始虚拟时间，空闲期间不积累额度
+    因此大文档任务无论提交多少请求，都不会让其他用户或小文档任务长时间等待。
+    """
+
+    def __init__(self, interactive_weight: float = 4.0):
+        self.interactive_weight = max(1.0, float(interactive_weight))
+        self._user_vtime: Dict[Optional[int], float] = {}
+        self._task_vtime: Dict[Tuple[Optional[int], Optional[int]], float] = {}
+        # 最近分配的请求的起始虚拟时间：全局（用户级）和每个用户内（任务级）
+        self._clock = 0.0
+        self._task_clock: Dict[Optional[int], float] = {}
+        # 用户 -> 任务 -> 等待中的 (请求流, 请求tokens, Future) 列表
+        self._waiting: Dict[Optional[int], Dict[Optional[int], list]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(requests) for tasks in self._waiting.values() for requests in tasks.values())
+
+    def weight(self, flow: RequestFlow) -> float:
+        return self.interactive_weight if flow.interactive else 1.0
+
+    def _activate(self, flow: RequestFlow):
+        """流变为活跃时虚拟时间追上当前时钟"""
+        user = flow.user_id
+        key = (user, flow.task_id)
+        self._user_vtime[user] = max(self._user_vtime.get(user, 0.0), self._clock)
+        self._task_vtime[key] = max(self._task_vtime.get(key, 0.0), self._task_clock.get(user, 0.0))
+
+    def push(self, flow: RequestFlow, cost: int, waiter: asyncio.Future):
+        """请求进入队列"""
+        tasks = self._waiting.setdefault(flow.user_id, {})
+        if flow.task_id not in tasks:
+            self._activate(flow)
+            tasks[flow.task_id] = []
+        tasks[flow.task_id].append((flow, max(1, cost), waiter))
+
+    def charge(self, flow: RequestFlow, cost: int, user_weight: Optional[float] = None):
+        """
+        为获得名额的请求累计虚拟时间
+
+        无需排队直接获得名额的请求同样计入，使持续占满名额的任务在出现竞争时排在后面。
+        """
+        user = flow.user_id
+        key = (user, flow.task_id)
+        if user not in self._waiting:
+            # 用户没有排队请求时只保留当前任务的记录
+            for stale in [stale for stale in self._task_vtime if stale[0] == user and stale != key]:
+                del self._task_vtime[stale]
+            self._activate(flow)
+        self._clock = max(self._clock, self._user_vtime[user])
+        self._task_clock[user] = max(self._task_clock.get(user, 0.0), self._task_vtime[key])
+        self._user_vtime[user] += max(1, cost) / max(user_weight or 0.0, self.weight(flow))
+        self._task_vtime[key] += max(1, cost) / self.weight(flow)
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """取出下一个应获得名额的请求，跳过已取消的等待者，队列为空时返回None"""
+        while self._waiting:
+            user = min(self._waiting, key=lambda user: self._user_vtime[user])
+            tasks = self._waiting[user]
+            task = min(tasks, key=lambda task: self._task_vtime[(user, task)])
+            flow, cost, waiter = tasks[task].pop(0)
+            if not waiter.done():
+                user_weight = max(
+                    (self.weight(requests[0][0]) for requests in tasks.values() if requests), default=1.0
+                )
+                self.charge(flow, cost, user_weight)
+            if not tasks[task]:
+                del tasks[task]
+            if not tasks:
+                del self._waiting[user]
+            if not waiter.done():
+                return waiter
+        return None
@@ -0,0 +1,145 @@
+"""
+模型客户端注册表 - 进程内共享的模型客户端和输出解析器
+"""
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Type
+
+from langchain_openai import ChatOpenAI
+try:
+    from langchain_core.output_parsers import PydanticOutputParser
+except ImportError:
+    from langchain.output_parsers import PydanticOutputParser
+
+from app.services.llm_client import create_async_completions, get_async_http_client
+from app.services.model_router import model_router
+
+
+logger = logging.getLogger(__name__)
+
+# 影响模型客户端行为的配置项，作为注册表的键
+CLIENT_CONFIG_FIELDS = ('api_key', 'base_url', 'model', 'temperature', 'max_tokens', 'timeout', 'max_retries')
+
+
+class ModelClientRegistry:
+    """
+    模型客户端注册表
+
+    按模型配置缓存长期存活的 ChatOpenAI 客户端，按输出模型缓存 PydanticOutputParser。
+    各任务的 DocumentProcessor / IssueDetector 从这里获取共享实例，
+    不再为每个任务重新创建客户端和解析器。
+    """
+
+    def __init__(self):
+        self._models: Dict[str, ChatOpenAI] = {}
+        self._parsers: Dict[type, PydanticOutputParser] = {}
+        self._format_instructions: Dict[type, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def config_key(model_config: Dict[str, Any]) -> str:
+        """根据模型配置计算注册表键（不包含明文密钥）"""
+        values = {field: model_config.get(field) for field in CLIENT_CONFIG_FIELDS}
+        raw = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_chat_model(self, model_config: Dict[str, Any]) -> ChatOpenAI:
+        """
+        获取模型配置对应的共享客户端，不存在时创建
+
+        Args:
+            model_config: AI模型配置（ai_models[].config）
+        """
+        key = self.config_key(model_config)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = ChatOpenAI(
+                    api_key=model_config.get('api_key'),
+                    base_url=model_config.get('base_url'),
+                    model=model_config.get('model'),
+                    temperature=model_config.get('temperature', 0.3),
+                    max_tokens=model_config.get('max_tokens', 4000),
+                    request_timeout=model_config.get('timeout', 60),
+                    # 经由路由器/限流器调用时客户端不重试，失败立即交给路由器处理
+                    max_retries=model_router.client_max_retries(model_config),
+                    # 异步调用走按端点共享的长连接池
+                    async_client=create_async_completions(model_config)
+                )
+                self._models[key] = model
+                logger.info(f"🤖 创建共享模型客户端: {model_config.get('model')} @ {model_config.get('base_url')}")
+        return model
+
+    def get_parser(self, pydantic_object: Type) -> PydanticOutputParser:
+        """获取输出模型对应的共享解析器"""
+        parser = self._parsers.get(pydantic_object)
+        if parser is None:
+            with self._lock:
+                parser = self._parsers.get(pydantic_object)
+                if parser is None:
+                    parser = PydanticOutputParser(pydantic_object=pydantic_object)
+                    self._parsers[pydantic_object] = parser
+        return parser
+
+    def get_format_instructions(self, pydantic_object: Type) -> str:
+        """获取输出模型的格式说明（只生成一次，所有请求使用同一个字符串，保持提示词前缀不变）"""
+        instructions = self._format_instructions.get(pydantic_object)
+        if instructions is None:
+            instructions = self.get_parser(pydantic_object).get_format_instructions()
+            self._format_instructions[pydantic_object] = instructions
+        return instructions
+
+    async def warm_up(self, models: List[Dict[str, Any]], connect: bool = True) -> int:
+        """
+        启动时预创建所有已配置模型的客户端，并预先建立到各端点的长连接
+
+        Args:
+            models: ai_models 模型列表
+            connect: 是否预先建立连接（完成TLS握手）
+
+        Returns:
+            预热的模型数量
+        """
+        warmed = 0
+        endpoints = set()
+        for model in models:
+            config = model.get('config', {})
+            if not config.get('api_key'):
+                logger.warning(f"⚠️ 模型 {model.get('label')} 未配置API密钥，跳过预热")
+                continue
+            try:
+                self.get_chat_model(config)
+                warmed += 1
+                endpoints.add(config.get('base_url'))
+            except Exception as e:
+                logger.warning(f"⚠️ 模型 {model.get('label')} 客户端创建失败: {str(e)}")
+
+        if connect:
+            for base_url in endpoints:
+                if not base_url:
+                    continue
+                try:
+                    # 响应状态无关紧要，只为在连接池中留下已握手的长连接
+                    await get_async_http_client(base_url).get(base_url, timeout=10)
+                except Exception as e:
+                    logger.warning(f"⚠️ 预热模型端点连接失败 {base_url}: {str(e)}")
+
+        logger.info(f"🔥 模型客户端预热完成: {warmed} 个模型, {len(endpoints)} 个端点")
+        return warmed
+
+    def clear(self):
+        """清空注册表"""
+        with self._lock:
+            self._models.clear()
+            self._parsers.clear()
+            self._format_instructions.clear()
+
+
+# 全局模型客户端注册表
+model_registry = ModelClientRegistry()
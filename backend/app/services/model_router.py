@@ -0,0 +1,312 @@
+"""
+模型路由 - 按端点健康状况熔断，单次请求故障转移到备用模型，慢请求对冲
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.services.concurrency_limiter import is_overload_error
+
+
+logger = logging.getLogger(__name__)
+
+# 用于计算 p95 延迟的最近样本数
+LATENCY_WINDOW = 100
+# 路由器重试端点失败的指数退避（秒）
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8
+
+
+class ModelUnavailableError(Exception):
+    """主模型和备用模型的熔断器均处于打开状态"""
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """判断异常是否表示端点不可用（过载/超时/连接失败），请求本身的错误（如参数错误）不计入"""
+    return is_overload_error(error) or 'Connection' in type(error).__name__
+
+
+class CircuitBreaker:
+    """
+    端点熔断器
+
+    - closed：正常放行，连续失败达到 failure_threshold 次后打开
+    - open：直接拒绝，reset_timeout 秒后进入 half_open
+    - half_open：只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """是否放行请求"""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == "closed"
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"✅ 模型端点 {self.name} 已恢复，熔断器关闭")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"🔌 模型端点 {self.name} 连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f}s")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def record_abort(self):
+        """请求被取消（未得到结果），释放探测名额"""
+        self._probing = False
+
+
+class EndpointHealth:
+    """端点健康状况：熔断器和最近的请求延迟"""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        """最近请求的 p95 延迟，样本不足时返回None"""
+        if len(self.latencies) < max(1, min_samples):
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class ModelRouter:
+    """
+    模型路由器
+
+    单个任务仍绑定选定的主模型，但每次模型请求经由路由器发出：
+    - 每个端点（API地址 + 模型）维护熔断器，连续失败后短时间内直接跳过该端点，不再等待超时和重试
+    - 主模型失败或熔断时，该次请求依次转移到模型配置 fallback_index 指定的备用模型
+    - 启用对冲时，请求超过端点最近的 p95 延迟仍未返回，向未熔断的备用模型再发一份，取先返回的结果（没有可用备用模型时不对冲）
+    - 端点失败按模型配置的 max_retries 在路由器中退避重试，客户端内部不再重试，
+      熔断器、故障转移和自适应并发窗口都能看到每一次失败
+    """
+
+    def __init__(self):
+        self._health: Dict[str, EndpointHealth] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return get_settings().model_routing_config
+
+    @staticmethod
+    def endpoint_key(model_config: Dict[str, Any]) -> str:
+        return f"{model_config.get('base_url') or 'default'}|{model_config.get('model')}"
+
+    def client_max_retries(self, model_config: Dict[str, Any]) -> int:
+        """
+        模型客户端内部的重试次数
+
+        启用路由、自适应并发限制或配额限流时返回0，由路由器重试；否则使用模型配置的 max_retries
+        """
+        settings = get_settings()
+        if (self.config.get('enabled', True) or settings.concurrency_config.get('enabled', True)
+                or model_config.get('rpm') or model_config.get('tpm')):
+            return 0
+        return model_config.get('max_retries', 3)
+
+    def retries(self, model_config: Dict[str, Any]) -> int:
+        """路由器对端点失败的重试次数（客户端内部已重试时为0）"""
+        if self.client_max_retries(model_config):
+            return 0
+        return model_config.get('max_retries', 3)
+
+    def health(self, model_config: Dict[str, Any]) -> EndpointHealth:
+        """获取端点的健康状况记录"""
+        key = self.endpoint_key(model_config)
+        health = self._health.get(key)
+        if health is None:
+            with self._lock:
+                health = self._health.get(key)
+                if health is None:
+                    config = self.config
+                    health = EndpointHealth(
+                        model_config.get('model') or key,
+                        config.get('failure_threshold', 5),
+                        config.get('reset_timeout', 30)
+                    )
+                    self._health[key] = health
+        return health
+
+    def candidates(self, model_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """主模型及其备用模型链（按 fallback_index 依次查找，忽略循环引用）"""
+        models = get_settings().ai_models
+        chain = [model_config]
+        seen = {self.endpoint_key(model_config)}
+        fallback = model_config.get('fallback_index')
+        while fallback is not None and 0 <= int(fallback) < len(models):
+            config = models[int(fallback)].get('config', {})
+            key = self.endpoint_key(config)
+            if key in seen:
+                break
+            chain.append(config)
+            seen.add(key)
+            fallback = config.get('fallback_index')
+        return chain
+
+    async def call(
+        self,
+        model_config: Dict[str, Any],
+        invoke: Callable[[Dict[str, Any]], Awaitable[Any]],
+        hedge: bool = True,
+        can_failover: Optional[Callable[[], bool]] = None
+    ) -> Any:
+        """
+        经由路由器执行一次模型请求
+
+        Args:
+            model_config: 主模型配置
+            invoke: 使用给定模型配置执行请求的协程函数
+            hedge: 是否允许对冲请求（流式请求已推送的内容无法撤回，应传False）
+            can_failover: 请求失败时是否还能转移到备用模型（如流式请求已推送过结果时返回False）
+
+        Returns:
+            invoke 的返回值
+        """
+        config = self.config
+        if not config.get('enabled', True):
+            return await self._with_retries(model_config, lambda: invoke(model_config), can_failover)
+
+        candidates = self.candidates(model_config)
+        hedge = hedge and config.get('hedge', False)
+        last_error: Optional[Exception] = None
+        for index, candidate in enumerate(candidates):
+            if not self.health(candidate).breaker.allow():
+                logger.info(f"⏭️ 模型端点 {candidate.get('model')} 处于熔断状态，跳过")
+                continue
+            # 只对冲到未熔断的备用模型，向同一端点重复请求只会增加其负载
+            hedge_config = None
+            if hedge:
+                hedge_config = next(
+                    (other for other in candidates[index + 1:] if self.health(other).breaker.state == "closed"),
+                    None
+                )
+            try:
+                return await self._with_retries(
+                    candidate,
+                    lambda: self._attempt(candidate, invoke, hedge_config),
+                    can_failover,
+                    self.health(candidate).breaker
+                )
+            except Exception as e:
+                if not is_endpoint_failure(e) or (can_failover and not can_failover()):
+                    raise
+                last_error = e
+                if index + 1 < len(candidates):
+                    logger.warning(
+                        f"🔀 模型 {candidate.get('model')} 请求失败 ({type(e).__name__})，转移到备用模型"
+                    )
+        if last_error is not None:
+            raise last_error
+        raise ModelUnavailableError(f"模型 {model_config.get('model')} 及其备用模型均处于熔断状态")
+
+    async def _with_retries(
+        self,
+        model_config: Dict[str, Any],
+        attempt: Callable[[], Awaitable[Any]],
+        can_retry: Optional[Callable[[], bool]] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ) -> Any:
+        """执行请求，端点失败时按 retries 指数退避重试；熔断器已打开或不能重发（流式已推送结果）时不再重试"""
+        retries = self.retries(model_config)
+        for number in range(retries + 1):
+            try:
+                return await attempt()
+            except Exception as e:
+                if (number >= retries or not is_endpoint_failure(e) or (can_retry and not can_retry())
+                        or (breaker is not None and breaker.state == "open")):
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** number)
+                logger.warning(
+                    f"🔁 模型 {model_config.get('model')} 请求失败 ({type(e).__name__})，"
+                    f"{delay:.1f}s 后第 {number + 1} 次重试"
+                )
+                await asyncio.sleep(delay)
+
+    async def _attempt(
+        self,
+        model_config: Dict[str, Any],
+        invoke: Callable[[Dict[str, Any]], Awaitable[Any]],
+        hedge_config: Optional[Dict[str, Any]]
+    ) -> Any:
+        """执行请求，超过 p95 延迟仍未返回时发出对冲请求"""
+        delay = None
+        if hedge_config is not None:
+            delay = self.health(model_config).p95(self.config.get('hedge_min_samples', 20))
+        if delay is None:
+            return await self._tracked(model_config, invoke)
+
+        tasks = [asyncio.ensure_future(self._tracked(model_config, invoke))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                logger.info(f"🪁 模型 {model_config.get('model')} 请求超过 p95 延迟 {delay:.1f}s，发出对冲请求")
+                tasks.append(asyncio.ensure_future(self._tracked(hedge_config, invoke)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _tracked(self, model_config: Dict[str, Any], invoke: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        """执行请求并记录端点的成功/失败和延迟"""
+        health = self.health(model_config)
+        started = time.monotonic()
+        try:
+            result = await invoke(model_config)
+        except Exception as e:
+            if is_endpoint_failure(e):
+                health.breaker.record_failure()
+            else:
+                health.breaker.record_abort()
+            raise
+        except BaseException:
+            health.breaker.record_abort()
+            raise
+        health.breaker.record_success()
+        health.latencies.append(time.monotonic() - started)
+        return result
+
+    def clear(self):
+        """清空所有端点的健康状况"""
+        with self._lock:
+            self._health.clear()
+
+
+# 全局模型路由器
+model_router = ModelRouter()
@@ -6,7 +6,7 @@ import json
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
 from sqlalchemy.orm import Session
 
 from app.repositories.task import TaskRepository
@@ -17,7 +17,11 @@ from app.repositories.ai_model import AIModelRepository
 from app.core.config import get_settings
 from app.services.websocket import manager
 from app.models import TaskLog
+from app.dto.issue import IssueResponse
 from app.services.processing_chain import TaskProcessingChain
+from app.services.checkpoint_store import CheckpointStore
+from app.services.cancellation import CancellationToken, TaskCancelledError
+from app.services.llm_scheduler import current_flow, flow_for_task
 from app.services.ai_service_providers.service_provider_factory import ai_service_provider_factory
 
 
@@ -33,9 +37,17 @@ class NewTaskProcessor:
         self.model_repo = AIModelRepository(db)
         self.settings = get_settings()
         self.start_time = None  # 记录任务开始时间
+        self._streamed_issue_ids: Set[int] = set()  # 流式检测中已保存的问题对象（id()）
     
-    async def process_task(self, task_id: int):
-        """处理任务"""
+    async def process_task(self, task_id: int, cancel_token: Optional[CancellationToken] = None):
+        """
+        处理任务
+        
+        Args:
+            task_id: 任务ID
+            cancel_token: 取消令牌，取消后在下一个检查点停止处理并中断进行中的模型调用
+        """
+        flow_token = None
         try:
             # 记录任务开始时间（使用UTC时间戳）
             self.start_time = time.time()
@@ -48,10 +60,17 @@ class NewTaskProcessor:
             if not task:
                 raise ValueError(f"任务不存在: {task_id}")
             
+            # 本任务的所有模型调用按任务和用户在共享的公平队列中排队，小文档任务优先
+            flow_token = current_flow.set(flow_for_task(task_id, getattr(task, 'user_id', None), task.file_size))
+            
             # 更新状态为处理中
             self.task_repo.update(task_id, status="processing", progress=10)
             await manager.send_status(task_id, "processing")
             
+            # 清理上次执行中流式保存的问题，重试时以本次结果为准
+            self.issue_repo.delete_by_task_id(task_id)
+            self._streamed_issue_ids.clear()
+            
             # 准备处理上下文
             context = await self._prepare_context(task_id, task)
             
@@ -68,23 +87,28 @@ class NewTaskProcessor:
             # 执行处理链
             await self._log(task_id, "INFO", f"使用AI服务: {ai_service_provider.get_provider_name()}", "初始化", 10)
             
-            async def progress_callback(message: str, progress: int):
-                """进度回调函数"""
+            async def progress_callback(message: str, progress: Optional[int]):
+                """进度回调函数，progress为空时只记录日志"""
                 # 记录日志并推送消息
                 await self._log(task_id, "INFO", message, "处理中", progress)
                 # 更新任务进度
-                self.task_repo.update(task_id, progress=progress)
+                if progress is not None:
+                    self.task_repo.update(task_id, progress=progress)
                 # 发送进度状态更新（不重复发送消息）
                 await manager.send_status(task_id, "processing")
             
             context['progress_callback'] = progress_callback
             
             # 执行完整的处理链
-            result = await processing_chain.execute(context, progress_callback)
+            result = await processing_chain.execute(context, progress_callback, cancel_token)
             
             if not result.success:
                 raise ValueError(f"任务处理失败: {result.error}")
             
+            # 取消请求可能在最后一次模型调用返回后到达，此时不再写入结果
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            
             # 保存处理结果
             await self._save_processing_results(task_id, context, result)
             
@@ -102,6 +126,14 @@ class NewTaskProcessor:
             await manager.send_status(task_id, "completed")
             await self._log(task_id, "INFO", f"任务处理完成，耗时{processing_time:.2f}秒", "完成", 100)
             
+        except TaskCancelledError as e:
+            # 任务可能已被删除，此时不再写入任何记录
+            if self.task_repo.get(task_id):
+                await self._log(task_id, "WARNING", f"任务已取消: {str(e)}", "取消", None)
+                self.task_repo.update(task_id, status="cancelled", error_message=str(e))
+            await manager.send_status(task_id, "cancelled")
+            raise
+            
         except Exception as e:
             # 记录错误
             await self._log(task_id, "ERROR", f"任务处理失败: {str(e)}", "错误", 0)
@@ -112,13 +144,38 @@ class NewTaskProcessor:
                 error_message=str(e)
             )
             raise
+        
+        finally:
+            if flow_token is not None:
+                current_flow.reset(flow_token)
     
     async def _prepare_context(self, task_id: int, task) -> Dict[str, Any]:
         """准备处理上下文"""
         context = {
-            'task_id': task_id
+            'task_id': task_id,
+            # 文档预处理按文件类型选择本地结构提取或模型预处理
+            'file_type': task.file_type,
+            # 各步骤结果持久化为检查点，重试时从最后成功的步骤继续
+            'checkpoint_store': CheckpointStore(self.db, task_id),
+            # 流式检测时每个问题生成后立即保存并推送
+            'issue_callback': lambda issue: self._on_issue_detected(task_id, issue)
         }
         
+        restored_steps = context['checkpoint_store'].steps()
+        if restored_steps:
+            await self._log(task_id, "INFO", f"发现已完成步骤的检查点: {', '.join(restored_steps)}", "初始化", 10)
+        
+        # 修订版文档：加载上一版本各章节的检测结果，未改动章节直接沿用
+        if task.base_task_id:
+            base_results = CheckpointStore(self.db, task.base_task_id).load_section_results()
+            context['base_task_id'] = task.base_task_id
+            context['base_section_results'] = base_results
+            await self._log(
+                task_id, "INFO",
+                f"基于任务 {task.base_task_id} 增量分析，可复用 {len(base_results)} 个章节的检测结果",
+                "初始化", 10
+            )
+        
         # 获取文件信息
         file_info = None
         if task.file_id:
@@ -180,19 +237,33 @@ class NewTaskProcessor:
             await self._log(task_id, "INFO", f"检测到{issue_count}个问题", "保存结果", 90)
             
             for issue in (issues or []):
-                self.issue_repo.create(
-                    task_id=task_id,
-                    issue_type=issue.get('issue_type', '未知'),
-                    description=issue.get('description', ''),
-                    location=issue.get('location', ''),
-                    severity=issue.get('severity', '一般'),
-                    confidence=issue.get('confidence'),
-                    suggestion=issue.get('suggestion', ''),
-                    original_text=issue.get('original_text'),
-                    user_impact=issue.get('user_impact'),
-                    reasoning=issue.get('reasoning'),
-                    context=issue.get('context')
-                )
+                # 流式检测中已保存的问题不再重复保存
+                if id(issue) in self._streamed_issue_ids:
+                    continue
+                self.issue_repo.create(**self._issue_fields(task_id, issue))
+    
+    async def _on_issue_detected(self, task_id: int, issue: Dict[str, Any]):
+        """流式检测到单个问题：立即保存并通过WebSocket推送"""
+        created = self.issue_repo.create(**self._issue_fields(task_id, issue))
+        self._streamed_issue_ids.add(id(issue))
+        await manager.send_issue(task_id, IssueResponse.from_orm(created).dict())
+    
+    @staticmethod
+    def _issue_fields(task_id: int, issue: Dict[str, Any]) -> Dict[str, Any]:
+        """将模型输出的问题转换为问题表字段"""
+        return dict(
+            task_id=task_id,
+            issue_type=issue.get('issue_type') or issue.get('type') or '未知',
+            description=issue.get('description', ''),
+            location=issue.get('location', ''),
+            severity=issue.get('severity', '一般'),
+            confidence=issue.get('confidence'),
+            suggestion=issue.get('suggestion', ''),
+            original_text=issue.get('original_text'),
+            user_impact=issue.get('user_impact'),
+            reasoning=issue.get('reasoning'),
+            context=issue.get('context')
+        )
     
     def _save_ai_output(self, task_id: int, operation_type: str, 
                        input_text: str, result: Dict[str, Any]):
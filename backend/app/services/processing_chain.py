@@ -4,9 +4,11 @@
 from typing import Dict, Any, Optional, Callable
 from app.services.interfaces.task_processor import ITaskProcessor, IProcessingChain, ProcessingResult
 from app.services.interfaces.ai_service import IAIServiceProvider
+from app.services.cancellation import CancellationToken
 from app.services.processors.file_parsing_processor import FileParsingProcessor
 from app.services.processors.document_processing_processor import DocumentProcessingProcessor
 from app.services.processors.section_merge_processor import SectionMergeProcessor
+from app.services.processors.rule_check_processor import RuleCheckProcessor
 from app.services.processors.issue_detection_processor import IssueDetectionProcessor
 
 
@@ -27,16 +29,26 @@ class TaskProcessingChain(IProcessingChain):
         # 章节合并处理器
         section_merger = SectionMergeProcessor()
         
+        # 规则检查处理器
+        rule_checker = RuleCheckProcessor()
+        
         # 问题检测处理器
         issue_processor = IssueDetectionProcessor(self.ai_service_provider)
         
-        # 构建链式结构: 文件解析 -> 文档处理 -> 章节合并 -> 问题检测
-        file_parser.set_next(doc_processor).set_next(section_merger).set_next(issue_processor)
+        # 构建链式结构: 文件解析 -> 文档处理 -> 章节合并 -> 规则检查 -> 问题检测
+        file_parser.set_next(doc_processor).set_next(section_merger).set_next(rule_checker).set_next(issue_processor)
         
         return file_parser
     
-    async def execute(self, context: Dict[str, Any], progress_callback: Optional[Callable] = None) -> ProcessingResult:
-        """执行处理链"""
+    async def execute(
+        self,
+        context: Dict[str, Any],
+        progress_callback: Optional[Callable] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> ProcessingResult:
+        """执行处理链，cancel_token 通过上下文传递给各处理器"""
+        if cancel_token:
+            context['cancel_token'] = cancel_token
         chain = self.build_chain()
         result = await chain.handle(context, progress_callback)
         
@@ -1,9 +1,19 @@
 """
 问题检测处理器
 """
-from typing import Dict, Any, Optional, Callable
+import logging
+import time
+from typing import Dict, Any, List, Optional, Callable
 from app.services.interfaces.task_processor import ITaskProcessor, TaskProcessingStep, ProcessingResult
 from app.services.interfaces.ai_service import IAIServiceProvider
+from app.core.config import get_settings
+from app.services.cancellation import TaskCancelledError
+from app.services.issue_detector import IssueDetector, section_key
+from app.services.model_router import model_router
+from app.models.ai_output import AIOutput
+
+
+logger = logging.getLogger(__name__)
 
 
 class IssueDetectionProcessor(ITaskProcessor):
@@ -35,28 +45,277 @@ class IssueDetectionProcessor(ITaskProcessor):
         if progress_callback:
             await progress_callback(f"开始问题检测 (使用{section_type}章节)", 60)
         
+        # 重试时复用已完成章节的检测结果，并逐章节保存新结果
+        store = context.get('checkpoint_store')
+        completed_sections = store.load_section_results() if store else {}
+        
+        # 修订版文档：内容未改动的章节沿用上一版本的检测结果
+        carried_forward = self._diff_sections(sections, context.get('base_section_results'), completed_sections)
+        if carried_forward:
+            completed_sections.update(carried_forward)
+            if store:
+                store.save_section_results(carried_forward)
+            if progress_callback:
+                await progress_callback(
+                    f"章节比对: {len(carried_forward)}/{len(sections)} 个章节未改动，沿用任务 "
+                    f"{context.get('base_task_id')} 的检测结果", None
+                )
+        
+        stream_issues = get_settings().task_processing_config.get('stream_issues', True)
+        on_section_complete = None
+        if store:
+            async def on_section_complete(section_key, section_issues):
+                store.save_section_result(section_key, section_issues)
+        
         try:
             issue_detector = self.ai_service_provider.get_issue_detector()
-            issues = await issue_detector.detect_issues(
-                sections,
-                task_id,
-                progress_callback
-            )
+            on_issue = context.get('issue_callback') if stream_issues else None
+            screener = self._create_screener(issue_detector)
+            cascade_stats = None
+            if screener:
+                issues, cascade_stats = await self._detect_cascade(
+                    screener, issue_detector, sections, context, progress_callback, completed_sections, on_issue
+                )
+            else:
+                issues = await issue_detector.detect_issues(
+                    sections,
+                    task_id,
+                    progress_callback,
+                    completed_sections=completed_sections,
+                    on_section_complete=on_section_complete,
+                    cancel_token=context.get('cancel_token'),
+                    # 流式检测：每个问题生成后立即保存并推送
+                    on_issue=on_issue
+                )
+            
+            # 存在检测失败的章节时：启用 fail_on_section_error 则整体失败，重试时只重新检测这些章节；
+            # 默认只记录失败章节，任务照常完成
+            failed_sections = getattr(issue_detector, 'failed_sections', [])
+            fail_on_error = get_settings().task_processing_config.get('fail_on_section_error', False)
+            if failed_sections and fail_on_error:
+                return ProcessingResult(
+                    success=False,
+                    error=f"问题检测失败: {len(failed_sections)} 个章节检测失败，重试任务将只重新检测失败的章节",
+                    metadata={"failed_sections": failed_sections}
+                )
+            if failed_sections:
+                logger.warning(f"⚠️ {len(failed_sections)} 个章节问题检测失败，这些章节的结果为空")
+            
+            # 合并规则检查发现的问题
+            issues = list(context.get('rule_check_result') or []) + issues
             
             # 将结果保存到上下文中
             context['issue_detection_result'] = issues
             
-            return ProcessingResult(
-                success=True,
-                data=issues,
-                metadata={
-                    "issues_count": len(issues),
-                    "processing_stage": "issue_detection"
-                }
-            )
+            metadata = {
+                "issues_count": len(issues),
+                "carried_forward_sections": len(carried_forward),
+                "processing_stage": "issue_detection"
+            }
+            if cascade_stats:
+                metadata["cascade"] = cascade_stats
+            return ProcessingResult(success=True, data=issues, metadata=metadata)
             
+        except TaskCancelledError:
+            raise
         except Exception as e:
             return ProcessingResult(
                 success=False,
                 error=f"问题检测失败: {str(e)}"
-            )
\ No newline at end of file
+            )
+    
+    @staticmethod
+    def _create_screener(issue_detector) -> Optional[IssueDetector]:
+        """级联检测启用且初筛模型与任务模型不同时，创建初筛模型的检测器"""
+        config = get_settings().task_processing_config.get('cascade') or {}
+        if not config.get('enabled', False):
+            return None
+        models = get_settings().ai_models
+        index = config.get('screen_model_index', 0)
+        if not 0 <= index < len(models):
+            logger.warning(f"⚠️ 级联检测的初筛模型索引无效: {index}，不启用级联检测")
+            return None
+        screen_config = models[index].get('config', {})
+        if model_router.endpoint_key(screen_config) == model_router.endpoint_key(issue_detector.model_config):
+            return None
+        screener = IssueDetector(screen_config, getattr(issue_detector, 'db', None))
+        screener.operation_type = "detect_issues_screen"
+        return screener
+    
+    async def _detect_cascade(
+        self,
+        screener: IssueDetector,
+        issue_detector,
+        sections: List[Dict],
+        context: Dict[str, Any],
+        progress_callback: Optional[Callable],
+        completed_sections: Dict[str, List[Dict]],
+        on_issue: Optional[Callable]
+    ):
+        """
+        两级级联检测
+        
+        初筛模型检测所有章节；没有低置信度或高严重等级问题的章节直接采用初筛结果，
+        其余章节（以及初筛失败的章节）由任务模型重新检测。
+        
+        Returns:
+            (按章节顺序的问题列表, 各层统计)
+        """
+        config = get_settings().task_processing_config.get('cascade') or {}
+        task_id = context.get('task_id')
+        store = context.get('checkpoint_store')
+        cancel_token = context.get('cancel_token')
+        accepted: Dict[str, List[Dict]] = {}
+        checked: Dict[str, List[Dict]] = {}
+        escalated = 0
+        
+        async def on_screened(key: str, section_issues: List[Dict]):
+            nonlocal escalated
+            if self._needs_escalation(section_issues, config):
+                escalated += 1
+                return
+            accepted[key] = section_issues
+            if store:
+                store.save_section_result(key, section_issues)
+            if on_issue:
+                for issue in section_issues:
+                    await on_issue(issue)
+        
+        async def screen_progress(message: str, progress: Optional[int]):
+            if progress_callback:
+                await progress_callback(f"[初筛] {message}", min(progress, 80) if progress is not None else None)
+        
+        screen_started = time.time()
+        await screener.detect_issues(
+            sections,
+            task_id,
+            screen_progress,
+            completed_sections=completed_sections,
+            on_section_complete=on_screened,
+            cancel_token=cancel_token
+        )
+        screen_time = time.time() - screen_started
+        
+        async def on_checked(key: str, section_issues: List[Dict]):
+            checked[key] = section_issues
+            if store:
+                store.save_section_result(key, section_issues)
+        
+        async def check_progress(message: str, progress: Optional[int]):
+            if progress_callback:
+                await progress_callback(f"[复核] {message}", None)
+        
+        pending = [
+            section for section in sections
+            if section_key(section) not in completed_sections and section_key(section) not in accepted
+        ]
+        if progress_callback:
+            await progress_callback(
+                f"初筛完成: {len(accepted)} 个章节采用初筛结果，{len(pending)} 个章节由 {issue_detector.model_config.get('model')} 复核",
+                85
+            )
+        check_started = time.time()
+        if pending:
+            await issue_detector.detect_issues(
+                pending,
+                task_id,
+                check_progress,
+                on_section_complete=on_checked,
+                cancel_token=cancel_token,
+                on_issue=on_issue
+            )
+        else:
+            issue_detector.failed_sections = []
+        check_time = time.time() - check_started
+        
+        issues = []
+        for section in sections:
+            key = section_key(section)
+            for results in (completed_sections, accepted, checked):
+                if key in results:
+                    issues.extend(results[key])
+                    break
+        
+        stats = [
+            self._tier_stats("screen", screener, len(sections) - len(completed_sections), accepted, screen_time, escalated),
+            self._tier_stats("escalate", issue_detector, len(pending) if pending else 0, checked, check_time)
+        ]
+        self._save_tier_stats(getattr(issue_detector, 'db', None), task_id, stats)
+        logger.info(
+            f"🪜 级联检测完成: 初筛 {stats[0]['sections']} 个章节，复核 {stats[1]['sections']} 个章节"
+        )
+        return issues, stats
+    
+    @staticmethod
+    def _needs_escalation(issues: List[Dict], config: Dict[str, Any]) -> bool:
+        """初筛结果中有低置信度或高严重等级的问题时，章节需要由任务模型复核"""
+        threshold = float(config.get('escalate_confidence', 0.7))
+        severities = set(config.get('escalate_severities') or ['致命', '严重'])
+        for issue in issues:
+            try:
+                confidence = float(issue.get('confidence', 0.8))
+            except (TypeError, ValueError):
+                confidence = 0.0
+            if confidence < threshold or issue.get('severity') in severities:
+                return True
+        return False
+    
+    @staticmethod
+    def _tier_stats(
+        tier: str,
+        detector,
+        sections: int,
+        results: Dict[str, List[Dict]],
+        processing_time: float,
+        escalated: Optional[int] = None
+    ) -> Dict[str, Any]:
+        usage = getattr(detector, 'usage', None) or {}
+        stats = {
+            "tier": tier,
+            "model": detector.model_config.get('model'),
+            "sections": sections,
+            "accepted_sections": len(results),
+            "issues": sum(len(issues) for issues in results.values()),
+            "requests": usage.get('requests', 0),
+            "prompt_tokens": usage.get('prompt_tokens', 0),
+            "completion_tokens": usage.get('completion_tokens', 0),
+            "processing_time": round(processing_time, 2)
+        }
+        if escalated is not None:
+            stats["escalated_sections"] = escalated
+        return stats
+    
+    @staticmethod
+    def _save_tier_stats(db, task_id: Optional[int], stats: List[Dict[str, Any]]):
+        """每层的请求数、tokens用量和耗时各保存为一条AI输出记录"""
+        if not db or not task_id:
+            return
+        for tier in stats:
+            db.add(AIOutput(
+                task_id=task_id,
+                operation_type="detect_issues_cascade",
+                section_title=f"{tier['tier']}: {tier['model']}",
+                input_text="",
+                raw_output="",
+                parsed_output=tier,
+                status="success",
+                tokens_used=tier['prompt_tokens'] + tier['completion_tokens'],
+                processing_time=tier['processing_time']
+            ))
+        db.commit()
+    
+    @staticmethod
+    def _diff_sections(
+        sections: List[Dict],
+        base_results: Optional[Dict[str, List[Dict]]],
+        completed_sections: Dict[str, List[Dict]]
+    ) -> Dict[str, List[Dict]]:
+        """按内容哈希比对章节，返回可沿用上一版本结果的章节（章节哈希 -> 问题列表）"""
+        if not base_results:
+            return {}
+        carried = {}
+        for section in sections:
+            key = section_key(section)
+            if key in base_results and key not in completed_sections:
+                carried[key] = base_results[key]
+        return carried
\ No newline at end of file
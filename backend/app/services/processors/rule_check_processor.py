@@ -0,0 +1,52 @@
+"""
+规则检查处理器
+在问题检测之前用本地规则检查机械性问题，结果立即推送，不占用模型调用
+"""
+import logging
+from typing import Dict, Any, Optional, Callable
+from app.services.interfaces.task_processor import ITaskProcessor, TaskProcessingStep, ProcessingResult
+from app.services.rule_checker import RuleChecker
+
+
+class RuleCheckProcessor(ITaskProcessor):
+    """规则检查处理器 - 括号/引号配对、中英文标点混用、代码与命令语法"""
+    
+    def __init__(self):
+        super().__init__(TaskProcessingStep.RULE_CHECK)
+        self.checker = RuleChecker()
+        self.logger = logging.getLogger("rule_check_processor")
+    
+    async def can_handle(self, context: Dict[str, Any]) -> bool:
+        """有章节数据且启用了规则检查"""
+        return self.checker.enabled and (
+            'section_merge_result' in context or 'document_processing_result' in context
+        )
+    
+    async def process(self, context: Dict[str, Any], progress_callback: Optional[Callable] = None) -> ProcessingResult:
+        """执行规则检查"""
+        sections = context.get('section_merge_result') or context.get('document_processing_result') or []
+        
+        try:
+            issues = self.checker.check(sections)
+        except Exception as e:
+            # 规则检查只是加速手段，失败时不影响模型检测
+            self.logger.error(f"❌ 规则检查失败: {str(e)}")
+            issues = []
+        
+        # 规则检查结果立即保存并推送
+        on_issue = context.get('issue_callback')
+        if on_issue:
+            for issue in issues:
+                await on_issue(issue)
+        
+        if progress_callback:
+            await progress_callback(f"规则检查完成，发现 {len(issues)} 个问题", 55)
+        
+        return ProcessingResult(
+            success=True,
+            data=issues,
+            metadata={
+                "rule_issues_count": len(issues),
+                "processing_stage": "rule_check"
+            }
+        )
@@ -0,0 +1,147 @@
+"""
+提示词模板加载器 - 模板只加载和编译一次，模板文件修改后自动重新加载
+"""
+import hashlib
+import logging
+import string
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+
+logger = logging.getLogger(__name__)
+
+# 提示词模板目录（backend/prompts）
+PROMPTS_DIR = Path(__file__).resolve().parents[2] / "prompts"
+# 两次检查模板文件是否修改的最小间隔（秒）
+RELOAD_CHECK_INTERVAL = 2.0
+# 模板未定义 format_prompt_template 时格式说明的默认写法
+DEFAULT_FORMAT_TEMPLATE = "{format_instructions}"
+
+
+class CompiledTemplate:
+    """预编译的格式化模板：占位符只解析一次，渲染时直接拼接字符串"""
+
+    def __init__(self, template: str):
+        self.template = template
+        self._parts: List[Tuple[str, Optional[str], str]] = [
+            (literal, field, spec or "")
+            for literal, field, spec, _ in string.Formatter().parse(template)
+        ]
+        self.fields = {field for _, field, _ in self._parts if field}
+
+    def render(self, **kwargs: Any) -> str:
+        """按参数渲染模板，缺少参数时抛出 KeyError（与 str.format 一致）"""
+        return "".join(
+            literal + (format(kwargs[field], spec) if field is not None else "")
+            for literal, field, spec in self._parts
+        )
+
+
+class PromptTemplate:
+    """
+    单个提示词模板文件
+
+    - system_prompt：系统提示词
+    - format_prompt_template：输出格式说明，追加在系统提示词之后，与系统提示词一起构成所有请求相同的前缀
+    - user_prompt_template：每次请求变化的内容（章节标题、正文等）
+    """
+
+    def __init__(self, name: str, raw: str, mtime: float):
+        data = yaml.safe_load(raw) or {}
+        self.name = name
+        self.mtime = mtime
+        self.version = hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+        self.system_prompt: str = data.get('system_prompt', '')
+        self.format_prompt = CompiledTemplate(data.get('format_prompt_template') or DEFAULT_FORMAT_TEMPLATE)
+        self.user_prompt = CompiledTemplate(data.get('user_prompt_template', ''))
+        # 格式说明 -> 完整的系统提示词（格式说明在进程内固定，渲染一次后复用同一个字符串）
+        self._prefixes: Dict[str, str] = {}
+
+    def prefix(self, format_instructions: str) -> str:
+        """系统提示词 + 输出格式说明"""
+        prefix = self._prefixes.get(format_instructions)
+        if prefix is None:
+            prefix = self.system_prompt.rstrip('\n') + "\n\n" + self.format_prompt.render(
+                format_instructions=format_instructions
+            ).strip('\n')
+            self._prefixes[format_instructions] = prefix
+        return prefix
+
+
+class PromptLoader:
+    """
+    提示词模板加载器
+
+    模板文件首次使用时加载并编译，之后直接使用缓存；
+    距上次检查超过 RELOAD_CHECK_INTERVAL 秒时比较文件修改时间，模板文件被修改后自动重新加载，无需重启服务。
+    """
+
+    def __init__(self, prompts_dir: Path = PROMPTS_DIR, reload_interval: float = RELOAD_CHECK_INTERVAL):
+        self.prompts_dir = Path(prompts_dir)
+        self.reload_interval = reload_interval
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> Path:
+        return self.prompts_dir / f"{name}.yaml"
+
+    def get_template(self, name: str) -> PromptTemplate:
+        """获取编译后的模板，模板文件修改后重新加载"""
+        template = self._templates.get(name)
+        now = time.monotonic()
+        if template is not None and now - self._checked_at.get(name, 0.0) < self.reload_interval:
+            return template
+
+        with self._lock:
+            template = self._templates.get(name)
+            path = self._path(name)
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                if template is not None:
+                    logger.warning(f"⚠️ 提示词模板文件已被删除，继续使用已加载的版本: {path}")
+                    self._checked_at[name] = now
+                    return template
+                raise
+            if template is None or template.mtime != mtime:
+                template = PromptTemplate(name, path.read_text(encoding='utf-8'), mtime)
+                if name in self._templates:
+                    logger.info(f"🔄 提示词模板已修改，重新加载: {name} (版本 {template.version})")
+                else:
+                    logger.debug(f"📝 加载提示词模板: {name} (版本 {template.version})")
+                self._templates[name] = template
+            self._checked_at[name] = now
+        return template
+
+    def get_system_prompt(self, name: str, format_instructions: Optional[str] = None) -> str:
+        """
+        获取系统提示词
+
+        Args:
+            name: 模板名称（prompts 目录下的文件名，不含扩展名）
+            format_instructions: 输出格式说明，提供时追加在系统提示词之后，
+                使所有请求共享同一个字节相同的前缀（便于服务端前缀缓存）
+        """
+        template = self.get_template(name)
+        if format_instructions is None:
+            return template.system_prompt
+        return template.prefix(format_instructions)
+
+    def get_user_prompt(self, name: str, **kwargs: Any) -> str:
+        """按参数渲染用户提示词"""
+        return self.get_template(name).user_prompt.render(**kwargs)
+
+    def clear(self):
+        """清空已加载的模板"""
+        with self._lock:
+            self._templates.clear()
+            self._checked_at.clear()
+
+
+# 全局提示词模板加载器
+prompt_loader = PromptLoader()
@@ -0,0 +1,210 @@
+"""
+模型配额限流 - 按模型端点的 RPM/TPM 令牌桶
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.services.text_chunker import count_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# 尚无实际用量样本时，按 max_tokens 的该比例估算输出tokens
+INITIAL_COMPLETION_RATIO = 0.25
+# 输出tokens估算值跟随实际用量的平滑系数
+COMPLETION_EWMA_ALPHA = 0.2
+
+
+class RequestUsage:
+    """单次模型请求的tokens用量，发送前为估算值，收到响应后记录实际用量"""
+
+    def __init__(self, prompt_tokens: int, model: Optional[str] = None):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens: Optional[int] = None
+        self.model = model
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.completion_tokens is None:
+            return None
+        return self.prompt_tokens + self.completion_tokens
+
+    def record(self, response: Any):
+        """
+        记录响应的实际用量
+
+        优先使用接口返回的 token_usage，没有时（如流式响应）按本地分词统计输出内容的tokens
+        """
+        usage = None
+        for source in ('response_metadata', 'additional_kwargs'):
+            metadata = getattr(response, source, None)
+            if isinstance(metadata, dict):
+                usage = metadata.get('token_usage') or metadata.get('usage')
+            if isinstance(usage, dict):
+                break
+        if isinstance(usage, dict) and usage.get('completion_tokens') is not None:
+            self.prompt_tokens = int(usage.get('prompt_tokens') or self.prompt_tokens)
+            self.completion_tokens = int(usage['completion_tokens'])
+            return
+        content = getattr(response, 'content', '')
+        self.completion_tokens = count_tokens(content if isinstance(content, str) else str(content), self.model)
+
+
+class RateLimiter:
+    """
+    RPM/TPM 令牌桶限流器
+
+    请求桶容量为 rpm、令牌桶容量为 tpm，均按每分钟配额匀速补充。
+    请求发送前按 输入tokens + 输出tokens估算值 预扣，收到响应后按实际用量多退少补，
+    使请求速率始终保持在配额之内，而不是依赖 429 和客户端重试发现超限。
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, max_tokens: int = 4000):
+        self.name = name
+        self.rpm = max(0, int(rpm or 0))
+        self.tpm = max(0, int(tpm or 0))
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = time.monotonic()
+        self.completion_estimate = float(max_tokens) * INITIAL_COMPLETION_RATIO
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        """锁绑定事件循环，在新的事件循环中使用时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60)
+
+    def estimate(self, prompt_tokens: int) -> int:
+        """请求的预扣tokens：输入tokens + 输出tokens估算值（不超过桶容量）"""
+        tokens = int(prompt_tokens + self.completion_estimate)
+        return min(tokens, self.tpm) if self.tpm else tokens
+
+    async def acquire(self, tokens: int) -> int:
+        """
+        等待配额并预扣一个请求和指定的tokens，按请求到达顺序依次放行
+
+        Returns:
+            实际预扣的tokens数
+        """
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        async with self._get_lock():
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    break
+                logger.debug(f"⏳ 模型 {self.name} 配额不足，等待 {wait:.2f}s")
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+        return tokens
+
+    def settle(self, reserved: int, usage: RequestUsage):
+        """按实际用量修正预扣的tokens，并更新输出tokens估算值；没有实际用量时（请求失败）保持预扣"""
+        if usage.completion_tokens is None:
+            return
+        self.completion_estimate += COMPLETION_EWMA_ALPHA * (usage.completion_tokens - self.completion_estimate)
+        if self.tpm:
+            self._refill()
+            # 实际用量超出预扣时余额可以为负，后续请求等待补足
+            self._tokens = min(float(self.tpm), self._tokens + reserved - usage.total_tokens)
+
+
+# 按模型端点共享的限流器
+_limiters: Dict[str, RateLimiter] = {}
+_lock = threading.Lock()
+
+
+def get_rate_limiter(model_config: Dict[str, Any]) -> Optional[RateLimiter]:
+    """
+    获取模型对应的共享限流器，模型配置未设置 rpm/tpm 时返回None
+
+    Args:
+        model_config: AI模型配置（ai_models[].config）
+    """
+    rpm, tpm = model_config.get('rpm') or 0, model_config.get('tpm') or 0
+    if not rpm and not tpm:
+        return None
+    key = f"{model_config.get('base_url') or 'default'}|{model_config.get('model')}"
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = RateLimiter(
+                    name=model_config.get('model') or key,
+                    rpm=rpm,
+                    tpm=tpm,
+                    max_tokens=model_config.get('max_tokens', 4000)
+                )
+                _limiters[key] = limiter
+                logger.info(f"🪣 创建模型配额限流器: {key} (RPM={limiter.rpm or '不限'}, TPM={limiter.tpm or '不限'})")
+    return limiter
+
+
+def clear_rate_limiters():
+    """清空所有限流器"""
+    with _lock:
+        _limiters.clear()
+
+
+@asynccontextmanager
+async def model_call_slot(
+    concurrency_limiter,
+    rate_limiter: Optional[RateLimiter],
+    cost: int,
+    prompt_tokens: int,
+    cancel_token=None,
+    model: Optional[str] = None
+) -> AsyncIterator[RequestUsage]:
+    """
+    模型调用前依次获取并发名额（公平排队）和配额，调用方在收到响应后通过 usage.record 记录实际用量
+
+    Args:
+        concurrency_limiter: 模型的自适应并发限制器，为空时不限制并发
+        rate_limiter: 模型的配额限流器，为空时不限流
+        cost: 请求规模，用于公平排队和延迟归一化
+        prompt_tokens: 请求的输入tokens
+        cancel_token: 取消令牌，等待期间请求取消时立即中断
+    """
+    usage = RequestUsage(prompt_tokens, model)
+    slot_context = nullcontext()
+    if concurrency_limiter is not None:
+        slot_context = concurrency_limiter.slot(cost=cost, cancel_token=cancel_token)
+    async with slot_context as slot:
+        if rate_limiter is None:
+            yield usage
+            return
+        acquire = rate_limiter.acquire(rate_limiter.estimate(prompt_tokens))
+        reserved = await (cancel_token.run(acquire) if cancel_token else acquire)
+        # 等待配额的时间不计入并发限制器的延迟样本
+        if slot is not None:
+            slot.restart()
+        try:
+            yield usage
+        finally:
+            rate_limiter.settle(reserved, usage)
@@ -0,0 +1,300 @@
+"""
+本地规则检查 - 不调用模型即可确定的机械性问题（括号/引号配对、中英文标点混用、代码与命令语法）
+"""
+import ast
+import json
+import logging
+import re
+import shlex
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+ALL_CHECKS = ('brackets', 'punctuation', 'code_syntax')
+
+# 追加到问题检测系统提示词，避免模型重复报告规则检查已覆盖的类别
+# 只列出启用的检查，并限定为规则检查实际解析的范围，未解析的内容仍由模型检查
+PROMPT_SKIP_NOTE_TEMPLATE = "\n\n以下类别已由规则引擎自动检查，请不要报告：{categories}。"
+CHECK_CATEGORIES = {
+    'brackets': "正文中的括号和引号不配对（代码块和行内代码中的仍需检查）",
+    'punctuation': "正文中的中英文标点混用",
+    'code_syntax': ("标注为 {languages} 语言的代码块和以 $ 开头的命令行的语法错误"
+                    "（未标注语言或其他语言的代码块、含 ... 占位的JSON片段、>>> 交互示例和 heredoc 正文仍需检查）"),
+}
+
+FENCE_PATTERN = re.compile(r'^ {0,3}(```|~~~)\s*([\w+-]*)\s*$')
+INLINE_CODE_PATTERN = re.compile(r'`[^`\n]*`')
+COMMAND_LINE_PATTERN = re.compile(r'^\s*\$\s+(\S.*)$')
+CJK = r'[\u4e00-\u9fff]'
+# 中文之间或紧邻中文的英文标点；英文之间的中文标点
+MIXED_PUNCTUATION_PATTERNS = [
+    (re.compile(rf'(?<={CJK})[,;!?](?={CJK}|\s|$)|(?<={CJK}):(?={CJK})|(?<={CJK})\.(?={CJK}|$)'), "中文语句中使用了英文标点"),
+    (re.compile(r'(?<=[A-Za-z0-9])[，；！？](?=[A-Za-z])'), "英文语句中使用了中文标点"),
+]
+CHINESE_PUNCTUATION = {',': '，', ';': '；', '!': '！', '?': '？', ':': '：', '.': '。',
+                       '，': ',', '；': ';', '！': '!', '？': '?'}
+
+# 英文单引号/撇号（’）常用于缩写，不参与配对
+BRACKET_PAIRS = {'(': ')', '（': '）', '[': ']', '【': '】', '{': '}', '《': '》', '“': '”', '「': '」', '『': '』'}
+CLOSING_BRACKETS = {close: open_ for open_, close in BRACKET_PAIRS.items()}
+# 列表编号 "1)"、"a)" 中的右括号不参与配对
+LIST_MARKER_PATTERN = re.compile(r'^\s*(?:\d+|[a-zA-Z])[)）]')
+HEADING_PATTERN = re.compile(r'^ {0,3}#{1,6}\s')
+# heredoc 起始标记（<<EOF、<<-'EOF'），不包括 <<< here-string
+HEREDOC_PATTERN = re.compile(r'(?<!<)<<-?\s*([\'"]?)([A-Za-z_]\w*)\1')
+PLACEHOLDER_PATTERN = re.compile(r'\.\.\.|…')
+
+CODE_LANGUAGES = {
+    'python': 'python', 'py': 'python',
+    'json': 'json',
+    'yaml': 'yaml', 'yml': 'yaml',
+    'bash': 'shell', 'sh': 'shell', 'shell': 'shell', 'console': 'shell', 'zsh': 'shell',
+}
+LANGUAGE_NAMES = {'python': 'Python', 'json': 'JSON', 'yaml': 'YAML', 'shell': 'Shell'}
+
+
+class RuleChecker:
+    """
+    本地规则检查器
+
+    对每个章节做一次线性扫描，输出与模型检测结果相同结构的问题字典（type/description/location/severity/...），
+    并标记 source=rule。代码块按语言使用真实解析器检查语法：Python 用 ast，JSON/YAML 用对应加载器，命令行用 shlex。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: 规则检查配置，为空时从 task_processing.rule_check 读取
+        """
+        if config is None:
+            config = get_settings().rule_check_config
+        self.enabled = config.get('enabled', True)
+        self.checks = set(config.get('checks') or ALL_CHECKS)
+
+    def prompt_skip_note(self) -> str:
+        """问题检测系统提示词中的跳过说明：只列出启用的检查类别，代码语法只列出实际检查的语言"""
+        if not self.enabled:
+            return ""
+        languages = "/".join(LANGUAGE_NAMES[language] for language in dict.fromkeys(CODE_LANGUAGES.values()))
+        categories = [
+            CHECK_CATEGORIES[check].format(languages=languages)
+            for check in ALL_CHECKS if check in self.checks
+        ]
+        if not categories:
+            return ""
+        return PROMPT_SKIP_NOTE_TEMPLATE.format(categories="、".join(categories))
+
+    def check(self, sections: List[Dict]) -> List[Dict]:
+        """检查所有章节，返回问题列表"""
+        if not self.enabled:
+            return []
+        issues = []
+        for section in sections:
+            issues.extend(self.check_section(section))
+        return issues
+
+    def check_section(self, section: Dict) -> List[Dict]:
+        """检查单个章节"""
+        title = section.get('section_title', '未知章节')
+        issues = []
+        prose_lines, code_blocks = self._split_code(section.get('content', ''))
+
+        if 'code_syntax' in self.checks:
+            for language, start_line, code in code_blocks:
+                issue = self._check_code(language, code)
+                if issue:
+                    issues.append(self._issue(title, start_line, code, *issue))
+
+        # 括号和引号按段落配对：硬换行的段落中括号可以跨行闭合
+        paragraphs: List[List[Tuple[int, str, str]]] = [[]]
+        previous = 0
+        for line_number, line in prose_lines:
+            command = COMMAND_LINE_PATTERN.match(line)
+            if command and 'code_syntax' in self.checks:
+                issue = self._check_code('shell', command.group(1))
+                if issue:
+                    issues.append(self._issue(title, line_number, line, *issue))
+                paragraphs.append([])
+                continue
+
+            text = INLINE_CODE_PATTERN.sub(lambda match: ' ' * len(match.group()), line)
+            # 空行、标题行和代码块之后开始新的段落
+            if not text.strip() or HEADING_PATTERN.match(text) or line_number != previous + 1:
+                paragraphs.append([])
+            previous = line_number
+            if text.strip():
+                paragraphs[-1].append((line_number, line, text))
+            if 'punctuation' in self.checks:
+                issues.extend(self._issue(title, line_number, line, *found) for found in self._check_punctuation(text))
+
+        if 'brackets' in self.checks:
+            for paragraph in paragraphs:
+                issues.extend(
+                    self._issue(title, line_number, line, *found)
+                    for line_number, line, found in self._check_brackets(paragraph)
+                )
+        return issues
+
+    @staticmethod
+    def _split_code(content: str) -> Tuple[List[Tuple[int, str]], List[Tuple[str, int, str]]]:
+        """拆分正文行和代码块，返回 ([(行号, 行)], [(语言, 起始行号, 代码)])"""
+        prose: List[Tuple[int, str]] = []
+        blocks: List[Tuple[str, int, str]] = []
+        fence, language, start, code = None, "", 0, []
+        for number, line in enumerate(content.splitlines(), 1):
+            match = FENCE_PATTERN.match(line)
+            if fence is None and match:
+                fence, language, start, code = match.group(1), match.group(2).lower(), number, []
+            elif fence is not None and match and match.group(1) == fence and not match.group(2):
+                blocks.append((language, start, "\n".join(code)))
+                fence = None
+            elif fence is not None:
+                code.append(line)
+            else:
+                prose.append((number, line))
+        return prose, blocks
+
+    @staticmethod
+    def _check_code(language: str, code: str) -> Optional[Tuple[str, str, str, float]]:
+        """按语言解析代码，返回 (问题类型, 描述, 严重等级, 置信度)，语法正确或语言不支持时返回None"""
+        kind = CODE_LANGUAGES.get(language)
+        if not kind or not code.strip():
+            return None
+        # 交互式解释器示例（>>> 提示符）不是完整的源代码
+        if kind == 'python' and '>>>' in code:
+            return None
+        # 含省略号占位（...）的JSON是示意片段，不是完整的配置
+        if kind == 'json' and PLACEHOLDER_PATTERN.search(code):
+            return None
+        try:
+            if kind == 'python':
+                ast.parse(code)
+            elif kind == 'json':
+                json.loads(code)
+            elif kind == 'yaml':
+                import yaml
+                # 支持 --- 分隔的多文档YAML
+                for _ in yaml.safe_load_all(code):
+                    pass
+            else:
+                for command in RuleChecker._shell_commands(code):
+                    shlex.split(command, comments=True)
+        except SyntaxError as e:
+            return "代码错误", f"Python代码存在语法错误（第{e.lineno}行: {e.msg}），用户复制执行时会直接报错", "严重", 1.0
+        except json.JSONDecodeError as e:
+            return "代码错误", f"JSON内容格式错误（第{e.lineno}行第{e.colno}列: {e.msg}），用户按示例配置时将无法被正确解析", "严重", 1.0
+        except ValueError as e:
+            return "命令错误", f"命令行存在语法错误（{e}），引号未闭合，用户复制执行时命令无法正确运行", "严重", 0.95
+        except ImportError:
+            return None
+        except Exception as e:
+            if type(e).__module__.startswith('yaml'):
+                return "代码错误", f"YAML内容格式错误（{str(e).splitlines()[0]}），用户按示例配置时将无法被正确解析", "严重", 1.0
+            logger.debug(f"代码解析异常，跳过检查: {str(e)}")
+        return None
+
+    @staticmethod
+    def _shell_commands(code: str) -> List[str]:
+        """
+        把Shell代码拆分为完整的命令
+
+        以反斜杠结尾的续行和引号内换行的行合并为一条命令，heredoc 正文不是命令不参与解析；
+        带 $ 提示符的终端示例只解析提示符所在的命令行，其余行是命令输出。
+        """
+        lines = code.splitlines()
+        if any(COMMAND_LINE_PATTERN.match(line) for line in lines):
+            lines = [match.group(1) for match in map(COMMAND_LINE_PATTERN.match, lines) if match]
+        commands: List[str] = []
+        pending = ""
+        heredoc: Optional[str] = None
+        for line in lines:
+            if heredoc is not None:
+                if line.strip() == heredoc:
+                    heredoc = None
+                continue
+            pending = f"{pending}\n{line}" if pending else line
+            if pending.rstrip().endswith('\\'):
+                pending = pending.rstrip()[:-1]
+                continue
+            try:
+                shlex.split(pending, comments=True)
+            except ValueError:
+                # 引号未闭合时与下一行合并，到代码结尾仍未闭合才报告
+                continue
+            match = HEREDOC_PATTERN.search(pending)
+            heredoc = match.group(2) if match else None
+            commands.append(pending)
+            pending = ""
+        if pending:
+            commands.append(pending)
+        return commands
+
+    @staticmethod
+    def _check_brackets(lines: List[Tuple[int, str, str]]) -> Iterable[Tuple[int, str, Tuple[str, str, str, float]]]:
+        """
+        段落内括号和中文引号配对检查（栈），英文双引号按数量奇偶检查
+
+        Args:
+            lines: 段落各行的 (行号, 原始行, 去除行内代码后的文本)
+
+        Returns:
+            (问题所在行号, 原始行, (问题类型, 描述, 严重等级, 置信度))，每个段落最多报告一次
+        """
+        stack: List[Tuple[str, int, str]] = []
+        quote: Optional[Tuple[int, str]] = None
+        for line_number, line, text in lines:
+            marker = LIST_MARKER_PATTERN.match(text)
+            if marker:
+                text = ' ' * marker.end() + text[marker.end():]
+            for char in text:
+                if char in BRACKET_PAIRS:
+                    stack.append((char, line_number, line))
+                elif char in CLOSING_BRACKETS:
+                    if stack and stack[-1][0] == CLOSING_BRACKETS[char]:
+                        stack.pop()
+                    else:
+                        yield line_number, line, (
+                            "符号不配对", f"存在多余或不匹配的右侧符号「{char}」，缺少对应的「{CLOSING_BRACKETS[char]}」，"
+                            f"影响语句结构的正确理解", "一般", 0.9)
+                        return
+                elif char == '"':
+                    quote = None if quote else (line_number, line)
+        if stack:
+            char, line_number, line = stack[-1]
+            yield line_number, line, (
+                "符号不配对", f"左侧符号「{char}」没有对应的「{BRACKET_PAIRS[char]}」闭合，"
+                f"括号或引号内的内容范围不明确", "一般", 0.9)
+        elif quote:
+            yield quote[0], quote[1], (
+                "符号不配对", "英文双引号数量为奇数，存在未闭合的引号，引用内容的范围不明确", "一般", 0.85)
+
+    @staticmethod
+    def _check_punctuation(text: str) -> Iterable[Tuple[str, str, str, float]]:
+        """中英文标点混用检查，每行每种情况只报告一次"""
+        for pattern, message in MIXED_PUNCTUATION_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                char = match.group()
+                yield ("标点混用", f"{message}「{char}」，应使用「{CHINESE_PUNCTUATION.get(char, char)}」，"
+                       f"中英文标点混用影响文档的规范性和专业性", "提示", 0.9)
+
+    @staticmethod
+    def _issue(section_title: str, line_number: int, original: str,
+               issue_type: str, description: str, severity: str, confidence: float) -> Dict:
+        original = original.strip()
+        return {
+            "type": issue_type,
+            "description": description,
+            "location": f"{section_title} - 第{line_number}行",
+            "severity": severity,
+            "confidence": confidence,
+            "suggestion": "",
+            "original_text": original[:100],
+            "user_impact": "影响文档的准确性和规范性",
+            "reasoning": "本地规则检查确定性发现",
+            "context": original[:200],
+            "source": "rule"
+        }
@@ -0,0 +1,242 @@
+"""
+本地文档结构提取 - Markdown/DOCX/TXT 按已有的标题结构切分章节，不调用模型
+"""
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_HEADING = re.compile(r'^ {0,3}(#{1,6})\s+(.+?)\s*#*\s*$')
+MARKDOWN_SETEXT = re.compile(r'^ {0,3}(=+|-+)\s*$')
+MARKDOWN_FENCE = re.compile(r'^ {0,3}(```|~~~)')
+DOCX_HEADING_STYLE = re.compile(r'^(?:Heading|标题)\s*(\d)$', re.IGNORECASE)
+
+# 纯文本中的编号标题：第X章/第X节、一、、1 / 1.1 / 1.1.1
+TEXT_HEADING_PATTERNS: List[Tuple[re.Pattern, Any]] = [
+    (re.compile(r'^第[一二三四五六七八九十百零\d]+[章篇部分]\s*\S*'), 1),
+    (re.compile(r'^第[一二三四五六七八九十百零\d]+节\s*\S*'), 2),
+    (re.compile(r'^[一二三四五六七八九十]+[、.．]\s*\S+'), 1),
+    (re.compile(r'^(\d+(?:\.\d+){0,3})[.、．]?\s+\S+'), None),
+]
+# 以这些符号结尾的行是正文句子而不是标题
+SENTENCE_ENDINGS = ('。', '；', '，', ',', ';', '：', ':', '？', '！', '?', '!')
+MAX_TEXT_HEADING_LENGTH = 40
+
+PREAMBLE_TITLE = "文档内容"
+
+
+class LocalStructureExtractor:
+    """
+    本地结构提取器
+
+    - Markdown：按 # 标题（含 === / --- 下划线标题）切分，忽略代码块中的 #
+    - DOCX：按 python-docx 段落的标题样式（Heading N / 标题 N / Title）切分，表格按行输出为文本
+    - TXT：按编号标题切分，识别到的标题过少或章节过碎时视为低置信度
+
+    返回与模型预处理相同的章节列表（section_title / content / level），
+    无法可靠识别结构时返回 None，由调用方交给模型预处理（PDF 始终交给模型）。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: 本地结构提取配置，为空时从 task_processing.local_structure 读取
+        """
+        if config is None:
+            config = get_settings().local_structure_config
+        self.enabled = config.get('enabled', True)
+        self.file_types = {str(file_type).lower().lstrip('.') for file_type in config.get('file_types', ['md', 'docx', 'txt'])}
+        self.min_headings = int(config.get('min_headings', 2))
+        self.min_average_chars = int(config.get('min_average_chars', 80))
+
+    def extract(
+        self,
+        text: str,
+        file_type: Optional[str] = None,
+        file_path: Optional[str] = None
+    ) -> Optional[List[Dict]]:
+        """
+        提取文档结构
+
+        Args:
+            text: 文件解析得到的文本
+            file_type: 文件类型（md/docx/txt/pdf），为空时根据 file_path 扩展名判断
+            file_path: 原始文件路径，DOCX 需要从原文件读取标题样式
+
+        Returns:
+            章节列表，低置信度或不支持的类型返回 None
+        """
+        if not self.enabled:
+            return None
+
+        file_type = (file_type or os.path.splitext(file_path or "")[1]).lower().lstrip('.')
+        if file_type == 'markdown':
+            file_type = 'md'
+        if not file_type and self._looks_like_markdown(text):
+            file_type = 'md'
+        if file_type not in self.file_types:
+            return None
+
+        try:
+            if file_type == 'md':
+                sections = self._from_markdown(text)
+            elif file_type == 'docx':
+                sections = self._from_docx(file_path) if file_path and os.path.exists(file_path) else None
+            else:
+                sections = self._from_text(text)
+        except Exception as e:
+            logger.warning(f"⚠️ 本地结构提取失败，交给模型预处理: {str(e)}")
+            return None
+
+        if not sections or not any(section['section_title'] != PREAMBLE_TITLE for section in sections):
+            return None
+        return sections
+
+    def _from_markdown(self, text: str) -> List[Dict]:
+        builder = _SectionBuilder()
+        lines = text.splitlines()
+        in_fence = None
+        previous = None
+        for line in lines:
+            fence = MARKDOWN_FENCE.match(line)
+            if fence:
+                marker = fence.group(1)
+                in_fence = None if in_fence == marker else (in_fence or marker)
+                builder.add_line(line)
+                previous = None
+                continue
+            if in_fence:
+                builder.add_line(line)
+                continue
+
+            heading = MARKDOWN_HEADING.match(line)
+            if heading:
+                builder.start(heading.group(2).strip(), len(heading.group(1)))
+                previous = None
+                continue
+
+            # 下划线标题：上一行为普通文本，本行全为 = 或 -
+            setext = MARKDOWN_SETEXT.match(line)
+            if setext and previous and previous.strip() and builder.pop_last_line(previous):
+                builder.start(previous.strip(), 1 if setext.group(1)[0] == '=' else 2)
+                previous = None
+                continue
+
+            builder.add_line(line)
+            previous = line
+        return builder.sections()
+
+    def _from_docx(self, file_path: str) -> Optional[List[Dict]]:
+        try:
+            from docx import Document
+            from docx.table import Table
+            from docx.text.paragraph import Paragraph
+        except ImportError:
+            logger.warning("⚠️ 未安装python-docx，DOCX交给模型预处理")
+            return None
+
+        document = Document(file_path)
+        builder = _SectionBuilder()
+        for child in document.element.body.iterchildren():
+            tag = child.tag.rsplit('}', 1)[-1]
+            if tag == 'p':
+                paragraph = Paragraph(child, document)
+                style_name = paragraph.style.name if paragraph.style is not None else ""
+                level = self._docx_heading_level(style_name)
+                if level and paragraph.text.strip():
+                    builder.start(paragraph.text.strip(), level)
+                else:
+                    builder.add_line(paragraph.text)
+            elif tag == 'tbl':
+                for row in Table(child, document).rows:
+                    builder.add_line(" | ".join(cell.text.strip() for cell in row.cells))
+        return builder.sections()
+
+    @staticmethod
+    def _docx_heading_level(style_name: str) -> Optional[int]:
+        if style_name in ('Title', '标题'):
+            return 1
+        match = DOCX_HEADING_STYLE.match(style_name.strip())
+        return int(match.group(1)) if match else None
+
+    def _from_text(self, text: str) -> Optional[List[Dict]]:
+        builder = _SectionBuilder()
+        headings = 0
+        for line in text.splitlines():
+            level = self._text_heading_level(line.strip())
+            if level:
+                builder.start(line.strip(), level)
+                headings += 1
+            else:
+                builder.add_line(line)
+
+        sections = builder.sections()
+        if headings < self.min_headings:
+            return None
+        # 编号列表被误识别为标题时章节会很碎，视为低置信度
+        average_chars = sum(len(section['content']) for section in sections) / max(len(sections), 1)
+        if average_chars < self.min_average_chars:
+            return None
+        return sections
+
+    @staticmethod
+    def _text_heading_level(line: str) -> Optional[int]:
+        if not line or len(line) > MAX_TEXT_HEADING_LENGTH or line.endswith(SENTENCE_ENDINGS):
+            return None
+        for pattern, level in TEXT_HEADING_PATTERNS:
+            match = pattern.match(line)
+            if match:
+                return level or match.group(1).count('.') + 1
+        return None
+
+    @staticmethod
+    def _looks_like_markdown(text: str) -> bool:
+        """未提供文件类型时，至少有两个 # 标题才按 Markdown 处理"""
+        headings = 0
+        for line in text.splitlines():
+            if MARKDOWN_HEADING.match(line):
+                headings += 1
+                if headings >= 2:
+                    return True
+        return False
+
+
+class _SectionBuilder:
+    """按标题顺序累积章节内容"""
+
+    def __init__(self):
+        self._sections: List[Dict] = []
+        self._title = PREAMBLE_TITLE
+        self._level = 1
+        self._lines: List[str] = []
+
+    def start(self, title: str, level: int):
+        self._flush()
+        self._title = title
+        self._level = level
+        self._lines = []
+
+    def add_line(self, line: str):
+        self._lines.append(line)
+
+    def pop_last_line(self, line: str) -> bool:
+        """移除最后一行（下划线标题的标题文本），不匹配时返回False"""
+        if self._lines and self._lines[-1] == line:
+            self._lines.pop()
+            return True
+        return False
+
+    def sections(self) -> List[Dict]:
+        self._flush()
+        return self._sections
+
+    def _flush(self):
+        content = "\n".join(self._lines).strip()
+        # 只有标题没有正文的章节（如直接跟着子标题的上级标题）不输出
+        if content:
+            self._sections.append({"section_title": self._title, "content": content, "level": self._level})
@@ -5,7 +5,6 @@ import os
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from fastapi import UploadFile, HTTPException
-import asyncio
 
 from app.repositories.task import TaskRepository
 from app.repositories.issue import IssueRepository
@@ -15,7 +14,10 @@ from app.repositories.ai_model import AIModelRepository
 from app.repositories.user import UserRepository
 from app.dto.task import TaskResponse, TaskDetail
 from app.dto.issue import IssueResponse
-from app.core.config import settings
+from app.core.config import settings, get_settings
+from app.services.task_scheduler import task_scheduler
+from app.services.checkpoint_store import CheckpointStore
+from app.services.websocket import manager
 from datetime import datetime
 
 
@@ -32,8 +34,20 @@ class TaskService:
         self.user_repo = UserRepository(db)
         self.settings = get_settings()
     
-    async def create_task(self, file: UploadFile, title: Optional[str] = None, model_index: Optional[int] = None) -> TaskResponse:
-        """创建任务"""
+    async def create_task(
+        self,
+        file: UploadFile,
+        title: Optional[str] = None,
+        model_index: Optional[int] = None,
+        user_id: Optional[int] = None,
+        base_task_id: Optional[int] = None
+    ) -> TaskResponse:
+        """
+        创建任务
+        
+        base_task_id 指定修订版文档的上一版本任务（必须属于同一用户）；未指定且已知用户时自动匹配该用户同名文档最近完成的任务，
+        处理时只检测有改动的章节，未改动章节沿用上一版本的检测结果
+        """
         # 验证文件
         file_settings = settings.file_settings
         allowed_exts = ['.' + ext for ext in file_settings.get('allowed_extensions', ['pdf', 'docx', 'md'])]
@@ -64,9 +78,20 @@ class TaskService:
         models = settings.ai_models
         model_label = models[model_index].get('label', f'Model {model_index}') if model_index < len(models) else 'Unknown'
         
+        # 确定增量分析的基准任务
+        task_title = title or os.path.splitext(file_name)[0]
+        if base_task_id is not None:
+            # 其他用户的任务按不存在处理，避免沿用他人文档的检测结果
+            base_task = self.task_repo.get_by_id(base_task_id)
+            if not base_task or base_task.user_id != user_id:
+                raise HTTPException(404, f"基准任务不存在: {base_task_id}")
+        elif user_id is not None and self.settings.task_processing_config.get('incremental_analysis', True):
+            base_task = self.task_repo.find_base_task(task_title, user_id=user_id)
+            base_task_id = base_task.id if base_task else None
+        
         # 创建任务记录
         task = self.task_repo.create(
-            title=title or os.path.splitext(file_name)[0],
+            title=task_title,
             file_name=file_name,
             file_path=file_path,
             file_size=file_size,
@@ -74,13 +99,14 @@ class TaskService:
             status='pending',
             progress=0,
             model_index=model_index,
-            model_label=model_label
+            model_label=model_label,
+            user_id=user_id,
+            base_task_id=base_task_id
         )
         
-        # 异步处理任务
-        from app.services.task_processor import TaskProcessor
-        processor = TaskProcessor(self.db)
-        asyncio.create_task(processor.process_task(task.id))
+        # inline模式下加入本进程的调度队列；worker模式下pending记录即为队列，由工作进程认领
+        if self.settings.task_execution_mode == 'inline':
+            await task_scheduler.submit(task.id, priority=task_scheduler.priority_for(file_size))
         
         # 获取关联数据构建响应
         file_info = self.file_repo.get_by_id(task.file_id) if task.file_id else None
@@ -144,12 +170,15 @@ class TaskService:
             issues=[IssueResponse.from_orm(issue) for issue in issues]
         )
     
-    def delete_task(self, task_id: int) -> bool:
+    async def delete_task(self, task_id: int) -> bool:
         """删除任务"""
         task = self.task_repo.get_by_id(task_id)
         if not task:
             raise HTTPException(404, "任务不存在")
         
+        # 先停止排队或执行中的处理，避免删除后继续调用模型并写入结果
+        await task_scheduler.cancel(task_id, "任务已删除")
+        
         # 删除文件
         if os.path.exists(task.file_path):
             os.remove(task.file_path)
@@ -171,6 +200,53 @@ class TaskService:
         
         return task_deleted
     
+    async def cancel_task(self, task_id: int) -> dict:
+        """
+        取消排队中或执行中的任务
+        状态先标记为 cancelled，执行中的任务在下一个检查点停止并中断进行中的模型调用；
+        worker模式下由工作进程按 cancel_poll_interval 轮询发现取消状态
+        """
+        task = self.task_repo.get_by_id(task_id)
+        if not task:
+            raise HTTPException(404, "任务不存在")
+        if task.status not in ('pending', 'processing'):
+            raise HTTPException(400, f"只能取消排队中或处理中的任务，当前状态: {task.status}")
+        
+        self.task_repo.update(task_id, status='cancelled', error_message="用户取消任务")
+        stopped = await task_scheduler.cancel(task_id)
+        await manager.send_status(task_id, "cancelled")
+        return {"success": True, "message": "任务已取消", "stopped_locally": stopped}
+    
+    async def retry_task(self, task_id: int) -> dict:
+        """
+        重试失败或已取消的任务
+        已保存检查点的步骤不会重新执行，问题检测只重新检测失败的章节
+        """
+        task = self.task_repo.get_by_id(task_id)
+        if not task:
+            raise HTTPException(404, "任务不存在")
+        if task.status not in ('failed', 'cancelled'):
+            raise HTTPException(400, f"只能重试失败或已取消的任务，当前状态: {task.status}")
+        
+        self.task_repo.update(
+            task_id,
+            status='pending',
+            progress=0,
+            error_message=None,
+            completed_at=None
+        )
+        
+        # inline模式下重新加入调度队列；worker模式下由工作进程认领
+        if self.settings.task_execution_mode == 'inline':
+            await task_scheduler.submit(task_id, priority=task_scheduler.priority_for(task.file_size or 0))
+        
+        checkpoint_steps = CheckpointStore(self.db, task_id).steps()
+        return {
+            "success": True,
+            "message": "任务已重新提交",
+            "checkpoint_steps": checkpoint_steps
+        }
+    
     def create(self, **kwargs) -> TaskResponse:
         """创建任务实体（同步版本）"""
         # 这里实现同步的创建逻辑，不过不常用
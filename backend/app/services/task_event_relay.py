@@ -0,0 +1,122 @@
+"""
+任务事件转发 - worker模式下将工作进程写入数据库的日志、问题和状态推送到WebSocket
+"""
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.models import Task, TaskLog, Issue
+from app.dto.issue import IssueResponse
+from app.services.websocket import manager
+
+
+logger = logging.getLogger(__name__)
+
+
+class TaskEventRelay:
+    """
+    任务事件转发器
+
+    工作进程与API进程不共享WebSocket连接，工作进程的日志、问题和进度只写入数据库。
+    转发器在API进程内轮询有WebSocket订阅的任务，将新增日志、新增问题和状态变化推送给前端。
+    """
+
+    def __init__(self, interval: Optional[float] = None, session_factory=None):
+        """
+        初始化转发器
+
+        Args:
+            interval: 轮询间隔（秒）
+            session_factory: 数据库会话工厂
+        """
+        worker_config = get_settings().task_worker_config
+        self.interval = interval or float(worker_config.get('event_relay_interval', 1))
+        self.session_factory = session_factory or SessionLocal
+        self._last_log_ids: Dict[int, int] = {}
+        self._last_issue_ids: Dict[int, int] = {}
+        self._last_states: Dict[int, Tuple[str, float]] = {}
+        self._runner: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """启动轮询"""
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run(), name="task-event-relay")
+
+    async def stop(self):
+        """停止轮询"""
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.relay_once()
+            except Exception as e:
+                logger.warning(f"⚠️ 任务事件转发失败: {str(e)}")
+
+    async def relay_once(self):
+        """转发一轮订阅任务的新日志和状态变化"""
+        task_ids = list(manager.active_connections.keys())
+        # 清理已无订阅的任务游标
+        for task_id in list(self._last_log_ids):
+            if task_id not in manager.active_connections:
+                self._last_log_ids.pop(task_id, None)
+                self._last_issue_ids.pop(task_id, None)
+                self._last_states.pop(task_id, None)
+        if not task_ids:
+            return
+
+        db = self.session_factory()
+        try:
+            for task_id in task_ids:
+                await self._relay_logs(db, task_id)
+                await self._relay_issues(db, task_id)
+                await self._relay_state(db, task_id)
+        finally:
+            db.close()
+
+    async def _relay_logs(self, db, task_id: int):
+        query = db.query(TaskLog).filter(TaskLog.task_id == task_id)
+        last_id = self._last_log_ids.get(task_id)
+        if last_id is None:
+            # 新订阅只转发之后产生的日志，历史日志由日志接口提供
+            latest = query.order_by(TaskLog.id.desc()).first()
+            self._last_log_ids[task_id] = latest.id if latest else 0
+            return
+
+        for log in query.filter(TaskLog.id > last_id).order_by(TaskLog.id).all():
+            await manager.send_log(task_id, log.level, log.message, log.stage, log.progress, log.module or "system")
+            self._last_log_ids[task_id] = log.id
+
+    async def _relay_issues(self, db, task_id: int):
+        query = db.query(Issue).filter(Issue.task_id == task_id)
+        last_id = self._last_issue_ids.get(task_id)
+        if last_id is None:
+            # 新订阅只转发之后产生的问题，已有问题由任务详情接口提供
+            latest = query.order_by(Issue.id.desc()).first()
+            self._last_issue_ids[task_id] = latest.id if latest else 0
+            return
+
+        for issue in query.filter(Issue.id > last_id).order_by(Issue.id).all():
+            await manager.send_issue(task_id, IssueResponse.from_orm(issue).dict())
+            self._last_issue_ids[task_id] = issue.id
+
+    async def _relay_state(self, db, task_id: int):
+        task = db.query(Task.status, Task.progress).filter(Task.id == task_id).first()
+        if not task:
+            return
+        state = (task.status, task.progress or 0)
+        if self._last_states.get(task_id) == state:
+            return
+        self._last_states[task_id] = state
+        await manager.send_progress(task_id, int(state[1]))
+        await manager.send_status(task_id, state[0])
+
+
+# 全局任务事件转发器实例
+task_event_relay = TaskEventRelay()
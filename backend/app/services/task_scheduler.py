@@ -0,0 +1,488 @@
+"""
+任务调度器 - 有界并发的任务优先队列
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.services.websocket import manager
+from app.services.cancellation import CancellationToken, TaskCancelledError
+
+
+logger = logging.getLogger(__name__)
+
+
+def default_owner_id(index: Optional[int] = None) -> str:
+    """
+    本节点的租约持有者标识
+
+    配置了 task_processing.node_id 时使用固定标识，节点重启后可以立即回收上次运行遗留的租约；
+    否则为 主机名:进程号。同一节点的多个工作进程追加进程序号。
+    """
+    node_id = get_settings().task_processing_config.get('node_id') or f"{socket.gethostname()}:{os.getpid()}"
+    return node_id if index is None else f"{node_id}:{index}"
+
+
+@dataclass(order=True)
+class QueuedTask:
+    """队列中的任务项，按 (priority, sequence) 排序，数值越小越先执行"""
+    priority: int
+    sequence: int
+    task_id: int = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.time)
+
+
+class TaskScheduler:
+    """
+    任务调度器
+
+    - 待处理任务进入优先队列，由固定数量的工作协程按优先级取出执行
+    - 工作协程数量取自 task_processing.max_concurrent_tasks
+    - 单个任务的执行时间受 task_processing.task_timeout 限制
+    - 排队中的任务通过 WebSocket 推送排队位置和预计等待时间
+    - 执行前以租约认领任务，执行中定期续期，多节点部署时同一任务只会被一个节点执行
+    - 启动时回收本节点上次运行遗留的租约，之后定期回收租约或心跳过期的遗留任务（包括其他节点崩溃遗留的任务）
+    - 停止时交还执行中任务的租约，其他节点无需等待租约到期即可接管
+    - 排队中的任务取消时直接出队，执行中的任务通过取消令牌协作式停止
+    """
+
+    # 用于估算等待时间的历史样本数
+    HISTORY_SIZE = 20
+
+    def __init__(
+        self,
+        max_concurrent_tasks: Optional[int] = None,
+        task_timeout: Optional[float] = None,
+        processor_factory: Optional[Callable] = None,
+        session_factory: Optional[Callable] = None,
+        owner_id: Optional[str] = None,
+        recover_orphans: bool = True
+    ):
+        """
+        初始化任务调度器
+
+        Args:
+            max_concurrent_tasks: 最大并发任务数，为空时从配置读取
+            task_timeout: 任务超时时间（秒），为空时从配置读取
+            processor_factory: 根据数据库会话创建任务处理器的工厂函数
+            session_factory: 数据库会话工厂
+            owner_id: 本节点标识，用于持有任务租约，默认为 task_processing.node_id 或 主机名:进程号
+            recover_orphans: 是否在心跳循环中定期回收遗留任务并加入本调度器队列
+                             （worker模式由工作进程回收，再经认领循环按空闲并发数执行）
+        """
+        self._max_concurrent_tasks = max_concurrent_tasks
+        self._task_timeout = task_timeout
+        self.processor_factory = processor_factory or self._default_processor_factory
+        self.session_factory = session_factory or SessionLocal
+        self.owner_id = owner_id or default_owner_id()
+        self.recover_orphans = recover_orphans
+
+        self._pending: List[QueuedTask] = []
+        self._queued_ids: Dict[int, QueuedTask] = {}
+        self._running: Dict[int, asyncio.Task] = {}
+        self._cancel_tokens: Dict[int, CancellationToken] = {}
+        self._sequence = itertools.count()
+        self._durations: Deque[float] = deque(maxlen=self.HISTORY_SIZE)
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._cancel_watch: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @staticmethod
+    def _default_processor_factory(db):
+        from app.services.new_task_processor import NewTaskProcessor
+        return NewTaskProcessor(db)
+
+    @property
+    def max_concurrent_tasks(self) -> int:
+        """工作协程数量"""
+        if self._max_concurrent_tasks is None:
+            config = get_settings().task_processing_config
+            self._max_concurrent_tasks = max(1, int(config.get('max_concurrent_tasks', 3)))
+        return self._max_concurrent_tasks
+
+    @property
+    def task_timeout(self) -> Optional[float]:
+        """单个任务超时时间（秒），0或空表示不限制"""
+        if self._task_timeout is None:
+            config = get_settings().task_processing_config
+            self._task_timeout = float(config.get('task_timeout', 0) or 0)
+        return self._task_timeout or None
+
+    @property
+    def heartbeat_interval(self) -> float:
+        """心跳刷新间隔（秒）"""
+        return float(get_settings().task_processing_config.get('heartbeat_interval', 30))
+
+    @property
+    def cancel_poll_interval(self) -> float:
+        """检查执行中任务是否已被其他进程取消或删除的间隔（秒），短于心跳间隔"""
+        return float(get_settings().task_processing_config.get('cancel_poll_interval', 2))
+
+    @property
+    def heartbeat_timeout(self) -> float:
+        """心跳超时时间（秒），同时作为任务租约时长，超时未续期的处理中任务视为遗留任务"""
+        config = get_settings().task_processing_config
+        return float(config.get('heartbeat_timeout', self.heartbeat_interval * 4))
+
+    def stale_before(self) -> datetime:
+        """心跳早于该时间的处理中任务视为遗留任务"""
+        return datetime.utcnow() - timedelta(seconds=self.heartbeat_timeout)
+
+    @property
+    def free_slots(self) -> int:
+        """当前空闲的工作协程数量"""
+        return max(0, self.max_concurrent_tasks - len(self._running) - len(self._pending))
+
+    @property
+    def running_task_ids(self) -> List[int]:
+        """本调度器正在执行的任务ID"""
+        return list(self._running)
+
+    @property
+    def is_running(self) -> bool:
+        """调度器是否已启动"""
+        return bool(self._workers)
+
+    async def start(self):
+        """启动工作协程"""
+        if self.is_running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(index), name=f"task-worker-{index}")
+            for index in range(self.max_concurrent_tasks)
+        ]
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop(), name="task-heartbeat")
+        self._cancel_watch = asyncio.create_task(self._cancel_watch_loop(), name="task-cancel-watch")
+        logger.info(f"🚦 任务调度器已启动: 并发数={self.max_concurrent_tasks}, 超时={self.task_timeout}s")
+
+    async def stop(self):
+        """停止工作协程，正在执行的任务会被取消"""
+        workers, self._workers = self._workers, []
+        for loop_task in (self._heartbeat, self._cancel_watch):
+            if loop_task:
+                workers.append(loop_task)
+        self._heartbeat = self._cancel_watch = None
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._release_leases()
+        logger.info("🛑 任务调度器已停止")
+
+    def priority_for(self, file_size: Optional[int]) -> int:
+        """根据文档大小计算优先级：小文档优先调度，保证交互式任务的响应速度"""
+        small_size = get_settings().task_processing_config.get('small_task_file_size', 1048576)
+        return 0 if (file_size or 0) <= small_size else 1
+
+    async def submit(self, task_id: int, priority: int = 0) -> int:
+        """
+        提交任务到队列
+
+        Args:
+            task_id: 任务ID
+            priority: 优先级，数值越小越先执行
+
+        Returns:
+            任务的排队位置（从1开始）
+        """
+        if not self.is_running:
+            await self.start()
+
+        if task_id in self._queued_ids or task_id in self._running:
+            return self.queue_position(task_id) or 0
+
+        item = QueuedTask(priority=priority, sequence=next(self._sequence), task_id=task_id)
+        async with self._wakeup:
+            heapq.heappush(self._pending, item)
+            self._queued_ids[task_id] = item
+            self._wakeup.notify()
+
+        position = self.queue_position(task_id)
+        logger.info(f"📥 任务 {task_id} 已加入队列 (优先级={priority}, 位置={position})")
+        await self._broadcast_queue_positions()
+        return position
+
+    async def cancel(self, task_id: int, reason: str = "用户取消任务") -> bool:
+        """
+        取消任务
+
+        排队中的任务直接移出队列；执行中的任务通过取消令牌通知处理链，
+        未开始的章节检测不再执行，进行中的模型调用被中断
+
+        Returns:
+            任务是否在本调度器中排队或执行
+        """
+        item = self._queued_ids.pop(task_id, None)
+        if item is not None:
+            self._pending.remove(item)
+            heapq.heapify(self._pending)
+            logger.info(f"⏹️ 任务 {task_id} 已移出队列: {reason}")
+            await self._broadcast_queue_positions()
+            return True
+
+        token = self._cancel_tokens.get(task_id)
+        if token is not None:
+            token.cancel(reason)
+            logger.info(f"⏹️ 已请求取消执行中的任务 {task_id}: {reason}")
+            return True
+
+        # 已出队但尚未开始处理（正在认领）的任务直接取消
+        run = self._running.get(task_id)
+        if run is not None:
+            run.cancel()
+            return True
+        return False
+
+    async def recover_tasks(self) -> int:
+        """
+        启动时恢复遗留任务
+
+        - 本节点上次运行遗留的租约立即释放（无需等待租约到期）
+        - pending 状态的任务重新加入队列
+        - 租约或心跳过期的 processing 任务重置为 pending 后重新加入队列
+
+        Returns:
+            恢复的任务数量
+        """
+        from app.repositories.task import TaskRepository
+
+        db = self.session_factory()
+        try:
+            task_repo = TaskRepository(db)
+            task_repo.release_owner_tasks(self.owner_id, exclude_ids=list(self._running))
+            orphaned = task_repo.reset_orphaned_tasks(self.stale_before(), exclude_ids=list(self._running))
+            for task_id in orphaned:
+                logger.warning(f"♻️ 回收遗留任务 {task_id}")
+
+            recovered = [(task.id, task.file_size) for task in task_repo.get_pending_tasks()]
+        finally:
+            db.close()
+
+        for task_id, file_size in recovered:
+            await self.submit(task_id, priority=self.priority_for(file_size))
+
+        if recovered:
+            logger.info(f"♻️ 已恢复 {len(recovered)} 个任务 (其中遗留处理中任务 {len(orphaned)} 个)")
+        return len(recovered)
+
+    async def recover_orphaned_tasks(self) -> List[int]:
+        """回收租约或心跳过期的处理中任务（如其他节点崩溃遗留），重置为 pending 后加入本调度器队列"""
+        from app.repositories.task import TaskRepository
+
+        db = self.session_factory()
+        try:
+            task_repo = TaskRepository(db)
+            orphaned = task_repo.reset_orphaned_tasks(self.stale_before(), exclude_ids=list(self._running))
+            recovered = [(task.id, task.file_size) for task in map(task_repo.get_by_id, orphaned) if task]
+        finally:
+            db.close()
+
+        for task_id, file_size in recovered:
+            logger.warning(f"♻️ 回收遗留任务 {task_id}")
+            await self.submit(task_id, priority=self.priority_for(file_size))
+        return orphaned
+
+    def _release_leases(self):
+        """交还本节点持有的所有处理中任务的租约"""
+        from app.repositories.task import TaskRepository
+
+        db = self.session_factory()
+        try:
+            released = TaskRepository(db).release_owner_tasks(self.owner_id)
+            if released:
+                logger.info(f"🔓 已交还 {len(released)} 个执行中任务的租约: {released}")
+        except Exception as e:
+            logger.warning(f"⚠️ 交还任务租约失败: {str(e)}")
+        finally:
+            db.close()
+
+    def queue_position(self, task_id: int) -> Optional[int]:
+        """获取任务的排队位置（从1开始），不在队列中返回None"""
+        if task_id not in self._queued_ids:
+            return None
+        ordered = sorted(self._pending)
+        for index, item in enumerate(ordered):
+            if item.task_id == task_id:
+                return index + 1
+        return None
+
+    def estimate_wait(self, position: int) -> Optional[float]:
+        """根据最近完成任务的平均耗时估算排队等待时间（秒）"""
+        if not self._durations:
+            return None
+        average = sum(self._durations) / len(self._durations)
+        rounds = math.ceil(position / self.max_concurrent_tasks)
+        return round(rounds * average, 1)
+
+    def get_stats(self) -> Dict[str, object]:
+        """获取调度器统计信息"""
+        return {
+            "max_concurrent_tasks": self.max_concurrent_tasks,
+            "task_timeout": self.task_timeout,
+            "queued": len(self._pending),
+            "running": len(self._running),
+            "average_duration": (
+                round(sum(self._durations) / len(self._durations), 2) if self._durations else None
+            )
+        }
+
+    async def _next_task(self) -> QueuedTask:
+        """等待并取出优先级最高的任务"""
+        async with self._wakeup:
+            while not self._pending:
+                await self._wakeup.wait()
+            item = heapq.heappop(self._pending)
+            self._queued_ids.pop(item.task_id, None)
+            return item
+
+    async def _worker(self, index: int):
+        """工作协程：循环从队列取任务执行"""
+        while True:
+            item = await self._next_task()
+            # 出队后在任何await之前占用执行名额：认领和广播期间 free_slots 不会把该任务算作空闲，
+            # 认领失败时任务结束，名额随之释放
+            run = asyncio.create_task(self._run_task(item.task_id))
+            self._running[item.task_id] = run
+            started = time.time()
+            try:
+                await self._broadcast_queue_positions()
+
+                wait_time = time.time() - item.enqueued_at
+                logger.info(f"▶️ worker-{index} 开始处理任务 {item.task_id} (排队 {wait_time:.1f}s)")
+
+                # 使用wait而非直接await，任务本身被取消时不影响工作协程
+                await asyncio.wait({run})
+            except asyncio.CancelledError:
+                run.cancel()
+                raise
+            finally:
+                self._running.pop(item.task_id, None)
+
+            if run.cancelled() or isinstance(run.exception(), TaskCancelledError):
+                logger.info(f"⏹️ 任务 {item.task_id} 已取消")
+            elif run.exception():
+                logger.error(f"❌ 任务 {item.task_id} 执行失败: {str(run.exception())}")
+            else:
+                self._durations.append(time.time() - started)
+
+    async def _run_task(self, task_id: int):
+        """以租约认领任务后在独立的数据库会话中执行，并施加超时限制"""
+        from app.repositories.task import TaskRepository
+
+        db = self.session_factory()
+        task_repo = TaskRepository(db)
+        try:
+            if not task_repo.claim_task(task_id, self.owner_id, self.heartbeat_timeout):
+                logger.info(f"⏭️ 任务 {task_id} 已被其他节点认领，跳过")
+                return
+
+            processor = self.processor_factory(db)
+            token = CancellationToken()
+            self._cancel_tokens[task_id] = token
+            try:
+                await asyncio.wait_for(
+                    processor.process_task(task_id, cancel_token=token),
+                    timeout=self.task_timeout
+                )
+            except asyncio.TimeoutError:
+                message = f"任务处理超时（超过{self.task_timeout:.0f}秒）"
+                logger.error(f"⏱️ 任务 {task_id} {message}")
+                task_repo.update(task_id, status="failed", error_message=message)
+                await manager.send_status(task_id, "failed")
+                raise
+        finally:
+            self._cancel_tokens.pop(task_id, None)
+            try:
+                task_repo.release_task(task_id, self.owner_id)
+            except Exception as e:
+                logger.warning(f"⚠️ 释放任务 {task_id} 租约失败: {str(e)}")
+            db.close()
+
+    async def _heartbeat_loop(self):
+        """
+        定期为执行中的任务续期租约，租约已被其他节点接管的任务在本地取消；
+        启用 recover_orphans 时同时回收遗留任务
+        """
+        from app.repositories.task import TaskRepository
+
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self.recover_orphans:
+                try:
+                    await self.recover_orphaned_tasks()
+                except Exception as e:
+                    logger.warning(f"⚠️ 回收遗留任务失败: {str(e)}")
+            running_ids = list(self._running)
+            if not running_ids:
+                continue
+            db = self.session_factory()
+            try:
+                task_repo = TaskRepository(db)
+                renewed = set(task_repo.renew_leases(running_ids, self.owner_id, self.heartbeat_timeout))
+            except Exception as e:
+                logger.warning(f"⚠️ 续期任务租约失败: {str(e)}")
+                continue
+            finally:
+                db.close()
+
+            for task_id in running_ids:
+                run = self._running.get(task_id)
+                if task_id not in renewed and run and not run.done():
+                    logger.warning(f"⚠️ 任务 {task_id} 的租约已失效，停止本地执行")
+                    run.cancel()
+
+    async def _cancel_watch_loop(self):
+        """
+        按 cancel_poll_interval 检查执行中的任务，其他进程（如worker模式下的API进程）取消或删除的任务
+        通过取消令牌停止，不必等到下一次租约续期
+        """
+        from app.repositories.task import TaskRepository
+
+        while True:
+            await asyncio.sleep(self.cancel_poll_interval)
+            running_ids = [task_id for task_id in self._running if task_id in self._cancel_tokens]
+            if not running_ids:
+                continue
+            db = self.session_factory()
+            try:
+                cancelled = TaskRepository(db).get_cancelled_ids(running_ids)
+            except Exception as e:
+                logger.warning(f"⚠️ 检查任务取消状态失败: {str(e)}")
+                continue
+            finally:
+                db.close()
+
+            for task_id in cancelled:
+                token = self._cancel_tokens.get(task_id)
+                if token and not token.cancelled:
+                    logger.info(f"⏹️ 任务 {task_id} 已在其他进程中取消或删除，停止本地执行")
+                    token.cancel("任务已被取消")
+
+    async def _broadcast_queue_positions(self):
+        """向排队中的任务推送排队位置和预计等待时间"""
+        for index, item in enumerate(sorted(self._pending)):
+            position = index + 1
+            await manager.send_status(
+                item.task_id,
+                "pending",
+                queue_position=position,
+                eta_seconds=self.estimate_wait(position)
+            )
+
+
+# 全局任务调度器实例
+task_scheduler = TaskScheduler()
@@ -0,0 +1,166 @@
+"""
+任务工作进程 - 在独立进程中从数据库认领并执行任务
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from typing import Optional
+
+from app.core.config import get_settings, init_settings
+from app.core.database import SessionLocal
+from app.repositories.task import TaskRepository
+from app.services.task_scheduler import TaskScheduler, default_owner_id
+from app.services.model_registry import model_registry
+from app.services.llm_client import close_async_http_clients
+
+
+logger = logging.getLogger(__name__)
+
+
+class TaskWorker:
+    """
+    任务工作进程
+
+    API进程只负责创建 pending 状态的任务记录，工作进程轮询数据库以租约认领任务，
+    交给本进程内的 TaskScheduler 执行（并发上限、超时和租约续期由调度器负责）。
+    租约过期的任务可被其他节点重新认领，多节点部署时不会重复处理同一任务。
+    启动时释放本进程上次运行遗留的租约，运行期间定期回收心跳过期的遗留任务，退出时交还执行中任务的租约。
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, poll_interval: Optional[float] = None):
+        """
+        初始化工作进程
+
+        Args:
+            worker_id: 工作进程标识，默认为 task_processing.node_id 或 主机名:进程号
+            poll_interval: 队列为空时的轮询间隔（秒）
+        """
+        self.settings = get_settings()
+        worker_config = self.settings.task_worker_config
+        self.worker_id = worker_id or default_owner_id()
+        self.poll_interval = poll_interval or float(worker_config.get('poll_interval', 2))
+        # 遗留任务由本进程回收为 pending 后经认领循环执行，调度器不直接加入队列
+        self.scheduler = TaskScheduler(session_factory=SessionLocal, owner_id=self.worker_id, recover_orphans=False)
+        self._stopped = asyncio.Event()
+
+    async def run(self):
+        """运行认领循环，直到 stop 被调用"""
+        if self.settings.ai_warm_up_enabled:
+            await model_registry.warm_up(self.settings.ai_models)
+        await self.scheduler.start()
+        self._recover_orphaned_tasks(release_own=True)
+        last_recovery = time.monotonic()
+        logger.info(f"👷 工作进程 {self.worker_id} 已启动，并发数={self.scheduler.max_concurrent_tasks}")
+
+        try:
+            while not self._stopped.is_set():
+                if time.monotonic() - last_recovery >= self.scheduler.heartbeat_interval:
+                    self._recover_orphaned_tasks()
+                    last_recovery = time.monotonic()
+                claimed = await self.claim_tasks()
+                if not claimed:
+                    try:
+                        await asyncio.wait_for(self._stopped.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self.scheduler.stop()
+            await close_async_http_clients()
+            logger.info(f"👷 工作进程 {self.worker_id} 已退出")
+
+    def stop(self):
+        """请求停止认领循环"""
+        self._stopped.set()
+
+    async def claim_tasks(self) -> int:
+        """按空闲并发数认领待处理任务，返回认领数量"""
+        small_size = self.settings.task_processing_config.get('small_task_file_size', 1048576)
+        claimed = 0
+        while self.scheduler.free_slots > 0:
+            db = SessionLocal()
+            try:
+                task = TaskRepository(db).claim_next_task(
+                    owner_id=self.worker_id,
+                    lease_seconds=self.scheduler.heartbeat_timeout,
+                    small_file_size=small_size
+                )
+                if not task:
+                    break
+                task_id, file_size = task.id, task.file_size
+            finally:
+                db.close()
+
+            logger.info(f"📌 工作进程 {self.worker_id} 认领任务 {task_id}")
+            await self.scheduler.submit(task_id, priority=self.scheduler.priority_for(file_size))
+            claimed += 1
+        return claimed
+
+    def _recover_orphaned_tasks(self, release_own: bool = False):
+        """
+        将租约或心跳过期的处理中任务重置为待处理，由认领循环重新执行
+
+        Args:
+            release_own: 是否先释放本进程标识持有的租约（启动时，上次运行遗留的任务不可能仍在本进程执行）
+        """
+        db = SessionLocal()
+        try:
+            task_repo = TaskRepository(db)
+            running_ids = self.scheduler.running_task_ids
+            if release_own:
+                task_repo.release_owner_tasks(self.worker_id, exclude_ids=running_ids)
+            for task_id in task_repo.reset_orphaned_tasks(self.scheduler.stale_before(), exclude_ids=running_ids):
+                logger.warning(f"♻️ 回收遗留任务 {task_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ 回收遗留任务失败: {str(e)}")
+        finally:
+            db.close()
+
+
+def _worker_process_main(config_file: Optional[str], index: int):
+    """子进程入口：重新初始化配置后运行工作进程"""
+    if config_file:
+        init_settings(config_file)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    worker = TaskWorker(worker_id=default_owner_id(index))
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(processes: int = 1, config_file: Optional[str] = None):
+    """
+    启动工作进程
+
+    Args:
+        processes: 工作进程数量，为1时在当前进程内运行
+        config_file: 配置文件路径，子进程据此重新加载配置
+    """
+    if config_file:
+        # 子进程导入数据库模块时按该环境变量加载同一份配置
+        os.environ['CONFIG_FILE'] = config_file
+
+    if processes <= 1:
+        _worker_process_main(config_file, 0)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    children = [
+        context.Process(target=_worker_process_main, args=(config_file, index), name=f"task-worker-{index}")
+        for index in range(processes)
+    ]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.join()
@@ -0,0 +1,247 @@
+"""
+文本分块服务 - 按模型上下文窗口计算输入预算，按段落/句子边界切分长文本并打包短章节
+"""
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+# 未配置上下文窗口时的保守默认值
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_RESERVED_TOKENS = 1000
+# 配置不合理（窗口过小）时的最小输入预算
+MIN_INPUT_BUDGET = 256
+
+PARAGRAPH_PATTERN = re.compile(r'(\n[ \t]*\n\s*)')
+SENTENCE_PATTERN = re.compile(r'(?<=[。！？；!?;\n])|(?<=\.)(?=\s)')
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: Optional[str]):
+    """获取模型对应的tiktoken编码，不可用（未安装或无法下载词表）时返回None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model or "")
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️ tiktoken编码不可用，使用字符数估算tokens: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    计算文本的token数
+
+    优先使用tiktoken精确计算；不可用时按字符估算（中日韩字符按1.5个token，其余字符按4个字符1个token），估算值偏保守。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(CJK_PATTERN.findall(text))
+    return int(cjk * 1.5) + (len(text) - cjk + 3) // 4
+
+
+class TokenChunker:
+    """
+    按token预算分块
+
+    每次请求可用的输入预算 = context_window - max_tokens（输出） - reserved_tokens（系统提示词） - 提示词模板开销，
+    超出预算的文本按段落、句子、字符逐级切分，不足预算的章节按顺序打包到同一次请求中。
+    """
+
+    def __init__(self, model_config: Dict[str, Any], chunking_config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            model_config: AI模型配置（ai_models[].config）
+            chunking_config: 分块配置，为空时从 task_processing.chunking 读取
+        """
+        if chunking_config is None:
+            chunking_config = get_settings().chunking_config
+        self.model = model_config.get('model')
+        self.context_window = int(model_config.get('context_window') or DEFAULT_CONTEXT_WINDOW)
+        self.reserved_tokens = int(model_config.get('reserved_tokens') or DEFAULT_RESERVED_TOKENS)
+        self.max_output_tokens = int(model_config.get('max_tokens') or 4000)
+        self.max_chunk_tokens = int(chunking_config.get('max_chunk_tokens') or 0)
+        self.pack_sections = chunking_config.get('pack_sections', True)
+        self.max_pack_sections = int(chunking_config.get('max_pack_sections') or 8)
+        self.preprocess_concurrency = int(chunking_config.get('preprocess_concurrency') or 4)
+        # 请求中正文每行额外增加的tokens（如紧凑输出格式的 "行号| " 前缀），规划请求块时计入预算
+        self.line_prefix_tokens = 0
+
+    def count(self, text: str) -> int:
+        """计算文本token数"""
+        return count_tokens(text, self.model)
+
+    def content_tokens(self, text: str) -> int:
+        """计算正文放入请求后的token数（包含每行的前缀）"""
+        tokens = self.count(text)
+        if self.line_prefix_tokens and text:
+            tokens += self.line_prefix_tokens * (text.count("\n") + 1)
+        return tokens
+
+    def input_budget(self, prompt_overhead: int = 0) -> int:
+        """
+        计算单次请求正文可用的token数
+
+        Args:
+            prompt_overhead: 提示词模板（不含正文）的token数
+        """
+        budget = self.context_window - self.max_output_tokens - self.reserved_tokens - prompt_overhead
+        if self.max_chunk_tokens:
+            budget = min(budget, self.max_chunk_tokens)
+        if budget < MIN_INPUT_BUDGET:
+            logger.warning(
+                f"⚠️ 模型 {self.model} 的输入预算过小 ({budget} tokens)，"
+                f"请检查 context_window/max_tokens/reserved_tokens 配置"
+            )
+            budget = MIN_INPUT_BUDGET
+        return budget
+
+    def split_text(self, text: str, budget: int) -> List[str]:
+        """
+        将文本切分为不超过预算的片段，各片段按顺序拼接后与原文完全一致
+
+        依次在段落、句子边界切分，单个句子仍超出预算时按字符切分。
+        """
+        if self.content_tokens(text) <= budget:
+            return [text]
+
+        pieces: List[str] = []
+        for paragraph in self._split_keep(text, PARAGRAPH_PATTERN):
+            if self.content_tokens(paragraph) <= budget:
+                pieces.append(paragraph)
+                continue
+            for sentence in SENTENCE_PATTERN.split(paragraph):
+                if not sentence:
+                    continue
+                if self.content_tokens(sentence) <= budget:
+                    pieces.append(sentence)
+                else:
+                    pieces.extend(self._split_chars(sentence, budget))
+
+        chunks: List[str] = []
+        current, current_tokens = "", 0
+        for piece in pieces:
+            tokens = self.content_tokens(piece)
+            if current and current_tokens + tokens > budget:
+                chunks.append(current)
+                current, current_tokens = "", 0
+            current += piece
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def plan_sections(self, sections: List[Dict], budget: int) -> List[Dict]:
+        """
+        将章节规划为请求块
+
+        - 超出预算的章节切分为多个块，标题追加 (序号/总数)
+        - 未超出预算的相邻章节在预算内打包为一个块（最多 max_pack_sections 个），正文用 "=== [编号] 标题 ===" 分隔
+        - 每个块的 members 记录包含的章节在 sections 中的下标，打包块的 section_ids 记录对应的章节编号（S1、S2...）
+
+        Returns:
+            请求块列表，每个块包含 section_title / content / level / members
+        """
+        chunks: List[Dict] = []
+        pending: List[int] = []
+        pending_tokens = 0
+
+        def flush():
+            nonlocal pending, pending_tokens
+            if pending:
+                chunks.append(self._pack(sections, pending))
+            pending, pending_tokens = [], 0
+
+        for index, section in enumerate(sections):
+            content = section.get('content', '')
+            title = section.get('section_title', '未命名章节')
+            tokens = self.content_tokens(content)
+
+            if tokens > budget:
+                flush()
+                parts = self.split_text(content, budget)
+                for number, part in enumerate(parts, 1):
+                    chunks.append({
+                        'section_title': f"{title} ({number}/{len(parts)})",
+                        'content': part,
+                        'level': section.get('level', 1),
+                        'members': [index]
+                    })
+                continue
+
+            # 打包后每个章节多出一行分隔标题
+            packed_tokens = tokens + self.content_tokens(self._separator(f"S{len(pending) + 1}", title))
+            if not self.pack_sections or (pending and (
+                pending_tokens + packed_tokens > budget or len(pending) >= self.max_pack_sections
+            )):
+                flush()
+            pending.append(index)
+            pending_tokens += packed_tokens
+        flush()
+        return chunks
+
+    def _pack(self, sections: List[Dict], members: List[int]) -> Dict:
+        first = sections[members[0]]
+        if len(members) == 1:
+            return {
+                'section_title': first.get('section_title', '未命名章节'),
+                'content': first.get('content', ''),
+                'level': first.get('level', 1),
+                'members': list(members)
+            }
+        titles = [sections[index].get('section_title', '未命名章节') for index in members]
+        section_ids = [f"S{number}" for number in range(1, len(members) + 1)]
+        content = "\n\n".join(
+            self._separator(section_id, title) + sections[index].get('content', '')
+            for section_id, title, index in zip(section_ids, titles, members)
+        )
+        return {
+            'section_title': f"{titles[0]} 等 {len(members)} 个章节",
+            'content': content,
+            'level': first.get('level', 1),
+            'members': list(members),
+            'section_ids': section_ids
+        }
+
+    @staticmethod
+    def _separator(section_id: str, title: str) -> str:
+        return f"=== [{section_id}] {title} ===\n\n"
+
+    @staticmethod
+    def _split_keep(text: str, pattern) -> List[str]:
+        """按分隔符切分，分隔符保留在前一段末尾"""
+        parts = pattern.split(text)
+        return [
+            parts[i] + (parts[i + 1] if i + 1 < len(parts) else "")
+            for i in range(0, len(parts), 2)
+            if parts[i] or (i + 1 < len(parts) and parts[i + 1])
+        ]
+
+    def _split_chars(self, text: str, budget: int) -> List[str]:
+        """按字符切分超长句子，按token密度估算切分位置"""
+        pieces = []
+        while text:
+            tokens = self.content_tokens(text)
+            if tokens <= budget:
+                pieces.append(text)
+                break
+            size = max(1, int(len(text) * budget / tokens))
+            while size > 1 and self.content_tokens(text[:size]) > budget:
+                size = int(size * 0.9)
+            pieces.append(text[:size])
+            text = text[size:]
+        return pieces
@@ -0,0 +1,60 @@
+"""
+文本换行清理 - 本地合并被分页/页宽打断的段落，去除页码行
+"""
+import re
+
+
+PAGE_NUMBER_LINE = re.compile(
+    r'^\s*(?:第\s*\d+\s*页(?:\s*[/／,，]?\s*共\s*\d+\s*页)?|[-—–]?\s*\d{1,4}\s*[-—–]?|\d+\s*/\s*\d+|page\s+\d+(?:\s+of\s+\d+)?)\s*$',
+    re.IGNORECASE
+)
+LIST_ITEM_LINE = re.compile(r'^\s*(?:[-*+•·▪●○]\s+|\d+[.)、．]\s*|[（(]\d+[)）]|[a-zA-Z][.)]\s+|[一二三四五六七八九十]+[、.．])')
+# 以这些符号结尾的行是完整的句子或段落，不与下一行合并
+LINE_END_PUNCTUATION = ('。', '！', '？', '!', '?', '：', ':', '；', ';', '…', '”', '」', '』', '"')
+BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def normalize_text(text: str) -> str:
+    """
+    清理PDF等提取文本中多余的换行
+
+    - 去除单独成行的页码（如 "12"、"- 12 -"、"第 3 页 共 20 页"）
+    - 行尾不是句末标点、下一行不是空行/列表项时合并两行；中文直接拼接，英文单词之间补空格，行尾连字符断词还原
+    - 代码（缩进行）、表格行（含 | ）和列表项保持原样
+    - 连续多个空行压缩为一个
+    """
+    lines = [line.rstrip() for line in text.splitlines() if not PAGE_NUMBER_LINE.match(line)]
+    merged = []
+    for line in lines:
+        if merged and _should_join(merged[-1], line):
+            merged[-1] = _join(merged[-1], line.strip())
+        else:
+            merged.append(line)
+    return BLANK_LINES.sub("\n\n", "\n".join(merged)).strip()
+
+
+def _is_verbatim(line: str) -> bool:
+    """代码行和表格行保持原样"""
+    return line.startswith(("    ", "\t")) or "|" in line
+
+
+def _should_join(previous: str, line: str) -> bool:
+    if not previous.strip() or not line.strip():
+        return False
+    if _is_verbatim(previous) or _is_verbatim(line):
+        return False
+    if previous.endswith(LINE_END_PUNCTUATION):
+        return False
+    return not LIST_ITEM_LINE.match(line)
+
+
+def _join(previous: str, line: str) -> str:
+    last, first = previous[-1], line[0]
+    # 英文断词：行尾连字符 + 下一行小写开头
+    if last == '-' and len(previous) > 1 and previous[-2].isalpha() and first.islower():
+        return previous[:-1] + line
+    if last.isascii() and last.isalnum() and first.isascii() and first.isalnum():
+        return f"{previous} {line}"
+    if last in ',.' and first.isascii():
+        return f"{previous} {line}"
+    return previous + line
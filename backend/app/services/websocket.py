@@ -80,13 +80,23 @@ class ConnectionManager:
         }
         await self.broadcast_to_task(task_id, progress_data)
     
-    async def send_status(self, task_id: int, status: str):
-        """发送状态更新"""
+    async def send_issue(self, task_id: int, issue: dict):
+        """推送新检测到的问题（已保存到数据库）"""
+        issue_data = {
+            "type": "issue",
+            "timestamp": datetime.now().isoformat(),
+            "issue": issue
+        }
+        await self.broadcast_to_task(task_id, issue_data)
+    
+    async def send_status(self, task_id: int, status: str, **extra):
+        """发送状态更新，extra用于附加排队位置、预计等待时间等信息"""
         status_data = {
             "type": "status",
             "timestamp": datetime.now().isoformat(),
             "status": status
         }
+        status_data.update(extra)
         await self.broadcast_to_task(task_id, status_data)
 
 
@@ -28,6 +28,7 @@ class TaskView(BaseView):
         self.router.add_api_route("/{task_id}", self.get_task_detail, methods=["GET"], response_model=TaskDetail)
         self.router.add_api_route("/{task_id}", self.delete_task, methods=["DELETE"])
         self.router.add_api_route("/{task_id}/retry", self.retry_task, methods=["POST"])
+        self.router.add_api_route("/{task_id}/cancel", self.cancel_task, methods=["POST"])
         self.router.add_api_route("/{task_id}/report", self.download_report, methods=["GET"])
         print("🛠️  TaskView 路由已设置：")
         for route in self.router.routes:
@@ -39,12 +40,15 @@ class TaskView(BaseView):
         file: UploadFile = File(...),
         title: Optional[str] = Form(None),
         ai_model_index: Optional[int] = Form(None),
+        base_task_id: Optional[int] = Form(None),
         current_user: User = Depends(BaseView.get_current_user),
         db: Session = Depends(get_db)
     ) -> TaskResponse:
-        """创建任务"""
+        """创建任务（base_task_id 指定修订版文档的上一版本任务）"""
         service = TaskService(db)
-        return await service.create_task(file, title, ai_model_index, user_id=current_user.id)
+        return await service.create_task(
+            file, title, ai_model_index, user_id=current_user.id, base_task_id=base_task_id
+        )
     
     def get_tasks(
         self,
@@ -75,7 +79,7 @@ class TaskView(BaseView):
         
         return task_detail
     
-    def delete_task(
+    async def delete_task(
         self,
         task_id: int,
         current_user: User = Depends(BaseView.get_current_user),
@@ -94,16 +98,16 @@ class TaskView(BaseView):
         # 检查用户权限
         self.check_task_access_permission(current_user, task.user_id)
         
-        success = service.delete_task(task_id)
+        success = await service.delete_task(task_id)
         return {"success": success}
     
-    def retry_task(
+    async def cancel_task(
         self,
         task_id: int,
         current_user: User = Depends(BaseView.get_current_user),
         db: Session = Depends(get_db)
     ):
-        """重试任务"""
+        """取消排队中或处理中的任务"""
         from app.repositories.task import TaskRepository
         task_repo = TaskRepository(db)
         task = task_repo.get_by_id(task_id)
@@ -113,8 +117,27 @@ class TaskView(BaseView):
         # 检查用户权限
         self.check_task_access_permission(current_user, task.user_id)
         
-        # TODO: 实现任务重试逻辑
-        return {"message": "任务重试功能待实现"}
+        service = TaskService(db)
+        return await service.cancel_task(task_id)
+    
+    async def retry_task(
+        self,
+        task_id: int,
+        current_user: User = Depends(BaseView.get_current_user),
+        db: Session = Depends(get_db)
+    ):
+        """重试任务（从最后成功的检查点继续）"""
+        from app.repositories.task import TaskRepository
+        task_repo = TaskRepository(db)
+        task = task_repo.get_by_id(task_id)
+        if not task:
+            raise HTTPException(404, "任务不存在")
+        
+        # 检查用户权限
+        self.check_task_access_permission(current_user, task.user_id)
+        
+        service = TaskService(db)
+        return await service.retry_task(task_id)
     
     def download_report(
         self,
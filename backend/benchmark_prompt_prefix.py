@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+提示词前缀基准测试 - 比较旧提示词布局与固定前缀布局的首token延迟（TTFT）
+
+旧布局：系统提示词之后的用户消息依次为 章节标题 -> 格式说明 -> 章节内容，
+        不同章节的请求只共享系统提示词，格式说明位于章节标题之后，无法命中服务端前缀缓存。
+新布局：系统提示词 + 格式说明构成所有章节相同的前缀，用户消息只包含章节标题和内容。
+
+用法：
+    python benchmark_prompt_prefix.py 文档.md [--model-index 0] [--sections 20] [--rounds 2]
+    python benchmark_prompt_prefix.py 文档.md --dry-run    # 只统计共享前缀tokens，不调用模型
+
+对启用了前缀缓存的端点（如 vLLM --enable-prefix-caching）依次发出各章节的流式请求，
+每个请求只生成少量tokens，记录收到第一个内容片段的时间。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+# 确保配置文件路径正确
+script_dir = Path(__file__).parent
+os.chdir(script_dir)
+sys.path.insert(0, str(script_dir))
+
+from app.core.config import get_settings
+from app.services.issue_detector import DocumentIssues
+from app.services.model_registry import model_registry
+from app.services.prompt_loader import prompt_loader
+from app.services.rule_checker import RuleChecker
+from app.services.structure_extractor import LocalStructureExtractor
+from app.services.text_chunker import count_tokens
+
+
+# 前缀稳定化之前的用户提示词模板（格式说明位于章节标题之后）
+LEGACY_USER_TEMPLATE = """请分析以下文档章节的质量问题：
+
+章节标题：{section_title}
+
+{format_instructions}
+
+章节内容：
+{section_content}
+
+请仔细分析并输出发现的问题。如果没有发现问题，返回空的issues数组。
+"""
+# 每个请求生成的最大tokens（只需要首个内容片段）
+BENCHMARK_MAX_TOKENS = 16
+
+
+def load_sections(path: str, limit: int) -> List[Dict]:
+    """按Markdown标题切分文档，没有标题时按空行分段"""
+    text = Path(path).read_text(encoding='utf-8')
+    sections = LocalStructureExtractor({'enabled': True, 'file_types': ['md']}).extract(text, 'md')
+    if not sections:
+        sections = [
+            {'section_title': f"第{index + 1}段", 'content': block.strip()}
+            for index, block in enumerate(text.split("\n\n")) if block.strip()
+        ]
+    return [section for section in sections if len(section.get('content', '')) >= 20][:limit]
+
+
+def build_requests(sections: List[Dict]) -> Dict[str, List[Tuple[str, str]]]:
+    """按两种布局构建各章节的 (系统消息, 用户消息)"""
+    skip_note = RuleChecker(get_settings().rule_check_config).prompt_skip_note()
+    format_instructions = model_registry.get_format_instructions(DocumentIssues)
+    legacy_system = prompt_loader.get_system_prompt('document_detect_issues') + skip_note
+    stable_system = prompt_loader.get_system_prompt(
+        'document_detect_issues', format_instructions=format_instructions
+    ) + skip_note
+    return {
+        "旧布局": [
+            (legacy_system, LEGACY_USER_TEMPLATE.format(
+                section_title=section['section_title'],
+                format_instructions=format_instructions,
+                section_content=section['content']
+            ))
+            for section in sections
+        ],
+        "固定前缀": [
+            (stable_system, prompt_loader.get_user_prompt(
+                'document_detect_issues',
+                section_title=section['section_title'],
+                section_content=section['content']
+            ))
+            for section in sections
+        ]
+    }
+
+
+def shared_prefix_tokens(requests: List[Tuple[str, str]], model: str) -> int:
+    """所有请求共同前缀（系统消息 + 用户消息拼接后的最长公共前缀）的tokens数"""
+    texts = [system + "\n" + user for system, user in requests]
+    prefix = os.path.commonprefix(texts)
+    return count_tokens(prefix, model)
+
+
+async def measure_ttft(model, requests: List[Tuple[str, str]]) -> List[float]:
+    """依次发出流式请求，返回每个请求的首token延迟（秒）"""
+    latencies = []
+    for system, user in requests:
+        started = time.perf_counter()
+        async for chunk in model.astream([SystemMessage(content=system), HumanMessage(content=user)]):
+            if chunk.content:
+                latencies.append(time.perf_counter() - started)
+                break
+    return latencies
+
+
+def summarize(latencies: List[float]) -> str:
+    if not latencies:
+        return "无数据"
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (
+        f"中位数 {statistics.median(ordered) * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, "
+        f"平均 {statistics.mean(ordered) * 1000:.0f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="提示词前缀布局的首token延迟基准测试")
+    parser.add_argument("document", help="用于生成章节请求的文档（Markdown或纯文本）")
+    parser.add_argument("--model-index", type=int, default=None, help="ai_models 中的模型索引，默认使用 default_index")
+    parser.add_argument("--sections", type=int, default=20, help="参与测试的最大章节数")
+    parser.add_argument("--rounds", type=int, default=2, help="每种布局重复的轮数（第一轮预热缓存，之后各轮均计入）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计共享前缀tokens，不调用模型")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    index = settings.default_model_index if args.model_index is None else args.model_index
+    model_config = settings.ai_models[index]['config']
+    sections = load_sections(args.document, args.sections)
+    if not sections:
+        print("❌ 文档中没有可用的章节")
+        return
+
+    layouts = build_requests(sections)
+    print("=" * 60)
+    print(f"📊 提示词前缀基准测试: {len(sections)} 个章节, 模型 {model_config.get('model')}")
+    print("=" * 60)
+    for name, requests in layouts.items():
+        average = statistics.mean(count_tokens(system + user, model_config.get('model')) for system, user in requests)
+        shared = shared_prefix_tokens(requests, model_config.get('model'))
+        print(f"{name}: 共享前缀 {shared} tokens / 平均请求 {average:.0f} tokens ({shared / average:.0%})")
+    if args.dry_run:
+        return
+
+    model = model_registry.get_chat_model(model_config).bind(max_tokens=BENCHMARK_MAX_TOKENS)
+    results: Dict[str, List[float]] = {name: [] for name in layouts}
+    for round_index in range(max(1, args.rounds)):
+        # 两种布局交替执行，避免端点负载变化只影响其中一种
+        for name, requests in layouts.items():
+            latencies = await measure_ttft(model, requests)
+            # 第一轮的首个请求用于写入前缀缓存，不计入结果
+            results[name].extend(latencies[1:] if round_index == 0 else latencies)
+            print(f"  第 {round_index + 1} 轮 {name}: {summarize(latencies)}")
+
+    print("-" * 60)
+    for name, latencies in results.items():
+        print(f"⏱️ {name} TTFT: {summarize(latencies)}")
+    legacy, stable = results["旧布局"], results["固定前缀"]
+    if legacy and stable:
+        change = statistics.median(stable) / statistics.median(legacy) - 1
+        print(f"📉 固定前缀布局的 TTFT 中位数变化: {change:+.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,6 +11,13 @@ from pathlib import Path
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='AI文档测试系统后端服务')
+    parser.add_argument(
+        'command',
+        nargs='?',
+        choices=['serve', 'worker'],
+        default='serve',
+        help='运行命令：serve（启动API服务，默认）或 worker（启动任务工作进程）'
+    )
     parser.add_argument(
         '--mode', 
         choices=['test', 'production'], 
@@ -39,6 +46,11 @@ def main():
         action='store_true',
         help='启用自动重载'
     )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        help='工作进程数量（仅worker命令有效，默认读取task_processing.worker.processes）'
+    )
     
     args = parser.parse_args()
     
@@ -71,6 +83,10 @@ def main():
     for dir_path in dirs_to_create:
         Path(dir_path).mkdir(parents=True, exist_ok=True)
     
+    if args.command == 'worker':
+        run_worker(args, settings)
+        return
+    
     # 导入应用
     from app.main import app
     
@@ -100,5 +116,31 @@ def main():
         log_level="debug" if settings.server_config.get('debug') else "info"
     )
 
+def run_worker(args, settings):
+    """启动任务工作进程"""
+    from app.core.database import engine, Base, ensure_schema_columns
+    from app.services.task_worker import run_workers
+    import app.models  # noqa: F401 注册所有数据模型
+    
+    Base.metadata.create_all(bind=engine)
+    ensure_schema_columns()
+    
+    processes = args.processes or settings.task_worker_config.get('processes', 1)
+    
+    print("="*60)
+    print("👷 启动任务工作进程")
+    print("="*60)
+    print(f"📁 配置文件: {settings.config_file}")
+    print(f"📊 数据库: {settings.database_url}")
+    print(f"🔢 进程数: {processes}")
+    print(f"⚙️  每进程并发任务数: {settings.task_processing_config.get('max_concurrent_tasks', 3)}")
+    if settings.task_execution_mode != 'worker':
+        print("⚠️  当前 task_processing.execution_mode 不是 worker，API进程也会在本地执行任务")
+    print("="*60)
+    print("提示: 使用 Ctrl+C 停止工作进程")
+    print()
+    
+    run_workers(processes=processes, config_file=settings.config_file)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
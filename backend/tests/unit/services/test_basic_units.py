@@ -7,6 +7,8 @@ import json
 from unittest.mock import Mock, patch, AsyncMock
 from app.services.document_processor import DocumentProcessor
 from app.services.issue_detector import IssueDetector
+from app.services.model_registry import model_registry
+from app.services.llm_cache import llm_cache
 
 
 class TestBasicUnits:
@@ -28,6 +30,14 @@ class TestBasicUnits:
             }
         }
     
+    @pytest.fixture(autouse=True)
+    def clear_model_registry(self):
+        """清空共享模型客户端并关闭响应缓存，保证每个测试使用各自的Mock"""
+        model_registry.clear()
+        with patch.object(llm_cache, 'enabled', False):
+            yield
+        model_registry.clear()
+    
     @pytest.fixture
     def mock_db(self):
         """Mock数据库会话"""
@@ -42,8 +52,8 @@ class TestDocumentProcessorBasic(TestBasicUnits):
     
     def test_validate_sections_normal_case(self, mock_model_config, mock_db):
         """测试章节验证 - 正常情况"""
-        with patch('app.services.document_processor.ChatOpenAI'):
-            with patch('app.services.document_processor.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 processor = DocumentProcessor(mock_model_config['config'], mock_db)
                 
                 sections = [
@@ -67,8 +77,8 @@ class TestDocumentProcessorBasic(TestBasicUnits):
     
     def test_validate_sections_filter_invalid(self, mock_model_config, mock_db):
         """测试章节验证 - 过滤无效章节"""
-        with patch('app.services.document_processor.ChatOpenAI'):
-            with patch('app.services.document_processor.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 processor = DocumentProcessor(mock_model_config['config'], mock_db)
                 
                 sections = [
@@ -97,8 +107,8 @@ class TestDocumentProcessorBasic(TestBasicUnits):
     
     def test_document_processor_configuration(self, mock_model_config, mock_db):
         """测试DocumentProcessor配置"""
-        with patch('app.services.document_processor.ChatOpenAI'):
-            with patch('app.services.document_processor.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 processor = DocumentProcessor(mock_model_config['config'], mock_db)
                 
                 # 验证处理器正确初始化
@@ -112,8 +122,8 @@ class TestIssueDetectorBasic(TestBasicUnits):
     
     def test_filter_issues_by_confidence(self, mock_model_config, mock_db):
         """测试根据置信度过滤问题"""
-        with patch('app.services.issue_detector.ChatOpenAI'):
-            with patch('app.services.issue_detector.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 detector = IssueDetector(mock_model_config['config'], mock_db)
                 
                 issues = [
@@ -133,8 +143,8 @@ class TestIssueDetectorBasic(TestBasicUnits):
     
     def test_categorize_issues_by_severity(self, mock_model_config, mock_db):
         """测试按严重等级分类问题"""
-        with patch('app.services.issue_detector.ChatOpenAI'):
-            with patch('app.services.issue_detector.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 detector = IssueDetector(mock_model_config['config'], mock_db)
                 
                 issues = [
@@ -156,8 +166,8 @@ class TestIssueDetectorBasic(TestBasicUnits):
     
     def test_issue_detector_basic_functionality(self, mock_model_config, mock_db):
         """测试IssueDetector基本功能"""
-        with patch('app.services.issue_detector.ChatOpenAI'):
-            with patch('app.services.issue_detector.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 detector = IssueDetector(mock_model_config['config'], mock_db)
                 
                 # 验证问题检测器正确初始化
@@ -166,8 +176,8 @@ class TestIssueDetectorBasic(TestBasicUnits):
     
     def test_issue_detector_configuration_validation(self, mock_model_config, mock_db):
         """测试IssueDetector配置验证"""
-        with patch('app.services.issue_detector.ChatOpenAI'):
-            with patch('app.services.issue_detector.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 detector = IssueDetector(mock_model_config['config'], mock_db)
                 
                 # 测试基本配置有效性
@@ -176,10 +186,10 @@ class TestIssueDetectorBasic(TestBasicUnits):
     
     def test_component_initialization_validation(self, mock_model_config, mock_db):
         """测试组件初始化验证"""
-        with patch('app.services.document_processor.ChatOpenAI'):
-            with patch('app.services.document_processor.PydanticOutputParser'):
-                with patch('app.services.issue_detector.ChatOpenAI'):
-                    with patch('app.services.issue_detector.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
+                with patch('app.services.model_registry.ChatOpenAI'):
+                    with patch('app.services.model_registry.PydanticOutputParser'):
                         # 验证DocumentProcessor和IssueDetector都能正常初始化
                         processor = DocumentProcessor(mock_model_config['config'], mock_db)
                         detector = IssueDetector(mock_model_config['config'], mock_db)
@@ -193,20 +203,20 @@ class TestExceptionHandling(TestBasicUnits):
     
     def test_document_processor_init_failure(self, mock_model_config, mock_db):
         """测试DocumentProcessor初始化失败"""
-        with patch('app.services.document_processor.ChatOpenAI', side_effect=Exception("初始化失败")):
+        with patch('app.services.model_registry.ChatOpenAI', side_effect=Exception("初始化失败")):
             with pytest.raises(Exception, match="初始化失败"):
                 DocumentProcessor(mock_model_config['config'], mock_db)
     
     def test_issue_detector_init_failure(self, mock_model_config, mock_db):
         """测试IssueDetector初始化失败"""
-        with patch('app.services.issue_detector.ChatOpenAI', side_effect=Exception("初始化失败")):
+        with patch('app.services.model_registry.ChatOpenAI', side_effect=Exception("初始化失败")):
             with pytest.raises(Exception, match="初始化失败"):
                 IssueDetector(mock_model_config['config'], mock_db)
     
     def test_issue_filter_edge_cases(self, mock_model_config, mock_db):
         """测试问题过滤边界情况"""
-        with patch('app.services.issue_detector.ChatOpenAI'):
-            with patch('app.services.issue_detector.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 detector = IssueDetector(mock_model_config['config'], mock_db)
                 
                 edge_cases = [
@@ -222,8 +232,8 @@ class TestExceptionHandling(TestBasicUnits):
     
     def test_issue_categorize_edge_cases(self, mock_model_config, mock_db):
         """测试问题分类边界情况"""
-        with patch('app.services.issue_detector.ChatOpenAI'):
-            with patch('app.services.issue_detector.PydanticOutputParser'):
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 detector = IssueDetector(mock_model_config['config'], mock_db)
                 
                 edge_cases = [
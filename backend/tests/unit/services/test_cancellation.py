@@ -0,0 +1,45 @@
+"""
+取消令牌单元测试
+"""
+import asyncio
+import pytest
+
+from app.services.cancellation import CancellationToken, TaskCancelledError
+
+
+class TestCancellationToken:
+    """取消令牌与进行中调用竞争的单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_cancel_during_call_raises_task_cancelled(self):
+        """测试调用进行中请求取消时抛出 TaskCancelledError，进行中的调用被取消并等待结束"""
+        token = CancellationToken()
+        started = asyncio.Event()
+        finished = []
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                finished.append(True)
+
+        run = asyncio.ensure_future(token.run(call()))
+        await started.wait()
+        token.cancel("用户取消")
+
+        with pytest.raises(TaskCancelledError, match="用户取消"):
+            await asyncio.wait_for(run, 1)
+        assert finished == [True]
+
+    @pytest.mark.asyncio
+    async def test_completed_call_returns_result(self):
+        """测试未取消时返回调用结果，调用自身的异常原样抛出"""
+        token = CancellationToken()
+        assert await token.run(asyncio.sleep(0, result="ok")) == "ok"
+
+        async def fail():
+            raise ValueError("模型调用失败")
+
+        with pytest.raises(ValueError):
+            await token.run(fail())
@@ -0,0 +1,105 @@
+"""
+两级级联检测单元测试
+"""
+import pytest
+from unittest.mock import Mock, patch
+
+from app.services.issue_detector import section_key
+from app.services.processors.issue_detection_processor import IssueDetectionProcessor
+
+
+class FakeDetector:
+    """按章节标题返回预设问题的检测器"""
+
+    def __init__(self, model, results):
+        self.model_config = {'model': model, 'base_url': f'http://{model}'}
+        self.results = results
+        self.checked = []
+        self.failed_sections = []
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+        self.db = None
+
+    async def detect_issues(self, sections, task_id=None, progress_callback=None, completed_sections=None,
+                            on_section_complete=None, cancel_token=None, on_issue=None):
+        issues = []
+        for section in sections:
+            if section_key(section) in (completed_sections or {}):
+                continue
+            title = section['section_title']
+            self.checked.append(title)
+            self.usage['requests'] += 1
+            section_issues = [dict(issue) for issue in self.results.get(title, [])]
+            for issue in section_issues:
+                if on_issue:
+                    await on_issue(issue)
+            if on_section_complete:
+                await on_section_complete(section_key(section), section_issues)
+            issues.extend(section_issues)
+        return issues
+
+
+class TestCascadeDetection:
+    """初筛模型检测全部章节，只复核需要升级的章节"""
+
+    @pytest.mark.asyncio
+    async def test_only_low_confidence_or_severe_sections_escalated(self):
+        """测试干净章节和高置信度轻微问题采用初筛结果，低置信度/严重问题的章节由任务模型复核"""
+        sections = [
+            {"section_title": "安装", "content": "安装步骤"},
+            {"section_title": "配置", "content": "配置说明"},
+            {"section_title": "接口", "content": "接口说明"},
+            {"section_title": "附录", "content": "附录内容"}
+        ]
+        screener = FakeDetector("mini", {
+            "配置": [{"type": "错别字", "severity": "提示", "confidence": 0.95}],
+            "接口": [{"type": "参数错误", "severity": "严重", "confidence": 0.9}],
+            "附录": [{"type": "逻辑", "severity": "一般", "confidence": 0.5}]
+        })
+        strong = FakeDetector("strong", {
+            "接口": [{"type": "参数错误", "severity": "严重", "confidence": 0.95}]
+        })
+        provider = Mock()
+        provider.get_issue_detector.return_value = strong
+        processor = IssueDetectionProcessor(provider)
+        pushed = []
+
+        async def issue_callback(issue):
+            pushed.append(issue["type"])
+
+        settings = Mock(
+            task_processing_config={
+                "stream_issues": True,
+                "cascade": {"enabled": True, "screen_model_index": 0, "escalate_confidence": 0.7}
+            },
+            ai_models=[{"config": {"model": "mini", "base_url": "http://mini"}}]
+        )
+        with patch('app.services.processors.issue_detection_processor.get_settings', return_value=settings), \
+                patch('app.services.processors.issue_detection_processor.IssueDetector', return_value=screener):
+            result = await processor.process({
+                "task_id": 1,
+                "document_processing_result": sections,
+                "issue_callback": issue_callback
+            })
+
+        assert result.success
+        assert strong.checked == ["接口", "附录"]
+        assert [issue["type"] for issue in result.data] == ["错别字", "参数错误"]
+        assert result.data[1]["confidence"] == 0.95
+        assert pushed == ["错别字", "参数错误"]
+
+        screen_stats, escalate_stats = result.metadata["cascade"]
+        assert (screen_stats["model"], screen_stats["sections"], screen_stats["escalated_sections"]) == ("mini", 4, 2)
+        assert (escalate_stats["model"], escalate_stats["sections"], escalate_stats["requests"]) == ("strong", 2, 2)
+
+    @pytest.mark.asyncio
+    async def test_cascade_disabled_for_same_model(self):
+        """测试初筛模型与任务模型相同时按原流程检测"""
+        strong = FakeDetector("strong", {})
+        provider = Mock()
+        provider.get_issue_detector.return_value = strong
+        settings = Mock(
+            task_processing_config={"cascade": {"enabled": True, "screen_model_index": 0}},
+            ai_models=[{"config": dict(strong.model_config)}]
+        )
+        with patch('app.services.processors.issue_detection_processor.get_settings', return_value=settings):
+            assert IssueDetectionProcessor._create_screener(strong) is None
@@ -0,0 +1,151 @@
+"""
+处理链检查点单元测试
+"""
+import pytest
+from unittest.mock import Mock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models import Task
+from app.services.checkpoint_store import CheckpointStore
+from app.services.interfaces.task_processor import ITaskProcessor, TaskProcessingStep, ProcessingResult
+from app.services.processors.issue_detection_processor import IssueDetectionProcessor
+
+
+class CountingProcessor(ITaskProcessor):
+    """记录执行次数的测试处理器"""
+
+    def __init__(self, step_type: TaskProcessingStep, data, success: bool = True):
+        super().__init__(step_type)
+        self.data = data
+        self.success = success
+        self.calls = 0
+
+    async def can_handle(self, context):
+        return True
+
+    async def process(self, context, progress_callback=None):
+        self.calls += 1
+        if not self.success:
+            return ProcessingResult(success=False, error="处理失败")
+        return ProcessingResult(success=True, data=self.data, metadata={"step": self.step_type.value})
+
+
+class TestCheckpointStore:
+    """检查点恢复单元测试"""
+
+    @pytest.fixture
+    def db(self):
+        """内存数据库会话"""
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+    @pytest.fixture
+    def task_id(self, db):
+        task = Task(
+            title="测试任务", file_name="test.md", file_path="/tmp/test.md",
+            file_size=100, file_type="md", status='failed'
+        )
+        db.add(task)
+        db.commit()
+        return task.id
+
+    @pytest.mark.asyncio
+    async def test_retry_resumes_from_last_successful_step(self, db, task_id):
+        """测试重试时跳过已保存检查点的步骤"""
+        sections = [{"section_title": "第一章", "content": "内容"}]
+        parsing = CountingProcessor(TaskProcessingStep.FILE_PARSING, "原始文本")
+        processing = CountingProcessor(TaskProcessingStep.DOCUMENT_PROCESSING, sections)
+        detection = CountingProcessor(TaskProcessingStep.ISSUE_DETECTION, [], success=False)
+        parsing.set_next(processing).set_next(detection)
+
+        context = {"task_id": task_id, "checkpoint_store": CheckpointStore(db, task_id)}
+        result = await parsing.handle(context)
+        assert result.success is False
+
+        detection.success = True
+        context = {"task_id": task_id, "checkpoint_store": CheckpointStore(db, task_id)}
+        result = await parsing.handle(context)
+
+        assert result.success is True
+        assert (parsing.calls, processing.calls, detection.calls) == (1, 1, 2)
+        assert context["document_processing_result"] == sections
+        assert CheckpointStore(db, task_id).steps() == [
+            "file_parsing", "document_processing", "issue_detection"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_issue_detection_reuses_completed_sections(self, db, task_id):
+        """测试问题检测只重新检测失败的章节"""
+        store = CheckpointStore(db, task_id)
+        store.save_section_result("done-key", [{"type": "错别字"}])
+
+        detector = Mock()
+        detector.failed_sections = [{"section_title": "第二章", "section_index": 1}]
+
+        async def fake_detect(sections, task_id, progress_callback, completed_sections=None,
+                              on_section_complete=None, cancel_token=None, on_issue=None):
+            assert completed_sections == {"done-key": [{"type": "错别字"}]}
+            await on_section_complete("new-key", [{"type": "语法"}])
+            return [{"type": "错别字"}, {"type": "语法"}]
+
+        detector.detect_issues = fake_detect
+        provider = Mock()
+        provider.get_issue_detector.return_value = detector
+        processor = IssueDetectionProcessor(provider)
+
+        context = {
+            "task_id": task_id,
+            "document_processing_result": [{"section_title": "第一章", "content": "内容"}],
+            "checkpoint_store": store
+        }
+        settings = Mock(task_processing_config={"fail_on_section_error": True})
+        with patch('app.services.processors.issue_detection_processor.get_settings', return_value=settings):
+            result = await processor.process(context)
+
+        assert result.success is False
+        assert "1 个章节" in result.error
+        assert set(store.load_section_results()) == {"done-key", "new-key"}
+
+    @pytest.mark.asyncio
+    async def test_failed_sections_do_not_fail_task_by_default(self, db, task_id):
+        """测试未启用 fail_on_section_error 时，章节检测失败不影响任务完成"""
+        detector = Mock()
+        detector.failed_sections = [{"section_title": "第一章", "section_index": 0}]
+
+        async def fake_detect(sections, task_id, progress_callback, **kwargs):
+            return []
+
+        detector.detect_issues = fake_detect
+        provider = Mock()
+        provider.get_issue_detector.return_value = detector
+        context = {
+            "task_id": task_id,
+            "document_processing_result": [{"section_title": "第一章", "content": "内容"}],
+            "checkpoint_store": CheckpointStore(db, task_id)
+        }
+        settings = Mock(task_processing_config={})
+        with patch('app.services.processors.issue_detection_processor.get_settings', return_value=settings):
+            result = await IssueDetectionProcessor(provider).process(context)
+
+        assert result.success is True
+
+    def test_section_results_stored_one_row_per_section(self, db, task_id):
+        """测试章节结果每个章节单独一行，保存新章节不重写已保存的章节"""
+        store = CheckpointStore(db, task_id)
+        store.save_section_results({"a": [{"type": "错别字"}], "b": []})
+        store.save_section_result("c", [{"type": "语法"}])
+        store.save_section_result("a", [])
+        store.save("issue_detection", [])
+
+        assert store.load_section_results() == {"a": [], "b": [], "c": [{"type": "语法"}]}
+        assert store.steps() == ["issue_detection"]
+        assert len(store.repo.get_by_step_prefix(task_id, store.SECTION_RESULT_PREFIX)) == 3
@@ -0,0 +1,114 @@
+"""
+紧凑问题输出格式单元测试
+"""
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.core.config import get_settings
+from app.services.issue_detector import IssueDetector
+from app.services.llm_cache import llm_cache
+from app.services.model_registry import model_registry
+from app.services.prompt_loader import prompt_loader
+
+
+INSTALL = "下载安装包后双击运行。\n安装完成后重启电脑，然后登陆系统进行配置。"
+CONFIG = "打开配置文件修改端口号，保存后重新启动服务即可生效。"
+
+
+def create_detector():
+    model_registry.clear()
+    with patch('app.services.model_registry.ChatOpenAI'):
+        detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini'})
+    model_registry.clear()
+    return detector
+
+
+def compact_settings():
+    settings = get_settings()
+    task_config = {**settings.task_processing_config, 'compact_issues': True}
+    return patch.object(type(settings), 'task_processing_config', property(lambda self: task_config))
+
+
+class TestCompactIssues:
+    """紧凑输出格式的请求内容和本地还原单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_compact_issue_expanded_from_source_text(self):
+        """测试紧凑格式的问题按行号从原文还原原文片段、上下文、位置和严重等级"""
+        detector = create_detector()
+        detector.chunker.pack_sections = False
+        # 行号有偏差时在附近的行中按原文片段定位
+        response = Mock(content=json.dumps({"issues": [
+            {"t": "错别字", "d": "登陆应为登录", "s": 1, "c": 0.9, "l": 3, "q": "登陆系统", "r": "登录系统"}
+        ]}, ensure_ascii=False))
+        with compact_settings(), patch.object(llm_cache, 'enabled', False), \
+                patch.object(detector, '_call_ai_model', AsyncMock(return_value=response)) as mock_call:
+            issues = await detector.detect_issues([{"section_title": "安装", "content": INSTALL}])
+
+        system, user = [message.content for message in mock_call.await_args.args[0]]
+        assert '"q"' in system and '"original_text"' not in system
+        assert "2| 安装完成后重启电脑" in user
+
+        assert issues == [{
+            "type": "错别字",
+            "description": "登陆应为登录",
+            "location": "安装 - 第2行",
+            "severity": "严重",
+            "confidence": 0.9,
+            "suggestion": "登录系统",
+            "original_text": "登陆系统",
+            "user_impact": "",
+            "reasoning": "",
+            "context": "安装完成后重启电脑，然后登陆系统进行配置。"
+        }]
+
+    @pytest.mark.asyncio
+    async def test_packed_compact_issues_attributed_by_separator(self):
+        """测试打包请求中紧凑格式的问题按分隔行归属章节，行号换算为章节内行号，流式推送的是还原后的问题"""
+        detector = create_detector()
+        sections = [{"section_title": "安装", "content": INSTALL}, {"section_title": "配置", "content": CONFIG}]
+        # 请求块：1 分隔行 / 2 空行 / 3-4 安装正文 / 5 空行 / 6 分隔行 / 7 空行 / 8 配置正文
+        response = json.dumps({"issues": [
+            {"t": "表述", "d": "重新启动服务的表述冗余", "s": 3, "l": 8, "q": "重新启动服务", "r": "重启服务"}
+        ]}, ensure_ascii=False)
+
+        async def fake_astream(messages):
+            yield Mock(content=response)
+
+        detector.model = Mock()
+        detector.model.astream = fake_astream
+        pushed = []
+
+        async def on_issue(issue):
+            pushed.append(dict(issue))
+
+        with compact_settings(), patch.object(llm_cache, 'enabled', False):
+            issues = await detector.detect_issues(sections, on_issue=on_issue)
+
+        assert len(issues) == 1 and pushed == issues
+        assert issues[0]["location"] == "配置 - 第1行"
+        assert issues[0]["severity"] == "提示"
+        assert issues[0]["original_text"] == "重新启动服务"
+
+    @pytest.mark.asyncio
+    async def test_line_prefixes_counted_in_chunk_budget(self):
+        """测试紧凑格式规划请求块时计入行号前缀，加上前缀后的正文不超出预算"""
+        detector = create_detector()
+        content = "\n".join(f"第{number}步：检查配置项是否正确。" for number in range(1, 201))
+        response = Mock(content='{"issues": []}')
+        with compact_settings(), patch.object(llm_cache, 'enabled', False), \
+                patch.object(detector.chunker, 'input_budget', return_value=detector.chunker.count(content) + 50), \
+                patch.object(detector, '_call_ai_model', AsyncMock(return_value=response)) as mock_call:
+            await detector.detect_issues([{"section_title": "步骤", "content": content}])
+
+        # 不计前缀时正文恰好在预算内，计入前缀后需要切分
+        budget = detector.chunker.count(content) + 50
+        tail = prompt_loader.get_user_prompt(
+            'document_detect_issues', section_title="", section_content="\0"
+        ).split("\0")[1]
+        users = [call.args[0][1].content for call in mock_call.await_args_list]
+        assert len(users) > 1
+        for user in users:
+            body = user[user.index("1| "):len(user) - len(tail)]
+            assert detector.chunker.count(body) <= budget
@@ -0,0 +1,209 @@
+"""
+自适应并发限制单元测试
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.services.concurrency_limiter import AdaptiveConcurrencyLimiter, is_overload_error
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """AIMD 并发窗口单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_window_bounds_in_flight_requests(self):
+        """测试同时执行的请求数不超过并发窗口"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=2)
+        running, peak = 0, 0
+
+        async def call():
+            nonlocal running, peak
+            async with limiter.slot():
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[call() for _ in range(6)])
+        assert peak == 2
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_additive_increase_and_multiplicative_decrease(self):
+        """测试成功时加性增大窗口，过载时减半且同一批请求只减一次"""
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=4, max_limit=5, latency_tolerance=1000)
+        for _ in range(8):
+            async with limiter.slot():
+                pass
+        assert limiter.limit == 5
+
+        async def overloaded():
+            async with limiter.slot():
+                await asyncio.sleep(0.01)
+                raise RateLimitError()
+
+        results = await asyncio.gather(*[overloaded() for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(result, RateLimitError) for result in results)
+        assert limiter.limit == 2.5
+
+        # 非过载异常不调整窗口
+        with pytest.raises(ValueError):
+            async with limiter.slot():
+                raise ValueError("解析失败")
+        assert limiter.limit == 2.5
+
+    def test_overload_error_classification(self):
+        """测试 429/5xx/超时视为过载"""
+        assert is_overload_error(RateLimitError())
+        assert is_overload_error(asyncio.TimeoutError())
+        assert is_overload_error(Mock(spec=Exception, status_code=503))
+        assert not is_overload_error(ValueError("bad json"))
+
+
+class TestLongestFirstScheduling:
+    """请求按长度从长到短调度的单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_longest_chunk_requested_first(self):
+        """测试最长的请求块最先发出，结果仍按章节顺序返回"""
+        from app.services.concurrency_limiter import clear_concurrency_limiters
+        from app.services.issue_detector import IssueDetector
+        from app.services.llm_cache import llm_cache
+        from app.services.model_registry import model_registry
+
+        model_registry.clear()
+        clear_concurrency_limiters()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini', 'max_concurrency': 1})
+        model_registry.clear()
+        clear_concurrency_limiters()
+        detector.chunker.pack_sections = False
+
+        sections = [
+            {"section_title": "简介", "content": "简短的介绍内容，说明本文档的适用范围和读者。"},
+            {"section_title": "安装", "content": "安装步骤说明。" * 20},
+            {"section_title": "配置", "content": "配置说明。" * 8}
+        ]
+        requested = []
+
+        async def ainvoke(messages):
+            requested.append(next(s["section_title"] for s in sections if s["content"] in messages[1].content))
+            return Mock(content=json.dumps({"issues": [{"type": "错误", "location": "第一句"}]}))
+
+        detector.model = Mock()
+        detector.model.ainvoke = AsyncMock(side_effect=ainvoke)
+
+        with patch.object(llm_cache, 'enabled', False):
+            issues = await detector.detect_issues(sections)
+
+        assert requested == ["安装", "配置", "简介"]
+        assert [issue["location"] for issue in issues] == ["简介 - 第一句", "安装 - 第一句", "配置 - 第一句"]
+
+
+class TestFairRequestQueue:
+    """按用户和任务加权公平排队的单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_interactive_task_not_starved_by_bulk_task(self):
+        """测试大文档任务排满队列时，后到的其他用户小文档任务仍优先获得名额"""
+        from app.services.llm_scheduler import RequestFlow, current_flow
+
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_limit=1)
+        release = asyncio.Event()
+        order = []
+
+        async def call(flow, name):
+            current_flow.set(flow)
+            async with limiter.slot(cost=100):
+                order.append(name)
+                await release.wait()
+
+        bulk = RequestFlow(task_id=1, user_id=1)
+        small = RequestFlow(task_id=2, user_id=2, interactive=True)
+        calls = [asyncio.create_task(call(bulk, f"bulk-{index}")) for index in range(4)]
+        await asyncio.sleep(0)
+        calls += [asyncio.create_task(call(small, f"small-{index}")) for index in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*calls)
+
+        assert order[0] == "bulk-0"
+        assert order[1:3] == ["small-0", "small-1"]
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_tasks_of_same_user_share_in_turns(self):
+        """测试同一用户的两个任务轮流获得名额，取消的等待者不占用名额"""
+        from app.services.llm_scheduler import RequestFlow, current_flow
+
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_limit=1)
+        release = asyncio.Event()
+        order = []
+
+        async def call(flow, name):
+            current_flow.set(flow)
+            async with limiter.slot(cost=10):
+                order.append(name)
+                await release.wait()
+
+        first, second = RequestFlow(task_id=1, user_id=1), RequestFlow(task_id=2, user_id=1)
+        calls = [asyncio.create_task(call(first, f"a{index}")) for index in range(3)]
+        await asyncio.sleep(0)
+        calls += [asyncio.create_task(call(second, f"b{index}")) for index in range(2)]
+        await asyncio.sleep(0)
+        calls[1].cancel()
+        release.set()
+        await asyncio.gather(*calls, return_exceptions=True)
+
+        assert order == ["a0", "b0", "a2", "b1"]
+        assert limiter.in_flight == 0
+
+
+class TestRateLimiter:
+    """RPM/TPM 令牌桶单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_requests_wait_for_quota_refill(self):
+        """测试请求配额用完后等待补充"""
+        from app.services.rate_limiter import RateLimiter
+
+        limiter = RateLimiter("test", rpm=2)
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+            limiter._requests += seconds * limiter.rpm / 60
+
+        with patch('app.services.rate_limiter.asyncio.sleep', fake_sleep):
+            for _ in range(3):
+                await limiter.acquire(0)
+
+        assert len(sleeps) == 1
+        assert sleeps[0] == pytest.approx(30, rel=0.01)
+
+    def test_settle_debits_actual_usage(self):
+        """测试按实际用量修正预扣的tokens，并更新输出tokens估算值"""
+        from app.services.rate_limiter import RateLimiter, RequestUsage
+
+        limiter = RateLimiter("test", tpm=10000, max_tokens=4000)
+        reserved = limiter.estimate(1000)
+        assert reserved == 2000
+        limiter._tokens -= reserved
+
+        usage = RequestUsage(1000)
+        usage.record(Mock(content="", response_metadata={"token_usage": {"prompt_tokens": 1200, "completion_tokens": 300}}))
+        limiter.settle(reserved, usage)
+
+        assert usage.total_tokens == 1500
+        assert limiter._tokens == pytest.approx(8500, abs=1)
+        assert limiter.completion_estimate == pytest.approx(1000 + 0.2 * (300 - 1000))
+
+        failed = RequestUsage(1000)
+        limiter.settle(reserved, failed)
+        assert limiter._tokens == pytest.approx(8500, abs=1)
@@ -7,6 +7,8 @@ import json
 from unittest.mock import Mock, patch
 
 from app.services.document_processor import DocumentProcessor
+from app.services.model_registry import model_registry
+from app.services.llm_cache import llm_cache
 
 
 class TestDocumentProcessorClean:
@@ -33,14 +35,20 @@ class TestDocumentProcessorClean:
         """Mock数据库会话"""
         return Mock()
     
+    @pytest.fixture(autouse=True)
+    def disable_llm_cache(self):
+        """关闭响应缓存，保证每个测试都调用（Mock的）模型"""
+        with patch.object(llm_cache, 'enabled', False):
+            yield
+    
     @pytest.fixture
     def document_processor(self, mock_model_config, mock_db):
         """创建DocumentProcessor实例"""
-        with patch('app.services.document_processor.ChatOpenAI'):
-            with patch('app.services.document_processor.PydanticOutputParser'):
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 # DocumentProcessor现在期望直接接收config部分
-                processor = DocumentProcessor(mock_model_config['config'], mock_db)
-                return processor
+                return DocumentProcessor(mock_model_config['config'], mock_db)
     
     @pytest.mark.asyncio
     async def test_preprocess_document_normal_flow(self, document_processor, mock_db):
@@ -185,6 +193,79 @@ class TestDocumentProcessorClean:
         if len(result) > 0:
             assert result[0]['section_title'] == '有效章节'
 
+    
+    @pytest.mark.asyncio
+    async def test_preprocess_large_document_map_reduce(self, document_processor):
+        """测试长文档按窗口并发分析，跨窗口边界的章节被拼接"""
+        import asyncio
+        windows = [
+            "# 安装\n\n第一步下载安装包。",
+            "第二步双击运行安装程序。\n\n# 配置\n\n修改端口号。",
+            "# 使用\n\n启动服务后访问首页。"
+        ]
+        responses = {
+            windows[0]: [{"section_title": "安装", "content": "第一步下载安装包。", "level": 1}],
+            windows[1]: [
+                {"section_title": "安装步骤（续）", "content": "第二步双击运行安装程序。", "level": 1},
+                {"section_title": "配置", "content": "修改端口号。", "level": 1}
+            ],
+            windows[2]: [{"section_title": "使用", "content": "启动服务后访问首页。", "level": 1}]
+        }
+        in_flight = 0
+        max_in_flight = 0
+        
+        async def fake_window(window, *args, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return responses[window]
+        
+        with patch.object(document_processor, '_split_windows', return_value=windows), \
+                patch.object(document_processor, '_preprocess_window', side_effect=fake_window):
+            result = await document_processor.preprocess_document("".join(windows), 1, file_type="pdf")
+        
+        assert max_in_flight == 3
+        assert [section['section_title'] for section in result] == ["安装", "配置", "使用"]
+        assert result[0]['content'] == "第一步下载安装包。\n第二步双击运行安装程序。"
+
+    
+    @pytest.mark.asyncio
+    async def test_preprocess_markdown_skips_model(self, document_processor):
+        """测试Markdown文档按标题本地切分，不调用模型"""
+        text = "# 安装\n\n下载安装包后运行。\n\n## 配置\n\n修改端口号。"
+        with patch.object(document_processor, '_call_ai_model') as mock_call:
+            result = await document_processor.preprocess_document(text, 1, file_type="md")
+        
+        mock_call.assert_not_called()
+        assert [(section['section_title'], section['level']) for section in result] == [("安装", 1), ("配置", 2)]
+
+    
+    @pytest.mark.asyncio
+    async def test_preprocess_outline_rebuilds_sections_locally(self, document_processor):
+        """测试outline协议：模型只返回标题行号，正文按行号从原文切分并清理换行"""
+        document_processor.preprocess_mode = "outline"
+        text = "产品说明书\n1 概述\n本产品用于检测文档\n中的质量问题。\n12\n2 安装\n下载安装包后运行。"
+        response = {"headings": [
+            {"line": 2, "title": "1 概述", "level": 1},
+            # 行号偏差1行时按标题文本重新定位
+            {"line": 5, "title": "2 安装", "level": 1},
+            {"line": 3, "title": "不存在的标题", "level": 2}
+        ]}
+        
+        with patch.object(document_processor, '_call_ai_model') as mock_call:
+            mock_call.return_value = Mock(content=json.dumps(response, ensure_ascii=False))
+            result = await document_processor.preprocess_document(text, 1, file_type="pdf")
+        
+        prompt = mock_call.call_args[0][0][1].content
+        assert "3| 本产品用于检测文档" in prompt
+        assert result == [
+            {"section_title": "文档内容", "content": "产品说明书", "level": 1},
+            {"section_title": "1 概述", "content": "本产品用于检测文档中的质量问题。", "level": 1},
+            {"section_title": "2 安装", "content": "下载安装包后运行。", "level": 1}
+        ]
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
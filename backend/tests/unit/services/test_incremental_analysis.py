@@ -0,0 +1,100 @@
+"""
+修订版文档增量分析单元测试
+"""
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models import Task
+from app.repositories.task import TaskRepository
+from app.services.checkpoint_store import CheckpointStore
+from app.services.issue_detector import section_key
+from app.services.processors.issue_detection_processor import IssueDetectionProcessor
+
+
+class TestIncrementalAnalysis:
+    """增量分析单元测试"""
+
+    @pytest.fixture
+    def db(self):
+        """内存数据库会话"""
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def add_task(self, db, title="用户手册", status='completed', completed_at=None, user_id=1):
+        task = Task(
+            title=title, file_name="manual.md", file_path="/tmp/manual.md",
+            file_size=100, file_type="md", status=status, completed_at=completed_at, user_id=user_id
+        )
+        db.add(task)
+        db.commit()
+        return task.id
+
+    def test_find_base_task_uses_latest_completed_version(self, db):
+        """测试匹配同一用户同名文档最近完成的任务，不匹配其他用户的任务"""
+        now = datetime.utcnow()
+        self.add_task(db, completed_at=now - timedelta(days=2))
+        latest = self.add_task(db, completed_at=now - timedelta(days=1))
+        self.add_task(db, status='failed')
+        self.add_task(db, title="其他文档", completed_at=now)
+        other_user = self.add_task(db, completed_at=now, user_id=2)
+
+        repo = TaskRepository(db)
+        assert repo.find_base_task("用户手册", user_id=1).id == latest
+        assert repo.find_base_task("用户手册", user_id=1, exclude_id=latest).id != latest
+        assert repo.find_base_task("用户手册", user_id=2).id == other_user
+        assert repo.find_base_task("用户手册", user_id=3) is None
+        assert repo.find_base_task("不存在的文档", user_id=1) is None
+
+    @pytest.mark.asyncio
+    async def test_unchanged_sections_carry_forward(self, db):
+        """测试未改动章节沿用上一版本结果，只检测改动的章节"""
+        base_id = self.add_task(db)
+        task_id = self.add_task(db, status='processing')
+
+        unchanged = {"section_title": "安装", "content": "安装步骤内容，与上一版本完全相同。"}
+        changed = {"section_title": "配置", "content": "配置说明内容，本版本有修改。"}
+        CheckpointStore(db, base_id).save_section_results({
+            section_key(unchanged): [{"issue_type": "错别字", "location": "安装 - 第一段"}],
+            section_key({"section_title": "配置", "content": "旧的配置说明"}): [{"issue_type": "语法"}]
+        })
+
+        received = {}
+
+        async def fake_detect(sections, task_id, progress_callback, completed_sections=None,
+                              on_section_complete=None, cancel_token=None, on_issue=None):
+            received.update(completed_sections)
+            return [issue for key in completed_sections for issue in completed_sections[key]]
+
+        detector = Mock(failed_sections=[])
+        detector.detect_issues = fake_detect
+        provider = Mock()
+        provider.get_issue_detector.return_value = detector
+
+        store = CheckpointStore(db, task_id)
+        context = {
+            "task_id": task_id,
+            "section_merge_result": [unchanged, changed],
+            "checkpoint_store": store,
+            "base_task_id": base_id,
+            "base_section_results": CheckpointStore(db, base_id).load_section_results()
+        }
+        settings = Mock(task_processing_config={})
+        with patch('app.services.processors.issue_detection_processor.get_settings', return_value=settings):
+            result = await IssueDetectionProcessor(provider).process(context)
+
+        assert result.success is True
+        assert result.metadata["carried_forward_sections"] == 1
+        assert list(received) == [section_key(unchanged)]
+        # 沿用的结果也保存到本任务，下一个版本可以继续沿用
+        assert section_key(unchanged) in store.load_section_results()
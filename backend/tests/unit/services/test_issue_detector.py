@@ -6,6 +6,8 @@ import asyncio
 import json
 from unittest.mock import Mock, patch, AsyncMock
 from app.services.issue_detector import IssueDetector
+from app.services.model_registry import model_registry
+from app.services.llm_cache import llm_cache
 from tests.fixtures.mock_helpers import create_mock_dependencies
 
 
@@ -36,12 +38,21 @@ class TestIssueDetector:
             }
         }
     
+    @pytest.fixture(autouse=True)
+    def disable_llm_cache(self):
+        """关闭响应缓存，保证每个测试都调用（Mock的）模型"""
+        with patch.object(llm_cache, 'enabled', False):
+            yield
+    
     @pytest.fixture
     def issue_detector(self, mock_model_config, mock_db):
         """创建IssueDetector实例"""
-        with patch('app.services.issue_detector.ChatOpenAI'):
-            with patch('app.services.issue_detector.PydanticOutputParser'):
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            with patch('app.services.model_registry.PydanticOutputParser'):
                 detector = IssueDetector(mock_model_config['config'], mock_db)
+                # 逐章节请求，便于按章节断言模型调用次数
+                detector.chunker.pack_sections = False
                 return detector
     
     @pytest.fixture
@@ -299,17 +310,16 @@ class TestIssueDetector:
             mock_settings_instance.is_service_mocked.return_value = False
             mock_settings.return_value = mock_settings_instance
             
-            # Mock asyncio.to_thread来模拟AI调用
+            # Mock 模型的原生异步调用
             mock_response = Mock(content='{"issues": [{"type": "测试问题", "description": "这是一个测试问题"}]}')
-            with patch('asyncio.to_thread') as mock_to_thread:
-                mock_to_thread.return_value = mock_response
-                
-                # 执行测试
-                result = await issue_detector._call_ai_model(messages)
-                
-                # 验证返回响应
-                assert result == mock_response
-                mock_to_thread.assert_called_once()
+            issue_detector.model.ainvoke = AsyncMock(return_value=mock_response)
+            
+            # 执行测试
+            result = await issue_detector._call_ai_model(messages)
+            
+            # 验证返回响应
+            assert result == mock_response
+            issue_detector.model.ainvoke.assert_awaited_once_with(messages)
     
     @pytest.mark.asyncio
     async def test_call_ai_model_production_mode(self, issue_detector):
@@ -322,17 +332,16 @@ class TestIssueDetector:
             mock_settings_instance.is_service_mocked.return_value = False
             mock_settings.return_value = mock_settings_instance
             
-            # Mock asyncio.to_thread
+            # Mock 模型的原生异步调用
             mock_response = Mock(content='{"issues": []}')
-            with patch('asyncio.to_thread') as mock_to_thread:
-                mock_to_thread.return_value = mock_response
-                
-                # 执行测试
-                result = await issue_detector._call_ai_model(messages)
-                
-                # 验证调用真实AI模型
-                assert result == mock_response
-                mock_to_thread.assert_called_once()
+            issue_detector.model.ainvoke = AsyncMock(return_value=mock_response)
+            
+            # 执行测试
+            result = await issue_detector._call_ai_model(messages)
+            
+            # 验证调用真实AI模型
+            assert result == mock_response
+            issue_detector.model.ainvoke.assert_awaited_once()
     
     def test_mock_service_functionality(self, issue_detector):
         """测试Mock服务功能"""
@@ -0,0 +1,76 @@
+"""
+流式问题解析单元测试
+"""
+import json
+import pytest
+from unittest.mock import Mock, patch
+
+from app.services.issue_stream_parser import IncrementalIssueParser
+from app.services.issue_detector import IssueDetector
+from app.services.llm_cache import llm_cache
+from app.services.model_registry import model_registry
+
+
+RESPONSE = json.dumps({
+    "issues": [
+        {"issue_type": "错别字", "description": "含有{花括号}和\"引号\"的描述", "location": "第一段"},
+        {"issue_type": "语法", "description": "嵌套 [数组] 内容", "location": "第二段", "tags": [{"a": 1}]}
+    ]
+}, ensure_ascii=False)
+
+
+class TestIncrementalIssueParser:
+    """增量问题解析器单元测试"""
+
+    def test_issues_emitted_as_soon_as_closed(self):
+        """测试逐字符输入时每个问题对象闭合后立即返回"""
+        parser = IncrementalIssueParser()
+        emitted = []
+        first_issue_at = None
+        for index, char in enumerate("```json\n" + RESPONSE + "\n```"):
+            issues = parser.feed(char)
+            if issues and first_issue_at is None:
+                first_issue_at = index
+            emitted.extend(issues)
+
+        assert [issue["issue_type"] for issue in emitted] == ["错别字", "语法"]
+        assert emitted[0]["description"] == "含有{花括号}和\"引号\"的描述"
+        assert first_issue_at < len(RESPONSE) // 2 + 10
+
+    def test_truncated_stream_keeps_complete_issues(self):
+        """测试流被截断时已完整的问题仍可返回"""
+        parser = IncrementalIssueParser()
+        truncated = RESPONSE[:RESPONSE.index('"语法"')]
+        assert [issue["issue_type"] for issue in parser.feed(truncated)] == ["错别字"]
+        assert parser.feed("") == []
+
+
+class TestStreamingDetection:
+    """流式问题检测单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_on_issue_called_per_issue_and_results_consistent(self):
+        """测试流式检测逐个回调问题，返回结果与回调对象一致"""
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini'})
+        model_registry.clear()
+
+        async def fake_astream(messages):
+            for start in range(0, len(RESPONSE), 7):
+                yield Mock(content=RESPONSE[start:start + 7])
+
+        detector.model = Mock()
+        detector.model.astream = fake_astream
+        received = []
+
+        async def on_issue(issue):
+            received.append(issue)
+
+        sections = [{"section_title": "安装", "content": "这是一个足够长的章节内容，用于测试流式问题检测。"}]
+        with patch.object(llm_cache, 'enabled', False):
+            issues = await detector.detect_issues(sections, on_issue=on_issue)
+
+        assert len(received) == 2
+        assert all(a is b for a, b in zip(issues, received))
+        assert received[0]["location"] == "安装 - 第一段"
@@ -0,0 +1,72 @@
+"""
+容错JSON解析单元测试
+"""
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.services.json_repair import repair_json, structured_output_kwargs
+from app.services.issue_detector import DocumentIssues, IssueDetector
+from app.services.llm_cache import llm_cache
+from app.services.model_registry import model_registry
+
+
+class TestRepairJson:
+    """容错JSON解析单元测试"""
+
+    def test_surrounding_text_and_format_errors(self):
+        """测试忽略JSON前后的文字，修复字符串内换行和多余的逗号"""
+        text = '结果如下：\n```json\n{"issues": [{"type": "错别字", "description": "第一行\n第二行",},],}\n```\n以上。{"x": 1}'
+        value, truncated = repair_json(text)
+        assert value == {"issues": [{"type": "错别字", "description": "第一行\n第二行"}]}
+        assert not truncated
+
+    def test_truncated_output_keeps_complete_elements(self):
+        """测试输出被截断时只保留数组中完整的元素"""
+        text = '{"issues": [{"type": "错别字", "tags": ["a", "b"]}, {"type": "语法", "descri'
+        value, truncated = repair_json(text)
+        assert value == {"issues": [{"type": "错别字", "tags": ["a", "b"]}]}
+        assert truncated
+        assert repair_json('{"issues": [{"type": "错') == ({"issues": []}, True)
+
+    def test_unrepairable_output(self):
+        """测试无法修复的输出返回None"""
+        assert repair_json("没有JSON") == (None, False)
+        assert repair_json('{"description": "把"登陆"写成了登录"}')[0] is None
+
+    def test_structured_output_kwargs(self):
+        """测试按模型配置生成约束解码参数"""
+        assert structured_output_kwargs({}, DocumentIssues) == {}
+        assert structured_output_kwargs({'structured_output': 'json_object'}, DocumentIssues) == {
+            'response_format': {'type': 'json_object'}
+        }
+        schema = DocumentIssues.model_json_schema()
+        assert structured_output_kwargs({'structured_output': 'guided_json'}, DocumentIssues) == {
+            'extra_body': {'guided_json': schema}
+        }
+        response_format = structured_output_kwargs({'structured_output': 'json_schema'}, DocumentIssues)['response_format']
+        assert response_format['json_schema'] == {'name': 'DocumentIssues', 'schema': schema}
+
+
+class TestRepairReask:
+    """只修复格式的重新请求单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_unparseable_output_repaired_without_redetecting_section(self):
+        """测试本地无法修复的输出只把原输出发回模型修复，章节不记为失败"""
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini'})
+        model_registry.clear()
+
+        content = "这是一个足够长的章节内容，用于测试JSON格式修复。"
+        broken = Mock(content='{"issues": [{"type": "错别字", "description": "把"登陆"写成了登录"}]}')
+        fixed = Mock(content='{"issues": [{"type": "错别字", "description": "把\\"登陆\\"写成了登录"}]}')
+        sections = [{"section_title": "安装", "content": content}]
+        with patch.object(llm_cache, 'enabled', False), \
+                patch.object(detector, '_call_ai_model', AsyncMock(side_effect=[broken, fixed])) as mock_call:
+            issues = await detector.detect_issues(sections)
+
+        assert [issue["description"] for issue in issues] == ['把"登陆"写成了登录']
+        assert detector.failed_sections == []
+        repair_prompt = mock_call.await_args_list[1].args[0][-1].content
+        assert "写成了登录" in repair_prompt and content not in repair_prompt
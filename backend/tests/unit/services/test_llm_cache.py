@@ -0,0 +1,102 @@
+"""
+模型响应缓存单元测试
+"""
+import threading
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.services.llm_cache import LLMResponseCache
+from app.services.issue_detector import IssueDetector
+from app.services.model_registry import model_registry
+
+
+class TestLLMResponseCache:
+    """两级响应缓存单元测试"""
+
+    @pytest.fixture
+    def cache_path(self, tmp_path):
+        return str(tmp_path / "llm_cache.db")
+
+    def create_cache(self, path, **kwargs):
+        options = {'max_memory_entries': 2, 'max_disk_entries': 100, 'ttl': 0, 'enabled': True}
+        options.update(kwargs)
+        return LLMResponseCache(path=path, **options)
+
+    def test_key_depends_on_model_template_and_content(self):
+        """测试缓存键随模型、模板版本和内容变化"""
+        key = LLMResponseCache.make_key("gpt-4o-mini", "detect_issues", "v1", "内容")
+        assert key == LLMResponseCache.make_key("gpt-4o-mini", "detect_issues", "v1", "内容")
+        assert key != LLMResponseCache.make_key("gpt-4o", "detect_issues", "v1", "内容")
+        assert key != LLMResponseCache.make_key("gpt-4o-mini", "detect_issues", "v2", "内容")
+        assert key != LLMResponseCache.make_key("gpt-4o-mini", "detect_issues", "v1", "内容2")
+
+    def test_memory_lru_falls_back_to_disk(self, cache_path):
+        """测试内存层按LRU淘汰，淘汰后从持久层命中"""
+        cache = self.create_cache(cache_path)
+        for key in ("a", "b", "c"):
+            cache.set(key, f"value-{key}")
+
+        assert list(cache._memory) == ["b", "c"]
+        assert cache.get("a") == "value-a"
+        assert cache.get("missing") is None
+
+        stats = cache.stats()
+        assert stats["memory_hits"] == 0
+        assert stats["disk_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_disk_tier_survives_restart(self, cache_path):
+        """测试持久层在新实例（进程重启）中仍可命中"""
+        self.create_cache(cache_path).set("key", "响应")
+        assert self.create_cache(cache_path).get("key") == "响应"
+
+    def test_ttl_and_size_eviction(self, cache_path):
+        """测试过期淘汰和持久层容量淘汰"""
+        cache = self.create_cache(cache_path, ttl=60, max_disk_entries=2)
+        with patch('app.services.llm_cache.time.time', return_value=1000.0):
+            cache.set("old", "1")
+        with patch('app.services.llm_cache.time.time', return_value=1100.0):
+            assert cache.get("old") is None
+            cache.set("a", "2")
+            cache.set("b", "3")
+            cache.set("c", "4")
+            cache._memory.clear()
+            assert cache.get("a") is None
+            assert cache.get("c") == "4"
+        assert cache.stats()["disk_entries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_async_access_keeps_disk_tier_off_event_loop(self, cache_path):
+        """测试异步读写在缓存专用线程中访问持久层，命中时不逐条更新访问时间，写入时不统计条目数"""
+        cache = self.create_cache(cache_path, max_memory_entries=1)
+        statements = []
+        cache._connection().set_trace_callback(lambda sql: statements.append((threading.get_ident(), sql)))
+
+        await cache.aset("a", "1")
+        await cache.aset("b", "2")
+        assert await cache.aget("a") == "1"
+
+        assert statements and all(thread != threading.get_ident() for thread, _ in statements)
+        assert not any("COUNT" in sql or "SET accessed_at" in sql for _, sql in statements)
+        assert cache.stats()["disk_entries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_detector_skips_model_on_cache_hit(self, cache_path):
+        """测试相同章节第二次检测直接使用缓存响应"""
+        cache = self.create_cache(cache_path)
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini'})
+        model_registry.clear()
+
+        sections = [{"section_title": "安装", "content": "这是一个足够长的章节内容，用于测试响应缓存命中。"}]
+        response = Mock(content='{"issues": [{"issue_type": "错别字", "location": "第一段"}]}')
+        with patch('app.services.issue_detector.llm_cache', cache), \
+                patch.object(detector, '_call_ai_model', AsyncMock(return_value=response)) as mock_call:
+            first = await detector.detect_issues(sections)
+            second = await detector.detect_issues(sections)
+
+        assert mock_call.await_count == 1
+        assert first == second
+        assert cache.stats()["hits"] == 1
@@ -0,0 +1,34 @@
+"""
+模型HTTP客户端单元测试
+"""
+import pytest
+
+from app.services import llm_client
+
+
+class TestLLMClient:
+    """按端点共享连接池单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_http_client_shared_per_endpoint(self):
+        """测试同一API地址复用同一个连接池，关闭后重新创建"""
+        first = llm_client.get_async_http_client("https://api.example.com/v1")
+        second = llm_client.get_async_http_client("https://api.example.com/v1")
+        other = llm_client.get_async_http_client("https://other.example.com/v1")
+
+        assert first is second
+        assert first is not other
+
+        await llm_client.close_async_http_clients()
+        assert first.is_closed
+        assert llm_client.get_async_http_client("https://api.example.com/v1") is not first
+        await llm_client.close_async_http_clients()
+
+    @pytest.mark.asyncio
+    async def test_async_completions_use_shared_pool(self):
+        """测试异步completions客户端使用共享连接池"""
+        config = {'api_key': 'test-key', 'base_url': 'https://api.example.com/v1', 'timeout': 30}
+        completions = llm_client.create_async_completions(config)
+
+        assert completions._client._client is llm_client.get_async_http_client(config['base_url'])
+        await llm_client.close_async_http_clients()
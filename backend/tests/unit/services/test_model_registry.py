@@ -0,0 +1,85 @@
+"""
+模型客户端注册表单元测试
+"""
+import pytest
+from unittest.mock import patch
+
+from app.services.issue_detector import IssueDetector, DocumentIssues
+from app.services.llm_client import close_async_http_clients, get_async_http_client
+from app.services.model_registry import ModelClientRegistry, model_registry
+
+
+class TestModelClientRegistry:
+    """模型客户端注册表单元测试"""
+
+    @pytest.fixture
+    def model_config(self):
+        return {
+            'api_key': 'test-api-key',
+            'base_url': 'https://api.example.com/v1',
+            'model': 'gpt-4o-mini',
+            'temperature': 0.3,
+            'max_tokens': 4000,
+            'timeout': 60,
+            'max_retries': 3
+        }
+
+    @pytest.fixture(autouse=True)
+    def clear_model_registry(self):
+        model_registry.clear()
+        yield
+        model_registry.clear()
+
+    def test_clients_shared_by_config(self, model_config):
+        """测试相同配置复用客户端，不同配置创建新客户端"""
+        registry = ModelClientRegistry()
+        with patch('app.services.model_registry.ChatOpenAI') as mock_chat:
+            mock_chat.side_effect = lambda **kwargs: object()
+            first = registry.get_chat_model(model_config)
+            second = registry.get_chat_model(dict(model_config))
+            other = registry.get_chat_model({**model_config, 'temperature': 0.7})
+
+        assert first is second
+        assert first is not other
+        assert mock_chat.call_count == 2
+
+    def test_detectors_share_client_parser_and_logger(self, model_config):
+        """测试多个任务的检测器共享客户端、解析器和日志器"""
+        with patch('app.services.model_registry.ChatOpenAI'):
+            first = IssueDetector(model_config)
+            second = IssueDetector(model_config)
+
+        assert first.model is second.model
+        assert first.issues_parser is second.issues_parser
+        assert first.issues_parser is model_registry.get_parser(DocumentIssues)
+        assert first.logger is second.logger
+        assert len(first.logger.handlers) == 1
+
+    @pytest.mark.asyncio
+    async def test_clients_recreated_after_http_clients_closed(self, model_config):
+        """测试关闭共享连接池后重新获取的模型客户端使用新的连接池"""
+        first = model_registry.get_chat_model(model_config)
+        pool = get_async_http_client(model_config['base_url'])
+        assert first.async_client._client._client is pool
+
+        await close_async_http_clients()
+        second = model_registry.get_chat_model(model_config)
+
+        assert pool.is_closed
+        assert second is not first
+        assert not second.async_client._client._client.is_closed
+        await close_async_http_clients()
+
+    @pytest.mark.asyncio
+    async def test_warm_up_skips_models_without_key(self, model_config):
+        """测试预热只创建已配置密钥的模型客户端"""
+        registry = ModelClientRegistry()
+        models = [
+            {'label': '有密钥', 'config': model_config},
+            {'label': '无密钥', 'config': {**model_config, 'api_key': None}}
+        ]
+        with patch('app.services.model_registry.ChatOpenAI'):
+            warmed = await registry.warm_up(models, connect=False)
+
+        assert warmed == 1
+        assert len(registry._models) == 1
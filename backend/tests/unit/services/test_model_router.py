@@ -0,0 +1,192 @@
+"""
+模型路由单元测试
+"""
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+
+from app.services.issue_detector import IssueDetector
+from app.services.llm_cache import LLMResponseCache
+from app.services.model_registry import model_registry
+from app.services.model_router import CircuitBreaker, ModelRouter, ModelUnavailableError, model_router
+
+
+class ServiceUnavailable(Exception):
+    status_code = 503
+
+
+PRIMARY = {'base_url': 'http://primary', 'model': 'primary', 'fallback_index': 1, 'max_retries': 0}
+FALLBACK = {'base_url': 'http://fallback', 'model': 'fallback', 'fallback_index': 0, 'max_retries': 0}
+
+
+def make_settings(models=None, **routing):
+    config = {'enabled': True, 'failure_threshold': 2, 'reset_timeout': 30, 'hedge': False, 'hedge_min_samples': 3}
+    config.update(routing)
+    models = models or [PRIMARY, FALLBACK]
+    return Mock(
+        model_routing_config=config,
+        concurrency_config={'enabled': True},
+        ai_models=[{'config': model} for model in models]
+    )
+
+
+class TestModelRouter:
+    """熔断、故障转移和对冲请求单元测试"""
+
+    def test_circuit_breaker_opens_and_probes(self):
+        """测试连续失败后熔断，超时后只放行一个探测请求"""
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        assert breaker.allow()
+        assert breaker.state == "half_open"
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    @pytest.mark.asyncio
+    async def test_failover_to_fallback_and_skip_open_circuit(self):
+        """测试主模型失败时转移到备用模型，熔断后直接使用备用模型"""
+        router = ModelRouter()
+        calls = []
+
+        async def invoke(config):
+            calls.append(config['model'])
+            if config is PRIMARY:
+                raise ServiceUnavailable()
+            return "ok"
+
+        with patch('app.services.model_router.get_settings', return_value=make_settings()):
+            assert router.candidates(PRIMARY) == [PRIMARY, FALLBACK]
+            for _ in range(3):
+                assert await router.call(PRIMARY, invoke) == "ok"
+
+        assert calls == ["primary", "fallback", "primary", "fallback", "fallback"]
+
+    @pytest.mark.asyncio
+    async def test_request_errors_and_streamed_results_do_not_fail_over(self):
+        """测试请求本身的错误和已推送过结果的流式请求不转移到备用模型"""
+        router = ModelRouter()
+
+        async def bad_request(config):
+            raise ValueError("参数错误")
+
+        async def unavailable(config):
+            raise ServiceUnavailable()
+
+        with patch('app.services.model_router.get_settings', return_value=make_settings()):
+            with pytest.raises(ValueError):
+                await router.call(PRIMARY, bad_request)
+            with pytest.raises(ServiceUnavailable):
+                await router.call(PRIMARY, unavailable, can_failover=lambda: False)
+            assert router.health(FALLBACK).breaker.failures == 0
+
+            await asyncio.gather(*[router.call(PRIMARY, unavailable) for _ in range(2)], return_exceptions=True)
+            with pytest.raises(ModelUnavailableError):
+                await router.call(PRIMARY, unavailable)
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_after_p95(self):
+        """测试请求超过 p95 延迟后向备用模型发出对冲请求，取先返回的结果"""
+        router = ModelRouter()
+        router.health(PRIMARY).latencies.extend([0.01] * 5)
+        cancelled = []
+
+        async def invoke(config):
+            if config is PRIMARY:
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    cancelled.append(config['model'])
+                    raise
+            return config['model']
+
+        with patch('app.services.model_router.get_settings', return_value=make_settings(hedge=True)):
+            assert await router.call(PRIMARY, invoke) == "fallback"
+            await asyncio.sleep(0)
+
+        assert cancelled == ["primary"]
+        assert router.health(PRIMARY).breaker.state == "closed"
+
+    @pytest.mark.asyncio
+    async def test_hedge_skipped_without_available_fallback(self):
+        """测试没有未熔断的备用模型时不对冲，不向同一端点重复请求"""
+        router = ModelRouter()
+        single = {'base_url': 'http://single', 'model': 'single', 'max_retries': 0}
+        router.health(single).latencies.extend([0.01] * 5)
+        calls = []
+
+        async def invoke(config):
+            calls.append(config['model'])
+            await asyncio.sleep(0.05)
+            return config['model']
+
+        with patch('app.services.model_router.get_settings', return_value=make_settings([single], hedge=True)):
+            assert await router.call(single, invoke) == "single"
+
+        assert calls == ["single"]
+
+    @pytest.mark.asyncio
+    async def test_router_retries_instead_of_client(self):
+        """测试启用路由时客户端不重试，端点失败由路由器退避重试，熔断后转移到备用模型"""
+        router = ModelRouter()
+        primary = {**PRIMARY, 'max_retries': 3}
+        calls = []
+
+        async def invoke(config):
+            calls.append(config['model'])
+            if config is primary:
+                raise ServiceUnavailable()
+            return "ok"
+
+        settings = make_settings([primary, FALLBACK])
+        with patch('app.services.model_router.get_settings', return_value=settings), \
+                patch('app.services.model_router.RETRY_BASE_DELAY', 0):
+            assert router.client_max_retries(primary) == 0
+            assert router.retries(primary) == 3
+            assert await router.call(primary, invoke) == "ok"
+
+            # 熔断阈值为2：第二次失败后熔断器打开，不再重试
+            assert calls == ["primary", "primary", "fallback"]
+
+            settings.model_routing_config['enabled'] = False
+            settings.concurrency_config['enabled'] = False
+            assert router.client_max_retries(primary) == 3
+            assert router.retries(primary) == 0
+
+    @pytest.mark.asyncio
+    async def test_failover_response_cached_under_fallback_model(self, tmp_path):
+        """测试备用模型的响应不按主模型缓存，主模型恢复后重新请求主模型"""
+        primary = {**PRIMARY, 'api_key': 'test-key'}
+        fallback = {**FALLBACK, 'api_key': 'test-key'}
+        cache = LLMResponseCache(path=str(tmp_path / "llm_cache.db"), max_memory_entries=10,
+                                 max_disk_entries=10, ttl=0, enabled=True)
+        model_registry.clear()
+        model_router.clear()
+        with patch('app.services.model_registry.ChatOpenAI', side_effect=lambda **kwargs: Mock()):
+            detector = IssueDetector(primary)
+            detector.chunker.pack_sections = False
+            answered = []
+
+            async def call_model(messages, cancel_token=None, model=None):
+                name = "primary" if model is detector.model else "fallback"
+                # 主模型第一次请求失败，之后恢复
+                if name == "primary" and "fallback" not in answered:
+                    raise ServiceUnavailable()
+                answered.append(name)
+                return Mock(content=f'{{"issues": [{{"type": "{name}", "description": "d"}}]}}')
+
+            sections = [{"section_title": "安装", "content": "这是一个足够长的章节内容，用于测试故障转移后的响应缓存。"}]
+            with patch('app.services.model_router.get_settings', return_value=make_settings([primary, fallback])), \
+                    patch('app.services.issue_detector.llm_cache', cache), \
+                    patch.object(detector, '_call_ai_model', side_effect=call_model):
+                first = await detector.detect_issues(sections)
+                second = await detector.detect_issues(sections)
+        model_registry.clear()
+        model_router.clear()
+
+        assert answered == ["fallback", "primary"]
+        assert first[0]["type"] == "fallback" and second[0]["type"] == "primary"
@@ -0,0 +1,82 @@
+"""
+提示词模板加载器单元测试
+"""
+import os
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.services.prompt_loader import CompiledTemplate, PromptLoader
+from app.services.issue_detector import IssueDetector
+from app.services.llm_cache import llm_cache
+from app.services.model_registry import model_registry
+
+
+TEMPLATE = """
+system_prompt: |
+  你是文档审查专家。
+
+format_prompt_template: |
+  输出格式：
+  {format_instructions}
+
+user_prompt_template: |
+  章节标题：{section_title}
+  {{原样保留的花括号}}
+"""
+
+
+class TestPromptLoader:
+    """模板编译、前缀和文件修改后重新加载单元测试"""
+
+    def test_compiled_template_matches_format(self):
+        """测试预编译模板的渲染结果与 str.format 一致"""
+        template = "标题：{title}\n{{字面量}} 数量：{count:>3}"
+        compiled = CompiledTemplate(template)
+        assert compiled.fields == {"title", "count"}
+        assert compiled.render(title="安装", count=5) == template.format(title="安装", count=5)
+        with pytest.raises(KeyError):
+            compiled.render(title="安装")
+
+    def test_prefix_and_reload_on_change(self, tmp_path):
+        """测试系统提示词与格式说明组成固定前缀，模板文件修改后重新加载"""
+        path = tmp_path / "review.yaml"
+        path.write_text(TEMPLATE, encoding="utf-8")
+        loader = PromptLoader(tmp_path, reload_interval=0)
+
+        prefix = loader.get_system_prompt("review", format_instructions='{"issues": []}')
+        assert prefix == '你是文档审查专家。\n\n输出格式：\n{"issues": []}'
+        assert loader.get_system_prompt("review", format_instructions='{"issues": []}') is prefix
+        assert loader.get_user_prompt("review", section_title="安装") == "章节标题：安装\n{原样保留的花括号}\n"
+
+        template = loader.get_template("review")
+        assert loader.get_template("review") is template
+        path.write_text(TEMPLATE.replace("审查专家", "校对专家"), encoding="utf-8")
+        stat = path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        assert loader.get_system_prompt("review") == "你是文档校对专家。\n"
+        assert loader.get_template("review").version != template.version
+
+    @pytest.mark.asyncio
+    async def test_detection_requests_share_identical_prefix(self):
+        """测试不同章节的检测请求系统消息完全相同，章节标题只出现在用户消息中"""
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini'})
+        model_registry.clear()
+        detector.chunker.pack_sections = False
+
+        sections = [
+            {"section_title": "安装", "content": "这是安装章节的内容，长度足够通过章节过滤。"},
+            {"section_title": "配置", "content": "这是配置章节的内容，长度同样足够通过章节过滤。"}
+        ]
+        response = Mock(content='{"issues": []}')
+        with patch.object(llm_cache, 'enabled', False), \
+                patch.object(detector, '_call_ai_model', AsyncMock(return_value=response)) as mock_call:
+            await detector.detect_issues(sections)
+
+        system_messages = [call.args[0][0].content for call in mock_call.await_args_list]
+        user_messages = [call.args[0][1].content for call in mock_call.await_args_list]
+        assert len(system_messages) == 2 and system_messages[0] == system_messages[1]
+        assert '"issues"' in system_messages[0]
+        assert all("安装" not in message and "配置" not in message for message in system_messages)
+        assert sorted("安装" in message for message in user_messages) == [False, True]
@@ -0,0 +1,93 @@
+"""
+本地规则检查单元测试
+"""
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.rule_checker import RuleChecker
+from app.services.processors.rule_check_processor import RuleCheckProcessor
+
+
+@pytest.fixture
+def checker():
+    return RuleChecker({'enabled': True, 'checks': ['brackets', 'punctuation', 'code_syntax']})
+
+
+def check(checker, content):
+    return checker.check_section({"section_title": "安装", "content": content})
+
+
+class TestRuleChecker:
+    """规则检查单元测试"""
+
+    def test_bracket_and_quote_pairing(self, checker):
+        """测试括号和引号配对"""
+        issues = check(checker, "请先安装依赖（参见附录A。\n1) 打开设置（系统）\n引用“配置说明”一节。")
+        assert len(issues) == 1
+        assert issues[0]["type"] == "符号不配对"
+        assert issues[0]["location"] == "安装 - 第1行"
+        assert issues[0]["source"] == "rule"
+
+    def test_mixed_punctuation(self, checker):
+        """测试中英文标点混用，行内代码不检查"""
+        issues = check(checker, "安装完成后,重启服务。\n执行 `a,b` 命令。\nUse A，B instead.")
+        assert [issue["location"] for issue in issues] == ["安装 - 第1行", "安装 - 第3行"]
+        assert all(issue["type"] == "标点混用" for issue in issues)
+
+    def test_code_syntax_with_real_parsers(self, checker):
+        """测试代码块和命令行按语言解析"""
+        content = (
+            "```python\ndef main(:\n    pass\n```\n"
+            "```json\n{\"port\": 8080,}\n```\n"
+            "```yaml\nserver:\n  port: [8080\n```\n"
+            "```python\nprint('ok')\n```\n"
+            "$ echo \"hello\n"
+        )
+        issues = check(checker, content)
+        assert [issue["type"] for issue in issues] == ["代码错误", "代码错误", "代码错误", "命令错误"]
+        assert issues[0]["severity"] == "严重"
+
+    def test_valid_content_not_reported(self, checker):
+        """测试跨行闭合的括号、多文档YAML、heredoc、注释、续行和含占位的JSON不被误报"""
+        content = (
+            "安装前请确认系统满足要求（内存不少于\n8GB，磁盘不少于 20GB）。\n"
+            "```yaml\nname: app\n---\nname: worker\n```\n"
+            "```bash\n# don't run as root\ncat <<EOF > note.txt\nit's done\nEOF\n"
+            "docker run \\\n  -e MSG='hello\nworld' app\n```\n"
+            "```json\n{\"items\": [1, 2, ...]}\n```\n"
+            "```console\n$ echo ok\nDon't panic\n```"
+        )
+        assert check(checker, content) == []
+
+    def test_brackets_checked_per_paragraph(self, checker):
+        """测试段落内跨行的括号只报告一次，位置为未闭合的左括号所在行"""
+        issues = check(checker, "第一段（说明\n继续说明。\n\n第二段）多余。")
+        assert [issue["location"] for issue in issues] == ["安装 - 第1行", "安装 - 第4行"]
+
+    def test_prompt_skip_note_lists_enabled_checks(self, checker):
+        """测试跳过说明只列出启用的检查和实际检查的代码语言"""
+        note = checker.prompt_skip_note()
+        assert "括号和引号不配对" in note and "中英文标点混用" in note
+        assert "Python/JSON/YAML/Shell 语言的代码块" in note
+
+        note = RuleChecker({'enabled': True, 'checks': ['punctuation']}).prompt_skip_note()
+        assert "中英文标点混用" in note
+        assert "括号" not in note and "语法错误" not in note
+        assert RuleChecker({'enabled': False}).prompt_skip_note() == ""
+
+    @pytest.mark.asyncio
+    async def test_processor_pushes_issues_immediately(self):
+        """测试规则检查处理器立即推送问题"""
+        processor = RuleCheckProcessor()
+        processor.checker = RuleChecker({'enabled': True})
+        callback = AsyncMock()
+        context = {
+            "section_merge_result": [{"section_title": "安装", "content": "完成后,重启服务。"}],
+            "issue_callback": callback
+        }
+
+        result = await processor.process(context)
+
+        assert result.success is True
+        assert len(result.data) == 1
+        callback.assert_awaited_once_with(result.data[0])
@@ -0,0 +1,59 @@
+"""
+本地文档结构提取单元测试
+"""
+import pytest
+
+from app.services.structure_extractor import LocalStructureExtractor
+
+
+@pytest.fixture
+def extractor():
+    return LocalStructureExtractor({'enabled': True, 'file_types': ['md', 'docx', 'txt'], 'min_headings': 2, 'min_average_chars': 10})
+
+
+class TestLocalStructureExtractor:
+    """本地结构提取单元测试"""
+
+    def test_markdown_headings_ignore_code_blocks(self, extractor):
+        """测试Markdown按标题切分，代码块中的 # 不是标题"""
+        text = (
+            "前言说明文字。\n\n"
+            "# 安装\n\n运行以下命令：\n\n```bash\n# 这是注释\npip install app\n```\n\n"
+            "配置说明\n--------\n\n修改配置文件。\n"
+        )
+        sections = extractor.extract(text, "md")
+
+        assert [(s["section_title"], s["level"]) for s in sections] == [
+            ("文档内容", 1), ("安装", 1), ("配置说明", 2)
+        ]
+        assert "# 这是注释" in sections[1]["content"]
+        assert sections[2]["content"] == "修改配置文件。"
+
+    def test_text_numbered_headings_and_low_confidence(self, extractor):
+        """测试TXT按编号标题切分，识别不到足够标题时交给模型"""
+        text = "第一章 概述\n本产品用于文档质量检测。\n1.1 适用范围\n适用于技术文档和用户手册。\n"
+        sections = extractor.extract(text, "txt")
+        assert [(s["section_title"], s["level"]) for s in sections] == [
+            ("第一章 概述", 1), ("1.1 适用范围", 2)
+        ]
+
+        assert extractor.extract("只有一段没有标题的正文。", "txt") is None
+        assert extractor.extract("# 标题\n\n正文", "pdf") is None
+
+    def test_docx_heading_styles(self, extractor, tmp_path):
+        """测试DOCX按标题样式切分，表格转为文本"""
+        docx = pytest.importorskip("docx")
+        document = docx.Document()
+        document.add_heading("用户手册", level=1)
+        document.add_paragraph("欢迎使用本产品。")
+        document.add_heading("参数说明", level=2)
+        table = document.add_table(rows=1, cols=2)
+        table.rows[0].cells[0].text = "port"
+        table.rows[0].cells[1].text = "服务端口"
+        path = tmp_path / "manual.docx"
+        document.save(str(path))
+
+        sections = extractor.extract("", file_path=str(path))
+
+        assert [(s["section_title"], s["level"]) for s in sections] == [("用户手册", 1), ("参数说明", 2)]
+        assert sections[1]["content"] == "port | 服务端口"
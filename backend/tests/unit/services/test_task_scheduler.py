@@ -0,0 +1,337 @@
+"""
+TaskScheduler单元测试
+"""
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch, AsyncMock
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base, ensure_schema_columns
+from app.models import Task
+from app.services.task_scheduler import TaskScheduler
+
+
+class FakeProcessor:
+    """记录执行情况的假任务处理器"""
+
+    def __init__(self, tracker: dict, duration: float = 0.05):
+        self.tracker = tracker
+        self.duration = duration
+
+    async def process_task(self, task_id: int, cancel_token=None):
+        self.tracker['running'] += 1
+        self.tracker['peak'] = max(self.tracker['peak'], self.tracker['running'])
+        try:
+            if cancel_token:
+                await cancel_token.run(asyncio.sleep(self.duration))
+            else:
+                await asyncio.sleep(self.duration)
+            self.tracker['order'].append(task_id)
+        finally:
+            self.tracker['running'] -= 1
+
+
+class TestTaskScheduler:
+    """任务调度器单元测试"""
+
+    @pytest.fixture
+    def tracker(self):
+        """执行情况记录"""
+        return {'running': 0, 'peak': 0, 'order': []}
+
+    @pytest.fixture(autouse=True)
+    def mock_manager(self):
+        """Mock WebSocket管理器"""
+        with patch('app.services.task_scheduler.manager') as manager:
+            manager.send_status = AsyncMock()
+            yield manager
+
+    @pytest.fixture(autouse=True)
+    def mock_task_repo(self):
+        """Mock任务仓库，认领总是成功"""
+        with patch('app.repositories.task.TaskRepository') as mock_repo:
+            mock_repo.return_value.claim_task.return_value = True
+            mock_repo.return_value.release_owner_tasks.return_value = []
+            yield mock_repo
+
+    def create_scheduler(self, tracker, max_concurrent_tasks=2, task_timeout=0, duration=0.05):
+        return TaskScheduler(
+            max_concurrent_tasks=max_concurrent_tasks,
+            task_timeout=task_timeout,
+            processor_factory=lambda db: FakeProcessor(tracker, duration),
+            session_factory=Mock
+        )
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self, tracker):
+        """测试并发数不超过max_concurrent_tasks"""
+        scheduler = self.create_scheduler(tracker, max_concurrent_tasks=2)
+        for task_id in range(6):
+            await scheduler.submit(task_id)
+
+        await asyncio.sleep(0.5)
+        await scheduler.stop()
+
+        assert len(tracker['order']) == 6
+        assert tracker['peak'] == 2
+
+    @pytest.mark.asyncio
+    async def test_priority_order(self, tracker):
+        """测试优先级高（数值小）的任务先执行"""
+        scheduler = self.create_scheduler(tracker, max_concurrent_tasks=1)
+        scheduler._wakeup = asyncio.Condition()
+        # 先入队但不启动工作协程，保证排序只由优先级决定
+        with patch.object(scheduler, 'start', AsyncMock()):
+            await scheduler.submit(1, priority=1)
+            await scheduler.submit(2, priority=0)
+            await scheduler.submit(3, priority=1)
+
+        assert scheduler.queue_position(2) == 1
+        assert scheduler.queue_position(1) == 2
+        assert scheduler.queue_position(3) == 3
+
+        await scheduler.start()
+        await asyncio.sleep(0.3)
+        await scheduler.stop()
+
+        assert tracker['order'] == [2, 1, 3]
+
+    @pytest.mark.asyncio
+    async def test_task_timeout_marks_failed(self, tracker, mock_manager, mock_task_repo):
+        """测试任务超时后被标记为失败"""
+        scheduler = self.create_scheduler(tracker, max_concurrent_tasks=1, task_timeout=0.05, duration=1)
+
+        await scheduler.submit(42)
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+
+        mock_task_repo.return_value.update.assert_called_once()
+        assert mock_task_repo.return_value.update.call_args.kwargs['status'] == 'failed'
+        mock_task_repo.return_value.release_task.assert_called_once_with(42, scheduler.owner_id)
+        assert tracker['order'] == []
+        mock_manager.send_status.assert_any_call(42, "failed")
+
+    @pytest.mark.asyncio
+    async def test_skip_task_claimed_by_other_node(self, tracker, mock_task_repo):
+        """测试任务已被其他节点认领时跳过执行"""
+        mock_task_repo.return_value.claim_task.return_value = False
+        scheduler = self.create_scheduler(tracker, max_concurrent_tasks=1)
+
+        await scheduler.submit(7)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+        assert tracker['order'] == []
+
+    @pytest.mark.asyncio
+    async def test_dequeued_task_holds_slot_until_finished(self, tracker, mock_task_repo):
+        """测试任务出队后立即占用执行名额，认领失败后名额释放"""
+        mock_task_repo.return_value.claim_task.return_value = False
+        scheduler = self.create_scheduler(tracker, max_concurrent_tasks=1)
+        slots = []
+
+        async def broadcast():
+            slots.append(scheduler.free_slots)
+
+        with patch.object(scheduler, '_broadcast_queue_positions', side_effect=broadcast):
+            await scheduler.submit(7)
+            await asyncio.sleep(0.05)
+
+        assert slots and all(free == 0 for free in slots)
+        assert scheduler.free_slots == 1
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_cancel_queued_and_running_tasks(self, tracker, mock_task_repo):
+        """测试取消排队中的任务直接出队，执行中的任务通过取消令牌停止"""
+        scheduler = self.create_scheduler(tracker, max_concurrent_tasks=1, duration=1)
+
+        await scheduler.submit(1)
+        await scheduler.submit(2)
+        await asyncio.sleep(0.05)
+
+        assert await scheduler.cancel(2) is True
+        assert scheduler.queue_position(2) is None
+        assert await scheduler.cancel(1) is True
+        await asyncio.sleep(0.05)
+
+        assert scheduler._running == {}
+        assert await scheduler.cancel(1) is False
+        await scheduler.stop()
+
+        assert tracker['order'] == []
+        assert tracker['running'] == 0
+        mock_task_repo.return_value.release_task.assert_called_once_with(1, scheduler.owner_id)
+
+    def test_estimate_wait(self, tracker):
+        """测试排队等待时间估算"""
+        scheduler = self.create_scheduler(tracker, max_concurrent_tasks=2)
+        assert scheduler.estimate_wait(1) is None
+
+        scheduler._durations.extend([10.0, 20.0])
+        assert scheduler.estimate_wait(1) == 15.0
+        assert scheduler.estimate_wait(2) == 15.0
+        assert scheduler.estimate_wait(3) == 30.0
+
+
+class TestTaskRecovery:
+    """启动恢复单元测试"""
+
+    @pytest.fixture
+    def session_factory(self):
+        """内存数据库会话工厂"""
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        yield sessionmaker(bind=engine)
+        Base.metadata.drop_all(bind=engine)
+
+    def test_schema_upgrade_adds_indexes_for_new_columns(self):
+        """测试升级已有数据库时补建新增的列及其索引，租约认领和孤儿恢复的查询不必全表扫描"""
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR(200))"))
+
+        ensure_schema_columns(engine)
+
+        inspector = inspect(engine)
+        columns = {column['name'] for column in inspector.get_columns('tasks')}
+        indexes = {tuple(index['column_names']) for index in inspector.get_indexes('tasks')}
+        assert {'owner_id', 'user_id', 'base_task_id'} <= columns
+        assert {('owner_id',), ('user_id',), ('base_task_id',)} <= indexes
+
+    def add_task(self, db, status, heartbeat_at=None, owner_id=None, lease_expires_at=None):
+        task = Task(
+            title="测试任务", file_name="test.md", file_path="/tmp/test.md",
+            file_size=100, file_type="md", status=status, heartbeat_at=heartbeat_at,
+            owner_id=owner_id, lease_expires_at=lease_expires_at
+        )
+        db.add(task)
+        db.commit()
+        return task.id
+
+    @pytest.mark.asyncio
+    async def test_recover_pending_and_orphaned_tasks(self, session_factory):
+        """测试恢复pending任务和心跳过期的processing任务"""
+        db = session_factory()
+        now = datetime.utcnow()
+        pending_id = self.add_task(db, 'pending')
+        orphaned_id = self.add_task(db, 'processing', heartbeat_at=now - timedelta(hours=1))
+        alive_id = self.add_task(db, 'processing', heartbeat_at=now)
+        self.add_task(db, 'completed')
+        db.close()
+
+        scheduler = TaskScheduler(max_concurrent_tasks=1, session_factory=session_factory)
+        submitted = []
+
+        async def fake_submit(task_id, priority=0):
+            submitted.append(task_id)
+            return len(submitted)
+
+        with patch.object(scheduler, 'submit', side_effect=fake_submit):
+            recovered = await scheduler.recover_tasks()
+
+        assert recovered == 2
+        assert sorted(submitted) == sorted([pending_id, orphaned_id])
+
+        db = session_factory()
+        assert db.get(Task, orphaned_id).status == 'pending'
+        assert db.get(Task, alive_id).status == 'processing'
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_own_leases_released_on_startup_and_peer_leases_reclaimed_periodically(self, session_factory):
+        """测试启动时立即回收本节点上次运行遗留的租约，运行期间回收其他节点过期的租约"""
+        db = session_factory()
+        now = datetime.utcnow()
+        own_id = self.add_task(db, 'processing', now, owner_id="node-a", lease_expires_at=now + timedelta(minutes=2))
+        peer_id = self.add_task(db, 'processing', now, owner_id="node-b", lease_expires_at=now + timedelta(minutes=2))
+        db.close()
+
+        scheduler = TaskScheduler(max_concurrent_tasks=1, session_factory=session_factory, owner_id="node-a")
+        submitted = []
+
+        async def fake_submit(task_id, priority=0):
+            submitted.append(task_id)
+            return len(submitted)
+
+        with patch.object(scheduler, 'submit', side_effect=fake_submit):
+            assert await scheduler.recover_tasks() == 1
+            assert submitted == [own_id]
+
+            # 其他节点崩溃后租约过期
+            db = session_factory()
+            db.get(Task, peer_id).lease_expires_at = now - timedelta(seconds=1)
+            db.commit()
+            db.close()
+            assert await scheduler.recover_orphaned_tasks() == [peer_id]
+            assert submitted == [own_id, peer_id]
+
+        db = session_factory()
+        assert db.get(Task, peer_id).status == 'pending'
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_stop_hands_back_running_leases(self, session_factory):
+        """测试调度器停止时交还执行中任务的租约，其他节点可以立即认领"""
+        from app.repositories.task import TaskRepository
+
+        db = session_factory()
+        task_id = self.add_task(db, 'pending')
+        db.close()
+
+        tracker = {'running': 0, 'peak': 0, 'order': []}
+        scheduler = TaskScheduler(
+            max_concurrent_tasks=1,
+            processor_factory=lambda db: FakeProcessor(tracker, duration=10),
+            session_factory=session_factory,
+            owner_id="node-a"
+        )
+        with patch('app.services.task_scheduler.manager') as manager:
+            manager.send_status = AsyncMock()
+            await scheduler.submit(task_id)
+            await asyncio.sleep(0.1)
+            assert tracker['running'] == 1
+            await scheduler.stop()
+
+        repo = TaskRepository(session_factory())
+        assert repo.get_by_id(task_id).owner_id is None
+        assert repo.claim_task(task_id, "node-b", 60) is True
+
+    @pytest.mark.asyncio
+    async def test_cancel_and_delete_from_other_process_stop_quickly(self, session_factory):
+        """测试其他进程取消或删除的执行中任务在 cancel_poll_interval 内停止，不必等待租约续期"""
+        from app.repositories.task import TaskRepository
+
+        db = session_factory()
+        cancelled_id = self.add_task(db, 'pending')
+        deleted_id = self.add_task(db, 'pending')
+        db.close()
+
+        tracker = {'running': 0, 'peak': 0, 'order': []}
+        scheduler = TaskScheduler(
+            max_concurrent_tasks=2,
+            processor_factory=lambda db: FakeProcessor(tracker, duration=10),
+            session_factory=session_factory,
+            owner_id="node-a"
+        )
+        with patch('app.services.task_scheduler.manager') as manager, \
+                patch.object(TaskScheduler, 'cancel_poll_interval', 0.05):
+            manager.send_status = AsyncMock()
+            await scheduler.submit(cancelled_id)
+            await scheduler.submit(deleted_id)
+            await asyncio.sleep(0.1)
+            assert tracker['running'] == 2
+
+            # 模拟worker模式下API进程的取消和删除：只修改数据库
+            repo = TaskRepository(session_factory())
+            repo.update(cancelled_id, status='cancelled')
+            repo.delete(deleted_id)
+            await asyncio.sleep(0.3)
+            assert tracker['running'] == 0
+            assert scheduler.running_task_ids == []
+            await scheduler.stop()
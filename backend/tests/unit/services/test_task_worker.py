@@ -0,0 +1,99 @@
+"""
+TaskWorker单元测试
+"""
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models import Task
+from app.repositories.task import TaskRepository
+from app.services.task_worker import TaskWorker
+
+
+class TestTaskWorker:
+    """任务工作进程单元测试"""
+
+    @pytest.fixture
+    def session_factory(self):
+        """内存数据库会话工厂"""
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        yield sessionmaker(bind=engine)
+        Base.metadata.drop_all(bind=engine)
+
+    def add_task(self, db, file_size=100, status='pending'):
+        task = Task(
+            title="测试任务", file_name="test.md", file_path="/tmp/test.md",
+            file_size=file_size, file_type="md", status=status
+        )
+        db.add(task)
+        db.commit()
+        return task.id
+
+    def test_claim_next_task_is_exclusive(self, session_factory):
+        """测试同一任务只能被认领一次，且小文档优先"""
+        db = session_factory()
+        large_id = self.add_task(db, file_size=50 * 1048576)
+        small_id = self.add_task(db, file_size=100)
+
+        first = TaskRepository(session_factory()).claim_next_task("node-a", 60)
+        second = TaskRepository(session_factory()).claim_next_task("node-b", 60)
+        third = TaskRepository(session_factory()).claim_next_task("node-c", 60)
+
+        assert first.id == small_id
+        assert second.id == large_id
+        assert third is None
+        assert first.status == 'processing'
+        assert first.owner_id == "node-a"
+        assert first.lease_expires_at is not None
+
+    def test_expired_lease_can_be_reclaimed(self, session_factory):
+        """测试租约过期后其他节点可重新认领，原节点无法续期"""
+        db = session_factory()
+        task_id = self.add_task(db)
+        repo = TaskRepository(db)
+
+        assert repo.claim_task(task_id, "node-a", 60) is True
+        assert repo.claim_task(task_id, "node-b", 60) is False
+
+        repo.update(task_id, lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        assert repo.claim_task(task_id, "node-b", 60) is True
+
+        assert repo.renew_leases([task_id], "node-a", 60) == []
+        assert repo.renew_leases([task_id], "node-b", 60) == [task_id]
+
+        repo.release_task(task_id, "node-b")
+        db.expire_all()
+        assert db.get(Task, task_id).owner_id is None
+
+    @pytest.mark.asyncio
+    async def test_claim_tasks_respects_free_slots(self, session_factory):
+        """测试工作进程按空闲并发数认领任务"""
+        db = session_factory()
+        task_ids = [self.add_task(db) for _ in range(3)]
+
+        with patch('app.services.task_worker.SessionLocal', session_factory):
+            worker = TaskWorker(worker_id="test-worker")
+            worker.scheduler._max_concurrent_tasks = 2
+            submitted = []
+
+            async def fake_submit(task_id, priority=0):
+                submitted.append(task_id)
+                worker.scheduler._queued_ids[task_id] = None
+                worker.scheduler._pending.append(None)
+                return len(submitted)
+
+            with patch.object(worker.scheduler, 'submit', side_effect=fake_submit):
+                claimed = await worker.claim_tasks()
+
+        assert claimed == 2
+        assert submitted == task_ids[:2]
+        db.expire_all()
+        statuses = [db.get(Task, task_id).status for task_id in task_ids]
+        assert statuses == ['processing', 'processing', 'pending']
@@ -0,0 +1,144 @@
+"""
+按token预算分块单元测试
+"""
+import pytest
+from unittest.mock import patch
+
+from app.services import text_chunker
+from app.services.text_chunker import TokenChunker, count_tokens
+
+
+@pytest.fixture(autouse=True)
+def char_estimate():
+    """使用字符估算计数，测试不依赖tiktoken词表"""
+    with patch.object(text_chunker, '_get_encoding', return_value=None):
+        yield
+
+
+class TestTokenChunker:
+    """分块单元测试"""
+
+    def make_chunker(self, **chunking):
+        config = {'model': 'gpt-4o-mini', 'context_window': 16000, 'reserved_tokens': 1500, 'max_tokens': 4000}
+        return TokenChunker(config, {'pack_sections': True, 'max_chunk_tokens': 0, **chunking})
+
+    def test_input_budget_from_model_config(self):
+        """测试输入预算 = 上下文窗口 - 输出上限 - 预留 - 模板开销，并受 max_chunk_tokens 限制"""
+        assert self.make_chunker().input_budget(500) == 16000 - 4000 - 1500 - 500
+        assert self.make_chunker(max_chunk_tokens=3000).input_budget(500) == 3000
+
+    def test_split_text_on_boundaries_without_loss(self):
+        """测试长文本按段落/句子切分，拼接后与原文一致且每段不超预算"""
+        chunker = self.make_chunker()
+        paragraph = "这是一个用于测试的句子。" * 30
+        text = "\n\n".join([paragraph] * 5) + "\n\n" + "没有标点的超长句子" * 100
+        chunks = chunker.split_text(text, 300)
+
+        assert "".join(chunks) == text
+        assert len(chunks) > 1
+        assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+        # 首个窗口在句子边界结束，不截断句子
+        assert chunks[0].endswith("。")
+
+    def test_plan_sections_packs_small_and_splits_large(self):
+        """测试短章节打包、超长章节切分，块内记录章节下标"""
+        chunker = self.make_chunker()
+        sections = [
+            {"section_title": "简介", "content": "简短的介绍内容。"},
+            {"section_title": "安装", "content": "简短的安装说明。"},
+            {"section_title": "参考", "content": "很长的参考内容。" * 200},
+            {"section_title": "附录", "content": "简短的附录。"}
+        ]
+        chunks = chunker.plan_sections(sections, 400)
+
+        assert chunks[0]["members"] == [0, 1]
+        assert "=== [S2] 安装 ===" in chunks[0]["content"]
+        assert chunks[0]["section_ids"] == ["S1", "S2"]
+        large = [chunk for chunk in chunks if chunk["members"] == [2]]
+        assert len(large) > 1 and large[0]["section_title"].startswith("参考 (1/")
+        assert "".join(chunk["content"] for chunk in large) == sections[2]["content"]
+        assert chunks[-1]["members"] == [3]
+
+        unpacked = self.make_chunker(pack_sections=False).plan_sections(sections[:2], 400)
+        assert [chunk["members"] for chunk in unpacked] == [[0], [1]]
+        limited = self.make_chunker(max_pack_sections=1).plan_sections(sections[:2], 400)
+        assert [chunk["members"] for chunk in limited] == [[0], [1]]
+
+
+class TestPackedDetection:
+    """打包请求的问题检测单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_packed_sections_use_one_request_and_results_split_per_section(self):
+        """测试短章节打包为一次请求，问题按章节归属并逐章节保存"""
+        import json
+        from unittest.mock import AsyncMock, Mock
+        from app.services.issue_detector import IssueDetector, section_key
+        from app.services.llm_cache import llm_cache
+        from app.services.model_registry import model_registry
+
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini', 'context_window': 16000})
+        model_registry.clear()
+
+        sections = [
+            {"section_title": "安装", "content": "安装步骤：下载安装包后双击运行即可完成安装。"},
+            {"section_title": "配置", "content": "配置说明：修改配置文件中的端口号后重启服务。"}
+        ]
+        response = {"issues": [
+            {"type": "错别字", "location": "配置 - 第一句", "original_text": "端口号"},
+            {"type": "语法", "location": "第一句", "original_text": "双击运行"}
+        ]}
+        detector.model = Mock()
+        detector.model.ainvoke = AsyncMock(return_value=Mock(content=json.dumps(response, ensure_ascii=False)))
+        saved = {}
+
+        async def on_section_complete(key, issues):
+            saved[key] = issues
+
+        with patch.object(llm_cache, 'enabled', False):
+            issues = await detector.detect_issues(sections, on_section_complete=on_section_complete)
+
+        detector.model.ainvoke.assert_awaited_once()
+        assert [issue["type"] for issue in issues] == ["语法", "错别字"]
+        assert saved[section_key(sections[0])][0]["location"] == "安装 - 第一句"
+        assert saved[section_key(sections[1])][0]["location"] == "配置 - 第一句"
+
+    @pytest.mark.asyncio
+    async def test_packed_issues_attributed_by_section_id_and_outputs_saved_per_section(self):
+        """测试打包请求按模型返回的章节编号归属问题，AI输出按章节拆分保存"""
+        import json
+        from unittest.mock import AsyncMock, Mock
+        from app.services.issue_detector import IssueDetector
+        from app.services.llm_cache import llm_cache
+        from app.services.model_registry import model_registry
+
+        db = Mock()
+        model_registry.clear()
+        with patch('app.services.model_registry.ChatOpenAI'):
+            detector = IssueDetector({'api_key': 'test-key', 'model': 'gpt-4o-mini', 'context_window': 16000}, db)
+        model_registry.clear()
+
+        sections = [
+            {"section_title": "安装", "content": "安装步骤：下载安装包后双击运行即可完成安装。"},
+            {"section_title": "配置", "content": "配置说明：修改配置文件中的端口号后重启服务。"}
+        ]
+        # 位置和原文都指向第一个章节，以章节编号为准
+        response = {"issues": [
+            {"type": "错别字", "location": "安装 - 第一句", "original_text": "安装包", "section_id": "S2"}
+        ]}
+        detector.model = Mock()
+        detector.model.ainvoke = AsyncMock(return_value=Mock(content=json.dumps(response, ensure_ascii=False)))
+
+        with patch.object(llm_cache, 'enabled', False):
+            issues = await detector.detect_issues(sections, task_id=1)
+
+        assert "section_id" not in issues[0]
+        prompt = detector.model.ainvoke.await_args.args[0][1].content
+        assert "=== [S2] 配置 ===" in prompt
+        outputs = [call.args[0] for call in db.add.call_args_list]
+        assert [(output.section_title, output.section_index) for output in outputs] == [("安装", 0), ("配置", 1)]
+        assert outputs[0].input_text == sections[0]["content"]
+        assert outputs[0].parsed_output["issues"] == []
+        assert outputs[1].parsed_output["issues"] == issues
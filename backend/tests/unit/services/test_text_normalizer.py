@@ -0,0 +1,20 @@
+"""
+文本换行清理单元测试
+"""
+from app.services.text_normalizer import normalize_text
+
+
+class TestNormalizeText:
+    """换行清理单元测试"""
+
+    def test_joins_broken_lines_and_removes_page_numbers(self):
+        """测试合并被打断的句子，去除页码行"""
+        text = "本产品用于检测技术\n文档中的质量问题。\n- 3 -\n第 3 页 共 20 页\nThe service is deploy-\ned on every node and\nscales out.\n"
+        assert normalize_text(text) == (
+            "本产品用于检测技术文档中的质量问题。\nThe service is deployed on every node and scales out."
+        )
+
+    def test_keeps_lists_code_and_tables(self):
+        """测试列表项、代码和表格行保持原样"""
+        text = "操作步骤\n1. 打开设置\n2. 修改端口\n\n    pip install app\n    app start\n| 参数 | 说明 |\n| port | 端口 |"
+        assert normalize_text(text) == text